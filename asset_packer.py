@@ -0,0 +1,554 @@
+"""
+Generate album_covers.json and album_name_exceptions.txt from a music library. The cover images of the albums are
+hashed perceptually in parallel, albums with the same cover are merged under one asset key, and the albums played the
+most are chosen to fit the Discord asset limit.
+
+Usage: python asset_packer.py D:\\Music [--rank plays] [--export upload]
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from assets import MAX_ASSETS, MAX_ASSET_KEY_LENGTH, normalize_name, validate_asset_key
+from atomic_file import write_atomic
+from metadata import AUDIO_EXTENSIONS, IMAGE_EXTENSIONS, MetadataProvider, SOURCE_TAGS, choose_cover
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TRANSLITERATIONS = str.maketrans({"æ": "ae", "ø": "o", "œ": "oe", "ß": "ss", "đ": "d", "ð": "d", "þ": "th",
+                                  "ł": "l"})
+"""
+Letters that have no ASCII decomposition in Unicode, but are common in album names.
+"""
+
+HASH_PERCEPTUAL = "dhash"
+HASH_CONTENT = "sha1"
+PARALLEL_THRESHOLD = 32
+"""
+Minimum number of images hashed on a process pool. Fewer images are hashed in this process, because starting the
+pool would take longer.
+"""
+
+
+class LibraryAlbum:
+    """
+    A class representing an album found in the music library.
+    """
+
+    __slots__ = ("name", "artist", "image_path", "tracks", "size", "plays")
+
+    def __init__(self, name: str, artist: Optional[str], image_path: str, tracks: int = 0, size: int = 0):
+        """
+        :param name: Album name as the asset resolver sees it
+        :param artist: Album artist, or the artist if the album artist is not known
+        :param image_path: Path to the cover image
+        :param tracks: Number of tracks in the album
+        :param size: Total size of the track files in bytes
+        """
+        self.name = name
+        self.artist = artist
+        self.image_path = image_path
+        self.tracks = tracks
+        self.size = size
+        self.plays = 0
+
+    def __repr__(self) -> str:
+        return f"LibraryAlbum(name={self.name!r}, artist={self.artist!r}, tracks={self.tracks})"
+
+
+def scan_library(roots: Iterable[str], metadata_provider: MetadataProvider) -> List[LibraryAlbum]:
+    """
+    Find the albums in music directories. Each directory with tracks and an image is an album. The album name and
+    artist are read from the tags of the first track, so an album split into several directories, e.g. one per disc,
+    is found only once.
+
+    :param roots: Music directories to scan recursively
+    :param metadata_provider: Provider of the track metadata
+    :return: The found albums
+    """
+
+    albums: Dict[Tuple[str, str], LibraryAlbum] = {}
+    directories = list(roots)
+    while directories:
+        directory = directories.pop()
+        tracks = []
+        images = []
+        size = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                        continue
+                    extension = os.path.splitext(entry.name)[1].lower()
+                    if extension in AUDIO_EXTENSIONS:
+                        tracks.append(entry.path)
+                        size += entry.stat().st_size
+                    elif extension in IMAGE_EXTENSIONS:
+                        images.append(entry.name)
+        except OSError as e:
+            print(f"Could not scan {directory}: {e}")
+            continue
+
+        cover = choose_cover(images)
+        if not tracks or cover is None:
+            continue
+
+        metadata = metadata_provider.get(min(tracks))
+        if not metadata.album:
+            continue
+        artist = metadata.album_artist or metadata.artist if metadata.source == SOURCE_TAGS else metadata.artist
+
+        key = (normalize_name(metadata.album), normalize_name(artist or ""))
+        album = albums.get(key)
+        if album is None:
+            albums[key] = LibraryAlbum(metadata.album, artist, os.path.join(directory, cover), len(tracks), size)
+        else:
+            album.tracks += len(tracks)
+            album.size += size
+
+    return list(albums.values())
+
+
+def hash_image(image_path: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    Hash a cover image. With Pillow, the hash is a 64-bit difference hash of the image, which stays nearly the same
+    when the image is resized or recompressed. Without Pillow, the hash is taken from the file content, so only
+    identical files have the same hash.
+
+    :param image_path: Path to the image
+    :return: Hash type, hash and error message. The hash type and hash are None if the image could not be read.
+    """
+
+    try:
+        if Image is None:
+            with open(image_path, "rb") as image_file:
+                digest = hashlib.sha1(image_file.read()).digest()
+            return HASH_CONTENT, int.from_bytes(digest[:8], "big"), None
+
+        with Image.open(image_path) as image:
+            # Let the JPEG decoder scale the image down while decoding, which is much faster than a full decode
+            image.draft("L", (64, 64))
+            pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    except Exception as e:
+        return None, None, str(e)
+
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            index = row * 9 + column
+            value = value << 1 | (pixels[index] > pixels[index + 1])
+
+    return HASH_PERCEPTUAL, value, None
+
+
+class ImageHashCache:
+    """
+    Image hashes cached in a JSON file by path, size and modification time, so unchanged images are not decoded again
+    on later runs.
+    """
+
+    def __init__(self, cache_filepath: Optional[str] = None):
+        """
+        :param cache_filepath: Path to the JSON cache file, or None to cache only in memory
+        """
+        self.cache_filepath = cache_filepath
+        self.hits = 0
+        self.misses = 0
+        self._cache: Dict[str, list] = {}
+
+        if cache_filepath is None:
+            return
+        try:
+            with open(cache_filepath, encoding="utf8") as cache_file:
+                self._cache = json.load(cache_file)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            print("Image hash cache is corrupted and is rebuilt.")
+
+    def save(self):
+        """
+        Write the cache file.
+        """
+
+        if self.cache_filepath is None:
+            return
+
+        write_atomic(self.cache_filepath, json.dumps(self._cache, ensure_ascii=False))
+
+    def hash_images(self, image_paths: List[str], workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Hash images, using cached hashes of unchanged images. The other images are hashed on a process pool.
+
+        :param image_paths: Paths to the images
+        :param workers: Number of worker processes. Defaults to the number of processors.
+        :return: Hashes by image path. Images that could not be read are left out.
+        """
+
+        hash_type = HASH_CONTENT if Image is None else HASH_PERCEPTUAL
+        hashes = {}
+        pending = []
+        signatures = {}
+        for image_path in image_paths:
+            try:
+                stat = os.stat(image_path)
+            except OSError as e:
+                print(f"Could not read {image_path}: {e}")
+                continue
+            signature = signatures[image_path] = [stat.st_size, stat.st_mtime_ns]
+            entry = self._cache.get(image_path)
+            # Hashes of the other type are not comparable, so they are computed again
+            if entry is not None and entry[:2] == signature and entry[2] == hash_type:
+                self.hits += 1
+                hashes[image_path] = entry[3]
+            else:
+                pending.append(image_path)
+
+        self.misses += len(pending)
+        executor = None
+        if len(pending) < PARALLEL_THRESHOLD or workers == 1:
+            results = map(hash_image, pending)
+        else:
+            executor = ProcessPoolExecutor(workers)
+            results = executor.map(hash_image, pending, chunksize=max(1, min(64, len(pending) // 64)))
+
+        try:
+            for image_path, (result_type, value, error) in zip(pending, results):
+                if value is None:
+                    print(f"Could not read {image_path}: {error}")
+                    continue
+                hashes[image_path] = value
+                self._cache[image_path] = signatures[image_path] + [result_type, value]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return hashes
+
+
+def _bit_count(value: int) -> int:
+    return bin(value).count("1")
+
+
+def group_duplicates(hashes: List[int], max_distance: int) -> List[int]:
+    """
+    Group hashes that differ by at most max_distance bits. Similar hashes are found without comparing every pair: the
+    hashes are split into max_distance + 1 bands, and two hashes within the distance must have at least one band in
+    common, so only hashes sharing a band are compared.
+
+    :param hashes: 64-bit hashes
+    :param max_distance: Maximum number of differing bits between duplicates
+    :return: Group number of each hash
+    """
+
+    parents = list(range(len(hashes)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def union(first: int, second: int):
+        first, second = find(first), find(second)
+        if first != second:
+            parents[max(first, second)] = min(first, second)
+
+    # Identical hashes are merged first, so the bands only contain unique hashes
+    unique: Dict[int, int] = {}
+    for index, value in enumerate(hashes):
+        if value in unique:
+            union(unique[value], index)
+        else:
+            unique[value] = index
+
+    if max_distance > 0:
+        bands = max_distance + 1
+        width, extra = divmod(64, bands)
+        shift = 0
+        for band in range(bands):
+            band_width = width + (band < extra)
+            mask = (1 << band_width) - 1
+            buckets: Dict[int, List[int]] = {}
+            for value in unique:
+                buckets.setdefault(value >> shift & mask, []).append(value)
+            for bucket in buckets.values():
+                for i, first in enumerate(bucket):
+                    for second in bucket[i + 1:]:
+                        if _bit_count(first ^ second) <= max_distance:
+                            union(unique[first], unique[second])
+            shift += band_width
+
+    return [find(index) for index in range(len(hashes))]
+
+
+def make_asset_key(name: str, used_keys: Set[str]) -> str:
+    """
+    Make a valid and unique asset key from an album name. The name is transliterated to ASCII where possible, and a
+    number is appended if the key is already used.
+
+    :param name: Album name
+    :param used_keys: Asset keys already in use. The new key is added to it.
+    :return: The asset key
+    """
+
+    ascii_name = unicodedata.normalize("NFKD", name.lower().translate(TRANSLITERATIONS))
+    ascii_name = ascii_name.encode("ascii", "ignore").decode("ascii")
+    base = re.sub(r"[^a-z0-9]+", "_", ascii_name).strip("_") or "album"
+    asset_key = base[:MAX_ASSET_KEY_LENGTH].rstrip("_")
+
+    number = 2
+    while asset_key in used_keys:
+        suffix = f"_{number}"
+        asset_key = base[:MAX_ASSET_KEY_LENGTH - len(suffix)].rstrip("_") + suffix
+        number += 1
+
+    used_keys.add(asset_key)
+    return asset_key
+
+
+class AssetPack:
+    """
+    The result of packing: the contents of album_covers.json and album_name_exceptions.txt, and the image to upload
+    for each asset key.
+    """
+
+    __slots__ = ("album_covers", "exceptions", "images", "groups", "skipped_albums")
+
+    def __init__(self, album_covers: Dict[str, str], exceptions: List[str], images: Dict[str, str], groups: int,
+                 skipped_albums: int):
+        """
+        :param album_covers: Album name to asset key pairs
+        :param exceptions: Album names that must be looked up in format 'artist - album'
+        :param images: Path to the cover image by asset key
+        :param groups: Number of distinct covers found
+        :param skipped_albums: Number of albums left without an asset because of the asset limit
+        """
+        self.album_covers = album_covers
+        self.exceptions = exceptions
+        self.images = images
+        self.groups = groups
+        self.skipped_albums = skipped_albums
+
+
+def pack_assets(albums: List[LibraryAlbum],
+                hashes: Dict[str, int],
+                max_assets: int = MAX_ASSETS,
+                max_distance: int = 4,
+                rank: str = "plays",
+                existing_covers: Optional[Dict[str, str]] = None,
+                reserved_keys: Iterable[str] = ()
+                ) -> AssetPack:
+    """
+    Choose the albums that get an asset and generate their asset keys. Albums with the same cover share an asset, and
+    the covers are ranked by the total play count or size of their albums.
+
+    :param albums: Albums found in the library
+    :param hashes: Cover image hashes by image path
+    :param max_assets: Maximum number of album assets
+    :param max_distance: Maximum number of differing hash bits between covers considered the same
+    :param rank: 'plays' to rank by play count, falling back to track count, or 'size' to rank by total track size
+    :param existing_covers: Current album_covers.json. Asset keys of albums already in it are kept, so uploaded assets
+    stay valid.
+    :param reserved_keys: Asset keys used outside album_covers.json that cannot be generated
+    :return: The packed assets
+    """
+
+    albums = [album for album in albums if album.image_path in hashes]
+    groups: Dict[int, List[LibraryAlbum]] = {}
+    for album, group in zip(albums, group_duplicates([hashes[album.image_path] for album in albums], max_distance)):
+        groups.setdefault(group, []).append(album)
+
+    # An album name needs the artist if albums with the same name have different covers
+    covers_by_name: Dict[str, Set[int]] = {}
+    for group, members in groups.items():
+        for album in members:
+            covers_by_name.setdefault(normalize_name(album.name), set()).add(group)
+    exception_names = {name for name, covers in covers_by_name.items() if len(covers) > 1}
+
+    def lookup_name(album: LibraryAlbum) -> str:
+        if normalize_name(album.name) in exception_names:
+            return f"{album.artist or ''} - {album.name}"
+        return album.name
+
+    def score(album: LibraryAlbum) -> Tuple[int, int]:
+        return (album.size, album.tracks) if rank == "size" else (album.plays, album.tracks)
+
+    ranked = sorted(groups.values(), key=lambda members: tuple(map(sum, zip(*map(score, members)))), reverse=True)
+    selected = ranked[:max(0, max_assets)]
+
+    existing_keys = {}
+    for name, asset_key in (existing_covers or {}).items():
+        if validate_asset_key(asset_key) is None:
+            existing_keys[normalize_name(name)] = asset_key
+    used_keys = {key for key in reserved_keys if key}
+
+    album_covers = {}
+    images = {}
+    exceptions = set()
+    for members in selected:
+        members.sort(key=score, reverse=True)
+        asset_key = None
+        for album in members:
+            existing_key = existing_keys.get(normalize_name(lookup_name(album)))
+            if existing_key is not None and existing_key not in used_keys:
+                asset_key = existing_key
+                used_keys.add(asset_key)
+                break
+        if asset_key is None:
+            asset_key = make_asset_key(members[0].name, used_keys)
+
+        images[asset_key] = members[0].image_path
+        for album in members:
+            album_covers[lookup_name(album)] = asset_key
+            if normalize_name(album.name) in exception_names:
+                exceptions.add(album.name)
+
+    skipped_albums = sum(len(members) for members in ranked[len(selected):])
+    return AssetPack(album_covers, sorted(exceptions, key=normalize_name), images, len(groups), skipped_albums)
+
+
+def load_play_counts(history_directory: str) -> Dict[str, int]:
+    """
+    Read the play counts of albums from the listening history.
+
+    :param history_directory: Directory of the history log
+    :return: Play counts by normalized album name. Empty if there is no history.
+    """
+
+    if not os.path.isfile(os.path.join(history_directory, "names.txt")):
+        return {}
+
+    from history import HistoryLog
+
+    # The log may be appended to by main.py at the same time
+    log = HistoryLog(history_directory, read_only=True)
+    try:
+        names = log.names.names
+        play_counts = {}
+        for album_id, (plays, _) in log.summarize().albums.items():
+            name = normalize_name(names[album_id])
+            play_counts[name] = play_counts.get(name, 0) + plays
+    finally:
+        log.close()
+
+    return play_counts
+
+
+def main():
+    import argparse
+    from payload import load_settings
+
+    parser = argparse.ArgumentParser(description="Generate album_covers.json and album_name_exceptions.txt from the "
+                                                 "cover images in a music library.")
+    parser.add_argument("library", nargs="+", help="Music directories to scan")
+    parser.add_argument("--output", help="Directory of the generated files. Defaults to the WinampRPC directory.")
+    parser.add_argument("--rank", choices=("plays", "size"), default="plays",
+                        help="Choose albums by play count in the listening history or by total track size")
+    parser.add_argument("--max-assets", type=int,
+                        help=f"Maximum number of album assets. Defaults to {MAX_ASSETS} minus the default assets.")
+    parser.add_argument("--max-distance", type=int, default=4,
+                        help="Maximum number of differing hash bits between covers considered the same")
+    parser.add_argument("--workers", type=int, help="Number of processes hashing the images")
+    parser.add_argument("--export", help="Copy the cover image of each asset into this directory, named by asset key")
+    parser.add_argument("--dry-run", action="store_true", help="Show the results without writing any files")
+    args = parser.parse_args()
+
+    main_path = os.path.dirname(os.path.abspath(__file__))
+    settings = load_settings(main_path)
+    output = args.output or main_path
+    reserved_keys = [key for key in (settings["default_large_asset_key"], settings["small_asset_key"]) if key]
+    max_assets = args.max_assets if args.max_assets is not None else MAX_ASSETS - len(reserved_keys)
+    if Image is None:
+        print("Pillow is not installed, so only identical image files are merged. Install it with "
+              "'pip install Pillow' to merge resized and recompressed covers too.")
+
+    started = time.perf_counter()
+    metadata_provider = MetadataProvider(os.path.join(main_path, "metadata_cache.json"),
+                                         use_tags=settings["read_tags"], flush_every=1000)
+    albums = scan_library(args.library, metadata_provider)
+    metadata_provider.flush()
+    print(f"Found {len(albums)} albums with cover images.")
+
+    if args.rank == "plays":
+        play_counts = load_play_counts(settings["history_directory"] or os.path.join(main_path, "history"))
+        for album in albums:
+            album.plays = play_counts.get(normalize_name(album.name), 0)
+
+    hash_cache = ImageHashCache(os.path.join(main_path, "cover_hash_cache.json"))
+    hashes = hash_cache.hash_images([album.image_path for album in albums], args.workers)
+    hash_cache.save()
+    print(f"Hashed {hash_cache.misses} images, {hash_cache.hits} were unchanged since the last run.")
+
+    covers_filepath = os.path.join(output, "album_covers.json")
+    try:
+        with open(covers_filepath, encoding="utf8") as covers_file:
+            existing_covers = json.load(covers_file)
+    except FileNotFoundError:
+        existing_covers = {}
+
+    pack = pack_assets(albums, hashes, max_assets, args.max_distance, args.rank, existing_covers, reserved_keys)
+    print(f"Found {pack.groups} distinct covers. {len(pack.images)} assets cover {len(pack.album_covers)} albums, "
+          f"{pack.skipped_albums} albums did not fit in the asset limit.")
+    removed = len(set(map(normalize_name, existing_covers)) - set(map(normalize_name, pack.album_covers)))
+    if removed:
+        print(f"{removed} albums in the current album_covers.json are not included anymore.")
+
+    if not args.dry_run:
+        write_atomic(covers_filepath, json.dumps(pack.album_covers, indent=2, ensure_ascii=False))
+        write_atomic(os.path.join(output, "album_name_exceptions.txt"),
+                     "".join(f"{name}\n" for name in pack.exceptions))
+        if args.export:
+            os.makedirs(args.export, exist_ok=True)
+            for asset_key, image_path in pack.images.items():
+                shutil.copyfile(image_path, os.path.join(args.export, asset_key + os.path.splitext(image_path)[1]))
+            print(f"Copied the cover images into {args.export}. Upload them to the Discord application with the file "
+                  f"names as asset keys.")
+
+    print(f"Done in {time.perf_counter() - started:.1f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Album asset resolution for custom assets. Use AssetResolver to find Discord asset keys for albums listed in
+album_covers.json and album_name_exceptions.txt. The files are reloaded automatically when they change on disk.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple
+)
+
+MAX_ASSETS = 300
+"""
+Maximum number of assets a Discord application can have.
+"""
+MAX_ASSET_KEY_LENGTH = 30
+"""
+Maximum length of a Discord asset key.
+"""
+ASSET_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+"""
+Asset keys cannot contain special characters, including spaces.
+"""
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize an album or artist name for lookups. Names are compared case insensitively and in Unicode NFC form, so
+    e.g. precomposed and decomposed accented characters match each other.
+
+    :param name: Album or artist name
+    :return: Normalized name
+    """
+
+    return unicodedata.normalize("NFC", name).casefold().strip()
+
+
+def validate_asset_key(asset_key: str) -> Optional[str]:
+    """
+    Check an asset key against the Discord asset rules.
+
+    :param asset_key: The asset key to check
+    :return: Description of the problem, or None if the key is valid
+    """
+
+    if not isinstance(asset_key, str) or not asset_key:
+        return "asset key must be a non-empty string"
+    if len(asset_key) > MAX_ASSET_KEY_LENGTH:
+        return f"asset key is longer than {MAX_ASSET_KEY_LENGTH} characters"
+    if not ASSET_KEY_PATTERN.match(asset_key):
+        return "asset key contains special characters"
+
+    return None
+
+
+class AssetIndex:
+    """
+    An immutable lookup index built from the album covers and album name exceptions. AssetResolver replaces its index
+    as a whole when the files change, so lookups never see a partially loaded index.
+    """
+
+    __slots__ = ("album_keys", "exceptions", "problems")
+
+    def __init__(self, album_keys: Dict[str, str], exceptions: FrozenSet[str], problems: List[str]):
+        """
+        :param album_keys: Asset keys by normalized album key
+        :param exceptions: Normalized album names that must be looked up in format 'artist - album'
+        :param problems: Descriptions of entries that were skipped or break the Discord asset rules
+        """
+        self.album_keys = album_keys
+        self.exceptions = exceptions
+        self.problems = problems
+
+    @classmethod
+    def build(cls, album_covers: Dict[str, str], exceptions: Iterable[str],
+              reserved_keys: Iterable[str] = ()) -> "AssetIndex":
+        """
+        Build an index and validate the asset keys in it.
+
+        :param album_covers: Album name to asset key pairs as in album_covers.json
+        :param exceptions: Album names as in album_name_exceptions.txt
+        :param reserved_keys: Asset keys used outside album_covers.json, e.g. the default assets in settings.json.
+        These count towards the asset limit.
+        :return: The built index
+        """
+
+        problems = []
+        album_keys = {}
+        for album, asset_key in album_covers.items():
+            problem = validate_asset_key(asset_key)
+            if problem is not None:
+                problems.append(f"Skipped album '{album}': {problem}")
+                continue
+            album_keys[normalize_name(album)] = asset_key
+
+        asset_count = len(set(album_keys.values()).union(key for key in reserved_keys if key))
+        if asset_count > MAX_ASSETS:
+            problems.append(f"{asset_count} assets are used, but Discord allows only {MAX_ASSETS} per application")
+
+        exceptions = frozenset(normalize_name(album) for album in exceptions if album.strip())
+
+        return cls(album_keys, exceptions, problems)
+
+    def resolve(self, album_name: str, artist: str) -> Optional[str]:
+        """
+        Find the asset key for an album.
+
+        :param album_name: Name of the album
+        :param artist: Artist of the album. Used if the album name is in exceptions.
+        :return: The asset key, or None if the album has no asset
+        """
+
+        album_key = normalize_name(album_name)
+        if album_key in self.exceptions:
+            album_key = normalize_name(f"{artist} - {album_name}")
+
+        return self.album_keys.get(album_key)
+
+
+class AssetResolver:
+    """
+    Resolve album asset keys from album_covers.json and album_name_exceptions.txt. The files are checked for changes
+    at most once per check interval, and reloaded if their modification time or size has changed. If a changed file
+    cannot be loaded, e.g. because it is still being written, the previous index is kept in use.
+    """
+
+    def __init__(self,
+                 covers_filepath: str,
+                 exceptions_filepath: str,
+                 reserved_keys: Iterable[str] = (),
+                 check_interval: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param covers_filepath: Path to album_covers.json
+        :param exceptions_filepath: Path to album_name_exceptions.txt
+        :param reserved_keys: Asset keys used outside album_covers.json that count towards the asset limit
+        :param check_interval: Minimum time in seconds between checking the files for changes
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.covers_filepath = covers_filepath
+        self.exceptions_filepath = exceptions_filepath
+        self.reserved_keys = tuple(reserved_keys)
+        self.check_interval = check_interval
+        self.clock = clock
+        self.reloads = 0
+        """
+        Number of times the index has been built.
+        """
+
+        self.index = AssetIndex({}, frozenset(), [])
+        self._signatures = None
+        self._last_check = None
+        self._reload_lock = threading.Lock()
+
+    @staticmethod
+    def _stat_signature(filepath: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def load(self) -> List[str]:
+        """
+        Load both files and replace the current index.
+
+        :return: Descriptions of problems found in the files
+        :raises FileNotFoundError: If album_covers.json does not exist
+        :raises ValueError: If album_covers.json is not valid JSON or not a JSON object
+        """
+
+        signatures = (self._stat_signature(self.covers_filepath), self._stat_signature(self.exceptions_filepath))
+
+        with open(self.covers_filepath, encoding="utf8") as data_file:
+            album_covers = json.load(data_file)
+        if not isinstance(album_covers, dict):
+            raise ValueError(f"{self.covers_filepath} must contain a JSON object of album names and asset keys, not "
+                             f"{type(album_covers).__name__}")
+
+        try:
+            with open(self.exceptions_filepath, "r", encoding="utf8") as exceptions_file:
+                exceptions = exceptions_file.read().splitlines()
+        except FileNotFoundError:
+            exceptions = []
+
+        self.index = AssetIndex.build(album_covers, exceptions, self.reserved_keys)
+        self._signatures = signatures
+        self._last_check = self.clock()
+        self.reloads += 1
+
+        return self.index.problems
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the files if they have changed since they were last loaded. This method is thread safe, and a reload
+        already running in another thread is not waited for.
+
+        :return: True if a new index was taken into use
+        """
+
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._reload_if_changed()
+        finally:
+            self._reload_lock.release()
+
+    def _reload_if_changed(self) -> bool:
+        now = self.clock()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        signatures = (self._stat_signature(self.covers_filepath), self._stat_signature(self.exceptions_filepath))
+        if signatures == self._signatures:
+            return False
+
+        try:
+            problems = self.load()
+        except (OSError, ValueError) as e:
+            # Do not try again until the files change again
+            self._signatures = signatures
+            print(f"Could not reload album assets, using previously loaded assets: {e}")
+            return False
+
+        for problem in problems:
+            print(problem)
+
+        return True
+
+    def resolve(self, album_name: str, artist: str) -> Optional[str]:
+        """
+        Find the asset key for an album, reloading the asset files first if they have changed.
+
+        :param album_name: Name of the album
+        :param artist: Artist of the album. Used if the album name is in exceptions.
+        :return: The asset key, or None if the album has no asset
+        """
+
+        self.reload_if_changed()
+        return self.index.resolve(album_name, artist)
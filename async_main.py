@@ -0,0 +1,268 @@
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Optional,
+    Union
+)
+
+from async_winamp import AsyncWinamp
+from events import PlayerWatcher, Paused, Stopped
+from payload import PayloadBuilder, load_settings, load_asset_resolver, load_metadata_provider
+from playlist import PlaylistCache
+from prefetch import PayloadPrefetcher
+from poll_scheduler import PollScheduler
+from presence_scheduler import TokenBucket
+from supervisor import AioDiscordEndpoint, ConnectionSupervisor, ConnectionEvent, ConnectionState, WinampEndpoint
+from pypresence import AioPresence
+
+PRESENCE_TIMEOUT = 10.0
+"""
+Time in seconds to wait for Discord to respond to a presence update before giving up on it.
+"""
+
+
+class LatestValue:
+    """
+    A single slot channel between two tasks. Setting a new value replaces a value that has not been read yet, so the
+    reader always gets the latest value.
+    """
+
+    def __init__(self):
+        self._value = None
+        self._has_value = False
+        self._event = asyncio.Event()
+
+    def set(self, value: Any):
+        self._value = value
+        self._has_value = True
+        self._event.set()
+
+    def repeat(self):
+        """
+        Give the latest value to the reader again, even if it has already been read.
+        """
+        if self._has_value:
+            self._event.set()
+
+    def take(self, default: Any = None) -> Any:
+        """
+        Get the latest value without waiting.
+
+        :param default: Value returned if no new value has been set since the previous read
+        """
+
+        if not self._event.is_set():
+            return default
+
+        self._event.clear()
+        return self._value
+
+    async def get(self) -> Any:
+        """
+        Wait for a new value and return it.
+        """
+
+        await self._event.wait()
+        return self.take()
+
+
+async def sample_player(winamp: AsyncWinamp, watcher: PlayerWatcher, states: LatestValue):
+    """
+    Sample Winamp in the interval chosen by the watcher and publish the state to be shown in the presence. The state
+    is None when the presence should be cleared, otherwise it is a tuple of arguments for PayloadBuilder.build().
+
+    :raises ConnectionError: If the connection to Winamp is lost
+    """
+
+    while True:
+        events = await winamp.call(watcher.check)
+        if events:
+            event = events[-1]
+            if isinstance(event, (Paused, Stopped)):
+                states.set(None)
+            else:
+                # The snapshot read by the watcher has everything the payload needs, so no more messages are sent
+                snapshot = watcher.snapshot
+                states.set((snapshot.title, snapshot.playlist_position, event.position or 0, time.time()))
+
+        await asyncio.sleep(watcher.next_interval())
+
+
+async def supervise_player(winamp: AsyncWinamp, watcher: PlayerWatcher, states: LatestValue,
+                           supervisor: ConnectionSupervisor, winamp_endpoint: WinampEndpoint,
+                           playlist_cache: PlaylistCache, payload_builder: PayloadBuilder):
+    """
+    Sample the player while Winamp is connected, and wait for the connection supervisor to connect it again when it
+    is closed.
+    """
+
+    loop = asyncio.get_running_loop()
+    while True:
+        # The supervisor is waited for in the default executor. The timeout lets the task be cancelled on exit.
+        while not await loop.run_in_executor(None, supervisor.wait_until_connected, 5.0):
+            pass
+
+        # Winamp may have been restarted with a different playlist
+        playlist_cache.invalidate()
+        watcher.reset()
+        try:
+            payload_builder.winamp_version = await winamp.call(lambda: winamp.winamp.version)
+            await sample_player(winamp, watcher, states)
+        except ConnectionError as e:
+            supervisor.report_failure(winamp_endpoint, e)
+            # Nothing is playing while Winamp is closed
+            states.set(None)
+
+
+async def publish_presence(discord: AioDiscordEndpoint, states: LatestValue,
+                           payload_builder: Union[PayloadBuilder, PayloadPrefetcher], bucket: TokenBucket,
+                           io_executor: ThreadPoolExecutor):
+    """
+    Send the latest state to Discord. Payloads are built in the I/O executor, because resolving album assets may dump
+    and read the playlist. States are coalesced while waiting for the rate limit.
+
+    States are skipped while Discord is not connected. A failed update marks the connection as lost, so the
+    connection supervisor connects again, and the latest state is sent to the new client after states.repeat().
+    """
+
+    loop = asyncio.get_running_loop()
+    last_payload: Optional[dict] = None
+    last_client: Optional[AioPresence] = None
+
+    while True:
+        state = await states.get()
+        delay = bucket.time_until_available()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            state = states.take(state)
+
+        rpc = discord.client
+        if rpc is None or not discord.is_alive():
+            continue
+
+        if state is None:
+            payload = None
+        else:
+            payload = await loop.run_in_executor(io_executor, payload_builder.build, *state)
+        if rpc is last_client and payload == last_payload:
+            continue
+
+        bucket.try_acquire()
+        try:
+            if payload is None:
+                await asyncio.wait_for(rpc.clear(), PRESENCE_TIMEOUT)
+            else:
+                await asyncio.wait_for(rpc.update(**payload), PRESENCE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("Discord did not respond to presence update in time.")
+        except Exception as e:
+            print(f"Could not update Discord presence: {e}")
+            discord.mark_failed(e)
+        else:
+            last_payload, last_client = payload, rpc
+
+
+def on_connection_event(event: ConnectionEvent):
+    """
+    Report connection changes.
+
+    :param event: Event dispatched by ConnectionSupervisor
+    """
+
+    if event.state == ConnectionState.Connected:
+        print(f"Connected to {event.endpoint.capitalize()}.")
+    elif event.previous == ConnectionState.Connected:
+        print(f"Lost connection to {event.endpoint.capitalize()}. Waiting for it to be available again.")
+
+
+async def main():
+    # Get the directory where this script was executed to make sure Python can find all files.
+    main_path = os.path.dirname(__file__)
+    settings = load_settings(main_path)
+    loop = asyncio.get_running_loop()
+    io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="PresenceIO")
+
+    # Winamp and Discord are connected later by the connection supervisor if they are not running yet
+    winamp = await AsyncWinamp.create()
+    # The playlist cache and the prefetcher run in their own threads, so their messages are sent through the worker
+    # thread of the controller
+    blocking_winamp = winamp.blocking()
+    winamp_endpoint = WinampEndpoint(blocking_winamp)
+    discord_endpoint = AioDiscordEndpoint(lambda: AioPresence(settings["client_id"], loop=loop), loop)
+    supervisor = ConnectionSupervisor([winamp_endpoint, discord_endpoint])
+    states = LatestValue()
+
+    def on_discord_connected(event: ConnectionEvent):
+        # A new Discord client does not show anything, so the current state is sent again
+        if event.endpoint == discord_endpoint.name and event.state == ConnectionState.Connected:
+            loop.call_soon_threadsafe(states.repeat)
+
+    supervisor.subscribe(on_connection_event)
+    supervisor.subscribe(on_discord_connected)
+    supervisor.start()
+
+    playlist_cache = PlaylistCache(blocking_winamp)
+    asset_resolver = await loop.run_in_executor(io_executor, load_asset_resolver, main_path, settings)
+    metadata_provider = await loop.run_in_executor(io_executor, load_metadata_provider, main_path, settings)
+    # The Winamp version is set when Winamp is connected
+    payload_builder = PayloadBuilder(settings, "", playlist_cache, asset_resolver, metadata_provider=metadata_provider)
+    prefetcher = None
+    if settings["prefetch_tracks"] > 0:
+        prefetcher = PayloadPrefetcher(payload_builder, blocking_winamp, settings["prefetch_tracks"])
+        prefetcher.start()
+
+    bucket = TokenBucket(settings["presence_updates_per_interval"],
+                         settings["presence_updates_per_interval"] / settings["presence_update_interval"])
+
+    print()
+    print("Winamp status is now being updated to Discord (if the Discord activity privacy settings allow this).")
+    print("To exit, simply press CTRL + C.")
+
+    # There is no window title hook here, so pauses and stops are noticed by sampling only
+    poll_scheduler = PollScheduler(max_idle_interval=5.0, wakeups_per_minute=settings["poll_wakeups_per_minute"])
+    watcher = PlayerWatcher(winamp.winamp, scheduler=poll_scheduler)
+    try:
+        await asyncio.gather(supervise_player(winamp, watcher, states, supervisor, winamp_endpoint, playlist_cache,
+                                              payload_builder),
+                             publish_presence(discord_endpoint, states, prefetcher or payload_builder, bucket,
+                                              io_executor))
+    finally:
+        supervisor.stop()
+        # The prefetcher sends messages through the worker thread, so it is stopped before the worker
+        if prefetcher is not None:
+            prefetcher.stop()
+        winamp.close()
+        io_executor.shutdown(wait=False)
+        if metadata_provider is not None:
+            metadata_provider.flush()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
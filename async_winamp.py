@@ -0,0 +1,245 @@
+"""
+An asyncio wrapper for the Winamp controller. Use AsyncWinamp to control Winamp from coroutines without blocking the
+event loop while Winamp processes the messages.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Optional,
+    Tuple,
+    Union
+)
+
+from winamp import (
+    Winamp,
+    MenuCommand,
+    UserCommand,
+    PlayingStatus,
+    CurrentTrack,
+    PlayerSnapshot
+)
+
+
+class AsyncWinamp:
+    """
+    An asyncio controller class for Winamp. All messages are sent from a single worker thread, so SendMessage calls
+    that block while Winamp is busy do not block the event loop. The wrapped controller is never used from two
+    threads at once, as long as code running in other threads, e.g. a PlaylistCache, uses it through blocking().
+    """
+
+    def __init__(self, winamp: Winamp, executor: Optional[ThreadPoolExecutor] = None):
+        """
+        :param winamp: Connected Winamp controller to wrap
+        :param executor: Executor the messages are sent from. Should have only one worker. By default a new
+        single worker executor is created.
+        """
+        self.winamp = winamp
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncWinamp")
+
+    @classmethod
+    async def create(cls, executor: Optional[ThreadPoolExecutor] = None) -> "AsyncWinamp":
+        """
+        Create a Winamp controller and connect it to Winamp in the worker thread.
+
+        :param executor: Executor the messages are sent from. By default a new single worker executor is created.
+        :return: The connected AsyncWinamp
+        """
+
+        executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncWinamp")
+        winamp = await asyncio.get_running_loop().run_in_executor(executor, Winamp)
+
+        return cls(winamp, executor)
+
+    async def call(self, func: Callable, *args) -> Any:
+        """
+        Run a function in the worker thread. Use this to run several synchronous calls to the wrapped controller as
+        one unit.
+
+        :param func: The function to run
+        :param args: Arguments passed to the function
+        :return: Return value of the function
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args))
+
+    def blocking(self) -> "BlockingWinamp":
+        """
+        Get a synchronous view of the wrapped controller for code running in other threads than the event loop.
+
+        :return: The controller view
+        """
+        return BlockingWinamp(self.winamp, self._executor)
+
+    def close(self):
+        """
+        Shut down the worker thread.
+        """
+        self._executor.shutdown(wait=False)
+
+    @property
+    def version(self) -> str:
+        """
+        The Winamp version.
+        """
+        return self.winamp.version
+
+    async def connect(self):
+        """
+        Connect to a Winamp client.
+        """
+        await self.call(self.winamp.connect)
+
+    async def send_command(self, command: Union[MenuCommand, int]) -> int:
+        """
+        Send WM_COMMAND message to Winamp. See Winamp.send_command().
+        """
+        return await self.call(self.winamp.send_command, command)
+
+    async def send_user_command(self, command: Union[UserCommand, int], data: int = 0) -> int:
+        """
+        Send WM_USER message to Winamp API. See Winamp.send_user_command().
+        """
+        return await self.call(self.winamp.send_user_command, command, data)
+
+    async def get_current_track(self) -> Optional[CurrentTrack]:
+        """
+        Fetch the current track. See Winamp.current_track.
+        """
+        return await self.call(lambda: self.winamp.current_track)
+
+    async def snapshot(self, title_key: Optional[Callable[[str], Hashable]] = None) -> PlayerSnapshot:
+        """
+        Read the player state in a single pass. See Winamp.snapshot().
+        """
+        return await self.call(self.winamp.snapshot, title_key)
+
+    async def get_track_title(self) -> str:
+        """
+        Get the current track title. See Winamp.get_track_title().
+        """
+        return await self.call(self.winamp.get_track_title)
+
+    async def get_playing_status(self) -> PlayingStatus:
+        """
+        Get current playing status. See Winamp.get_playing_status().
+        """
+        return await self.call(self.winamp.get_playing_status)
+
+    async def get_track_status(self) -> Tuple[int, int]:
+        """
+        Get the current track length and position in milliseconds. See Winamp.get_track_status().
+        """
+        return await self.call(self.winamp.get_track_status)
+
+    async def change_track(self, track_number: int) -> int:
+        """
+        Change the track to specific track number. See Winamp.change_track().
+        """
+        return await self.call(self.winamp.change_track, track_number)
+
+    async def get_playlist_position(self) -> Optional[int]:
+        """
+        Get current track position in the playlist. See Winamp.get_playlist_position().
+        """
+        return await self.call(self.winamp.get_playlist_position)
+
+    async def seek_track(self, position: int) -> int:
+        """
+        Seek current track position to position in milliseconds. See Winamp.seek_track().
+        """
+        return await self.call(self.winamp.seek_track, position)
+
+    async def set_volume(self, volume_level: int) -> int:
+        """
+        Set the players' playback volume. See Winamp.set_volume().
+        """
+        return await self.call(self.winamp.set_volume, volume_level)
+
+    async def get_playlist_length(self) -> int:
+        """
+        Get the number of tracks in current playlist. See Winamp.get_playlist_length().
+        """
+        return await self.call(self.winamp.get_playlist_length)
+
+    async def get_shuffle(self) -> bool:
+        """
+        Get the shuffle status of the player. See Winamp.get_shuffle().
+        """
+        return await self.call(self.winamp.get_shuffle)
+
+    async def get_track_info(self) -> Tuple[int, int, int]:
+        """
+        Get the sample rate, bitrate and number of channels of the current track. See Winamp.get_track_info().
+        """
+        return await self.call(self.winamp.get_track_info)
+
+    async def dump_playlist(self) -> int:
+        """
+        Dump the current playlist into file WINAMPDIR/winamp.m3u. See Winamp.dump_playlist().
+        """
+        return await self.call(self.winamp.dump_playlist)
+
+
+class BlockingWinamp:
+    """
+    A synchronous view of a controller wrapped by AsyncWinamp. Methods, properties and attribute assignments run in
+    the worker thread of the AsyncWinamp, and the calling thread blocks until they are done, so the controller is
+    still used from one thread only. Must not be used from the event loop or the worker thread itself. Generators such
+    as iter_playlist_entries() are only created in the worker thread, so they must be consumed with AsyncWinamp.call().
+    """
+
+    __slots__ = ("_winamp", "_executor")
+
+    def __init__(self, winamp: Winamp, executor: ThreadPoolExecutor):
+        """
+        :param winamp: The controller wrapped by AsyncWinamp
+        :param executor: The single worker executor of the AsyncWinamp
+        """
+        object.__setattr__(self, "_winamp", winamp)
+        object.__setattr__(self, "_executor", executor)
+
+    def _call(self, func: Callable, *args, **kwargs) -> Any:
+        return self._executor.submit(func, *args, **kwargs).result()
+
+    def __getattr__(self, name: str) -> Any:
+        # Properties may send messages, so they are read in the worker thread
+        if isinstance(getattr(type(self._winamp), name, None), property):
+            return self._call(getattr, self._winamp, name)
+
+        attribute = getattr(self._winamp, name)
+        if not callable(attribute):
+            return attribute
+
+        return partial(self._call, attribute)
+
+    def __setattr__(self, name: str, value: Any):
+        self._call(setattr, self._winamp, name, value)
@@ -0,0 +1,44 @@
+"""
+Atomic file writes. Use write_atomic to replace a file that other programs or threads may read at any time, e.g. a
+cache, a status file for OBS or a Prometheus textfile, so readers never see a partially written file.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+
+def write_atomic(filepath: str, content: str):
+    """
+    Write a text file by writing a temporary file next to it and renaming it over the file.
+
+    :param filepath: Path to the file
+    :param content: The new content of the file
+    """
+
+    temp_filepath = f"{filepath}.tmp"
+    with open(temp_filepath, "w", encoding="utf8") as temp_file:
+        temp_file.write(content)
+    os.replace(temp_filepath, filepath)
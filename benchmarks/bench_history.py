@@ -0,0 +1,99 @@
+"""
+Benchmark the listening history log. Appends generated play records, then measures reopening the log with and
+without saved aggregates, a query of a single day and a summary of a month, for each record count.
+
+Usage: python benchmarks/bench_history.py [--records 1000000 5000000] [--sync-every 1024]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryLog  # noqa: E402
+
+START_TIME = 1_600_000_000.0
+PLAY_INTERVAL = 200.0
+"""
+Average time in seconds between generated plays.
+"""
+
+
+def fill(log: HistoryLog, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = log.names
+    artists = [names.intern(f"Artist {i}") for i in range(2000)]
+    albums = [names.intern(f"Album {i}") for i in range(10000)]
+    titles = [names.intern(f"Track {i}") for i in range(100000)]
+
+    timestamp = START_TIME
+    for _ in range(count):
+        timestamp += rng.uniform(0, 2 * PLAY_INTERVAL)
+        log.append_raw((timestamp, rng.randint(5000, 400000), rng.choice(artists), rng.choice(albums),
+                        rng.choice(titles)))
+    log.close()
+
+
+def run(count: int, sync_every: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="winamprpc_history_")
+    try:
+        log = HistoryLog(directory, sync_every=sync_every)
+        start = time.perf_counter()
+        fill(log, count)
+        append_seconds = time.perf_counter() - start
+        syncs = log.syncs
+
+        start = time.perf_counter()
+        log = HistoryLog(directory)
+        reopen_seconds = time.perf_counter() - start
+
+        # Simulate a crash after the last aggregates were saved, so the whole log is replayed
+        os.remove(log.aggregates_filepath)
+        start = time.perf_counter()
+        log = HistoryLog(directory)
+        replay_seconds = time.perf_counter() - start
+
+        middle = START_TIME + count * PLAY_INTERVAL / 2
+        start = time.perf_counter()
+        day_records = sum(1 for _ in log.iter_records(middle, middle + 86400))
+        day_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        month = log.summarize(middle, middle + 30 * 86400)
+        month_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        log.top(log.summarize().artists, 10)
+        top_seconds = time.perf_counter() - start
+
+        size = sum(os.path.getsize(path) for path, _ in log.segments)
+        return {"benchmark": "history", "records": count, "sync_every": sync_every, "syncs": syncs,
+                "append_seconds": round(append_seconds, 6),
+                "ns_per_append": round(append_seconds / count * 1e9),
+                "reopen_seconds": round(reopen_seconds, 6), "replay_seconds": round(replay_seconds, 6),
+                "day_query_seconds": round(day_seconds, 6), "day_records": day_records,
+                "month_summary_seconds": round(month_seconds, 6), "month_records": month.records,
+                "all_time_top_seconds": round(top_seconds, 6),
+                "segment_bytes": size, "bytes_per_record": round(size / count, 2)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[1000000, 5000000])
+    parser.add_argument("--sync-every", type=int, default=1024)
+    args = parser.parse_args()
+
+    for count in args.records:
+        print(json.dumps(run(count, args.sync_every)))
+
+
+if __name__ == "__main__":
+    main()
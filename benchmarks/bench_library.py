@@ -0,0 +1,77 @@
+"""
+Benchmark library indexing. Generates an artist\\album\\track directory tree of empty track files and measures the
+initial scan, a rescan of the unchanged library, a rescan after adding one album, and track lookups.
+
+Usage: python benchmarks/bench_library.py [--files 500000] [--tracks-per-album 10]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_index import RACY_WINDOW_NS, LibraryIndex  # noqa: E402
+
+
+def write_library(root: str, files: int, tracks_per_album: int):
+    """
+    Create empty track files and a cover for every album.
+
+    :param root: Music directory
+    :param files: Number of track files
+    :param tracks_per_album: Number of track files in each album directory
+    """
+
+    for i in range(0, files, tracks_per_album):
+        album = i // tracks_per_album
+        album_directory = os.path.join(root, f"Artist {album // 10}", f"Album {album}")
+        os.makedirs(album_directory)
+        open(os.path.join(album_directory, "cover.jpg"), "wb").close()
+        for track in range(min(tracks_per_album, files - i)):
+            open(os.path.join(album_directory, f"{track + 1:02d} Track {track + 1}.mp3"), "wb").close()
+
+
+def measure(name: str, index: LibraryIndex, files: int) -> dict:
+    # Directories modified just before a scan are listed again on the next scan, so they are let age first
+    time.sleep(RACY_WINDOW_NS / 1e9)
+    result = index.rescan()
+
+    return {"benchmark": name, "files": files, "seconds": round(result.seconds, 6), "directories": result.directories,
+            "changed_directories": result.changed_directories, "added": result.added}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=500000)
+    parser.add_argument("--tracks-per-album", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "Music")
+        write_library(root, args.files, args.tracks_per_album)
+        index = LibraryIndex(os.path.join(directory, "library.sqlite3"), [root], use_tags=False)
+
+        print(json.dumps(measure("library_initial_scan", index, args.files)))
+        print(json.dumps(measure("library_rescan", index, args.files)))
+        write_library(os.path.join(root, "New Artist"), args.tracks_per_album, args.tracks_per_album)
+        print(json.dumps(measure("library_rescan_changed", index, args.files)))
+
+        track_paths = [os.path.join(root, f"Artist {album // 10}", f"Album {album}", "01 Track 1.mp3")
+                       for album in range(0, args.files // args.tracks_per_album)]
+        start = time.perf_counter()
+        for i in range(args.lookups):
+            index.get(track_paths[i % len(track_paths)])
+        elapsed = time.perf_counter() - start
+        print(json.dumps({"benchmark": "library_lookup", "files": args.files, "lookups": args.lookups,
+                          "seconds": round(elapsed, 6), "lookups_per_second": round(args.lookups / elapsed),
+                          "hits": index.hits}))
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark playlist parsing throughput and peak memory usage. Compares the streaming Winamp.iter_playlist parser and the
+Winamp.get_playlist wrapper against the previous read-and-split implementation.
+
+Usage: python benchmarks/bench_playlist.py [--entries 1000 100000 1000000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import (
+    Callable,
+    List
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from winamp import Winamp  # noqa: E402
+
+
+def write_playlist(path: str, entries: int):
+    """
+    Write an extended M3U8 playlist with given number of entries in the same format Winamp dumps its playlist.
+
+    :param path: Path of the playlist file to write
+    :param entries: Number of entries in the playlist
+    """
+
+    with open(path, "w", encoding="utf-8-sig", newline="\r\n") as playlist_file:
+        playlist_file.write("#EXTM3U\n")
+        for i in range(entries):
+            artist, album = f"Artist {i % 997}", f"Album {i % 4999}"
+            playlist_file.write(f"#EXTINF:{180 + i % 240},{artist} - Track {i}\n")
+            playlist_file.write(f"C:\\Music\\{artist}\\{album}\\{i:06d} Track {i}.mp3\n")
+
+
+def legacy_get_playlist(playlist_filepath: str) -> List[str]:
+    """
+    The playlist parser used before Winamp.iter_playlist, kept here as a baseline.
+    """
+
+    with open(playlist_filepath, "r", encoding="utf-8-sig") as playlist_file:
+        lines = playlist_file.read().splitlines()
+
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def consume_iter_playlist(playlist_filepath: str) -> int:
+    count = 0
+    for _ in Winamp.iter_playlist(playlist_filepath):
+        count += 1
+
+    return count
+
+
+def measure(func: Callable, path: str, entries: int) -> dict:
+    """
+    Measure wall time and peak traced memory of a single parser run.
+
+    :return: Dictionary of the measurements
+    """
+
+    start = time.perf_counter()
+    func(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": round(elapsed, 6), "entries_per_second": round(entries / elapsed),
+            "peak_memory_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    parsers = {
+        "legacy_get_playlist": legacy_get_playlist,
+        "get_playlist": Winamp.get_playlist,
+        "iter_playlist": consume_iter_playlist,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for entries in args.entries:
+            path = os.path.join(tmp_dir, f"playlist_{entries}.m3u8")
+            write_playlist(path, entries)
+            for name, func in parsers.items():
+                result = {"benchmark": name, "entries": entries}
+                result.update(measure(func, path, entries))
+                print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
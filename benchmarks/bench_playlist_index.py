@@ -0,0 +1,135 @@
+"""
+Benchmark PlaylistIndex: the time to index a dumped playlist, to index it again after tracks are appended, and the
+latency of exact, partial and misspelled queries. The playlist is dumped by a simulated Winamp, and its titles and
+paths are made of random made-up words, so the queries hit common and rare words like in a real library.
+
+Usage: python benchmarks/bench_playlist_index.py [--entries 1000 100000] [--queries 1000]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import (
+    Callable,
+    List
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist import PlaylistCache  # noqa: E402
+from playlist_index import PlaylistIndex  # noqa: E402
+from winamp import Winamp, PlaylistEntry  # noqa: E402
+from winamp_simulator import SimulatedWinamp  # noqa: E402
+
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiouy"
+
+
+def make_word(rng: random.Random) -> str:
+    # Alternating consonants and vowels make pronounceable words that share trigrams like words of a real language
+    length = rng.randint(3, 9)
+    first = rng.randrange(2)
+    return "".join(rng.choice(VOWELS if (first + i) % 2 else CONSONANTS) for i in range(length))
+
+
+def generate_library(entries: int, seed: int = 0) -> List[PlaylistEntry]:
+    """
+    Generate a playlist of albums by artists with made-up names.
+
+    :param entries: Number of tracks in the playlist
+    :param seed: Seed for the random words
+    :return: The playlist entries
+    """
+
+    rng = random.Random(seed)
+    artists = [" ".join(make_word(rng).capitalize() for _ in range(rng.randint(1, 2)))
+               for _ in range(max(1, entries // 100))]
+    playlist = []
+    while len(playlist) < entries:
+        artist = rng.choice(artists)
+        album = " ".join(make_word(rng).capitalize() for _ in range(rng.randint(1, 3)))
+        for number in range(1, min(rng.randint(8, 14), entries - len(playlist)) + 1):
+            track_name = " ".join(make_word(rng) for _ in range(rng.randint(1, 4))).capitalize()
+            path = f"C:\\Music\\{artist}\\{album}\\{number:02d} {track_name}.mp3"
+            playlist.append(PlaylistEntry(path, rng.randint(120, 420), f"{artist} - {track_name}"))
+
+    return playlist
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:] if rng.random() < 0.5 else word[:index] + "x" + word[index + 1:]
+
+
+def make_queries(playlist: List[PlaylistEntry], count: int, kind: str, rng: random.Random) -> List[str]:
+    """
+    Make queries for random tracks of the playlist: the artist and track name, their first letters, or the same with
+    one letter of each word dropped or replaced.
+    """
+
+    queries = []
+    for _ in range(count):
+        words = [word.lower() for word in rng.choice(playlist).title.replace(" - ", " ").split()]
+        words = rng.sample(words, min(len(words), 3))
+        if kind == "partial":
+            words = [word[:4] for word in words]
+        elif kind == "misspelled":
+            words = [misspell(word, rng) for word in words]
+        queries.append(" ".join(words))
+
+    return queries
+
+
+def timed(func: Callable) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_playlist_index(entries: int, query_count: int, tmp_dir: str) -> List[dict]:
+    rng = random.Random(entries)
+    playlist = generate_library(entries)
+    simulator = SimulatedWinamp(playlist, dump_filepath=os.path.join(tmp_dir, f"Winamp_{entries}.m3u8"))
+    winamp = Winamp(simulator)
+    playlist_cache = PlaylistCache(winamp, simulator.dump_filepath)
+    index = PlaylistIndex(winamp, playlist_cache)
+
+    build_seconds = timed(index.update)
+    appended = generate_library(max(1, entries // 100), seed=1)
+    simulator.set_playlist(playlist + appended)
+    append_seconds = timed(index.update)
+    results = [{"benchmark": "playlist_index_build", "entries": entries, "seconds": round(build_seconds, 6),
+                "append_entries": len(appended), "append_seconds": round(append_seconds, 6),
+                "words": len(index._word_list)}]
+
+    for kind in ("exact", "partial", "misspelled"):
+        queries = make_queries(playlist, query_count, kind, rng)
+        latencies = sorted(timed(lambda: index.find_tracks(query)) for query in queries)
+        results.append({"benchmark": "playlist_index_query", "entries": entries, "mode": kind,
+                        "queries": query_count,
+                        "ms_median": round(statistics.median(latencies) * 1000, 3),
+                        "ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+                        "ms_max": round(latencies[-1] * 1000, 3)})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--queries", type=int, default=1000, help="Number of queries of each kind")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for entries in args.entries:
+            for result in bench_playlist_index(entries, args.queries, tmp_dir):
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark the presence pipeline against a simulated Winamp. Measures PayloadBuilder.get_album_art end to end, with
+the track paths read through IPC and from the dumped playlist, and the wall time and number of Winamp messages of main
+loop ticks: steady ticks while a track plays and ticks that change the track and build a new presence.
+
+Usage: python benchmarks/bench_presence.py [--entries 1000 100000 1000000] [--lookups 2000] [--ticks 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets import AssetResolver  # noqa: E402
+from events import PlayerWatcher, PlayerEvent, Paused, Stopped, Seeked  # noqa: E402
+from payload import DEFAULT_SETTINGS, PayloadBuilder  # noqa: E402
+from playlist import PlaylistCache  # noqa: E402
+from winamp import Winamp, MenuCommand  # noqa: E402
+from winamp_simulator import SimulatedWinamp, generate_playlist  # noqa: E402
+
+ALBUM_ASSETS = 300
+
+
+class FakePresence:
+    """
+    Stand-in for the pypresence client that only counts the calls.
+    """
+
+    def __init__(self):
+        self.updates = 0
+        self.clears = 0
+
+    def update(self, **_payload):
+        self.updates += 1
+
+    def clear(self):
+        self.clears += 1
+
+
+class Pipeline:
+    """
+    The same event handling main.py does, without the module level state.
+    """
+
+    def __init__(self, watcher: PlayerWatcher, builder: PayloadBuilder, presence: FakePresence):
+        self.watcher = watcher
+        self.builder = builder
+        self.presence = presence
+        self.previous_track = ""
+        self.payload = None
+        watcher.subscribe(self.on_player_event)
+
+    def on_player_event(self, event: PlayerEvent):
+        if isinstance(event, (Paused, Stopped)):
+            self.presence.clear()
+            self.previous_track = ""
+        elif isinstance(event, Seeked):
+            if self.payload is not None:
+                self.payload = dict(self.payload, start=int(time.time() - event.position / 1000))
+                self.presence.update(**self.payload)
+        elif event.title != self.previous_track:
+            self.previous_track = event.title
+            self.payload = self.builder.build(event.title, self.watcher.snapshot.playlist_position,
+                                              event.position or 0, time.time())
+            self.presence.update(**self.payload)
+
+
+def setup(directory: str, playlist, use_ipc: bool):
+    """
+    Create a simulated Winamp with custom assets for the first albums in the playlist.
+
+    :return: The simulator, controller, playlist cache and payload builder
+    """
+
+    dump_filepath = os.path.join(directory, "Winamp.m3u8")
+    simulator = SimulatedWinamp(playlist, dump_filepath=dump_filepath)
+    winamp = Winamp(simulator)
+    playlist_cache = PlaylistCache(winamp, dump_filepath, use_ipc=use_ipc)
+
+    covers_filepath = os.path.join(directory, "album_covers.json")
+    with open(covers_filepath, "w", encoding="utf8") as covers_file:
+        json.dump({f"Album {i}": f"album_{i}" for i in range(ALBUM_ASSETS)}, covers_file)
+    resolver = AssetResolver(covers_filepath, os.path.join(directory, "album_name_exceptions.txt"))
+    resolver.load()
+
+    settings = dict(DEFAULT_SETTINGS, custom_assets=True)
+    builder = PayloadBuilder(settings, winamp.version, playlist_cache, resolver)
+
+    return simulator, winamp, playlist_cache, builder
+
+
+def bench_album_art(playlist, use_ipc: bool, lookups: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        simulator, _, playlist_cache, builder = setup(directory, playlist, use_ipc)
+        rng = random.Random(0)
+        positions = [rng.randrange(len(playlist)) for _ in range(lookups)]
+
+        # The first lookup dumps and indexes the playlist if IPC is not used
+        simulator.reset_counters()
+        start = time.perf_counter()
+        builder.get_album_art(positions[0], "")
+        first_seconds = time.perf_counter() - start
+        first_messages = simulator.messages
+
+        simulator.reset_counters()
+        start = time.perf_counter()
+        for position in positions:
+            builder.get_album_art(position, "")
+        elapsed = time.perf_counter() - start
+
+        return {"benchmark": "get_album_art", "entries": len(playlist), "ipc": playlist_cache.use_ipc,
+                "first_lookup_seconds": round(first_seconds, 6), "first_lookup_messages": first_messages,
+                "us_per_lookup": round(elapsed / lookups * 1e6, 3),
+                "messages_per_lookup": round(simulator.messages / lookups, 3),
+                "memory_reads_per_lookup": round(simulator.memory_reads / lookups, 3),
+                "playlist_dumps": playlist_cache.dumps}
+
+
+def bench_ticks(playlist, use_ipc: bool, ticks: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        simulator, winamp, _, builder = setup(directory, playlist, use_ipc)
+        presence = FakePresence()
+        watcher = PlayerWatcher(winamp)
+        Pipeline(watcher, builder, presence)
+
+        simulator.press(MenuCommand.Play)
+        watcher.check()
+
+        durations = []
+        simulator.reset_counters()
+        for _ in range(ticks):
+            start = time.perf_counter()
+            watcher.check()
+            durations.append(time.perf_counter() - start)
+        steady_messages = simulator.messages
+
+        change_durations = []
+        simulator.reset_counters()
+        updates = presence.updates
+        changes = max(1, ticks // 10)
+        for _ in range(changes):
+            simulator.press(MenuCommand.NextTrack)
+            start = time.perf_counter()
+            watcher.check()
+            change_durations.append(time.perf_counter() - start)
+
+        return {"benchmark": "tick", "entries": len(playlist), "ipc": use_ipc, "ticks": ticks,
+                "steady_us_median": round(statistics.median(durations) * 1e6, 3),
+                "steady_us_p99": round(sorted(durations)[int(len(durations) * 0.99)] * 1e6, 3),
+                "steady_messages_per_tick": round(steady_messages / ticks, 3),
+                "track_change_us_median": round(statistics.median(change_durations) * 1e6, 3),
+                "track_change_messages_per_tick": round(simulator.messages / changes, 3),
+                "presence_updates_per_track_change": round((presence.updates - updates) / changes, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=2000)
+    args = parser.parse_args()
+
+    for entries in args.entries:
+        playlist = generate_playlist(entries)
+        for use_ipc in (True, False):
+            print(json.dumps(bench_album_art(playlist, use_ipc, args.lookups)), flush=True)
+            print(json.dumps(bench_ticks(playlist, use_ipc, args.ticks)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark and fuzz Winamp window title parsing. Compares title_parser.parse_title against the split and strip parsing
+update_rpc used before, and fuzzes the parser with generated titles whose artists and track names start or end with
+digits and dots.
+
+Usage: python benchmarks/bench_title.py [--iterations 100000] [--fuzz 10000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import (
+    Callable,
+    List,
+    Tuple
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from title_parser import parse_title  # noqa: E402
+
+CORPUS_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "title_corpus.txt")
+
+
+def legacy_parse(trackinfo_raw: str, track_pos: int) -> Tuple[str, str]:
+    """
+    The title parsing update_rpc used before title_parser, kept here as a baseline.
+    """
+
+    trackinfo = trackinfo_raw.split(" - ")[:-1]
+    artist = trackinfo[0].strip(f"{track_pos + 1}. ")
+    track_name = " - ".join(trackinfo[1:])
+
+    return artist, track_name
+
+
+def safe_legacy_parse(trackinfo_raw: str, track_pos: int) -> Tuple[str, str]:
+    # The legacy parsing raises IndexError for titles without ' - ', e.g. when the playlist is empty
+    try:
+        return legacy_parse(trackinfo_raw, track_pos)
+    except IndexError:
+        return "", ""
+
+
+def load_corpus() -> List[str]:
+    with open(CORPUS_FILEPATH, encoding="utf8") as corpus_file:
+        return [line.rstrip("\n") for line in corpus_file if line.strip()]
+
+
+def time_calls(func: Callable, titles: List[str], iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(titles[i % len(titles)])
+
+    return time.perf_counter() - start
+
+
+def fuzz(count: int, seed: int = 0) -> dict:
+    """
+    Parse generated titles and count how often each parser gets the artist and track name right.
+
+    :return: Dictionary of the fuzzing results
+    """
+
+    rng = random.Random(seed)
+    alphabet = "abcXYZ0123456789. -äö"
+    correct = legacy_correct = 0
+    failures = []
+
+    for _ in range(count):
+        number = rng.randint(1, 100000)
+        artist = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))).strip(" -") or "a"
+        track = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 20))).strip() or "t"
+        if " - " in artist:
+            # An artist containing the separator cannot be told apart from a track name containing it
+            continue
+        title = f"{number}. {artist} - {track} - Winamp"
+
+        parsed = parse_title(title)
+        if (parsed.number, parsed.artist, parsed.title) == (number, artist, track):
+            correct += 1
+        elif len(failures) < 5:
+            failures.append(title)
+        if safe_legacy_parse(title, number - 1) == (artist, track):
+            legacy_correct += 1
+
+    return {"benchmark": "title_fuzz", "titles": count, "parse_title_correct": correct,
+            "legacy_correct": legacy_correct, "parse_title_failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--fuzz", type=int, default=10000)
+    args = parser.parse_args()
+
+    titles = load_corpus()
+    uncached = getattr(parse_title, "__wrapped__")
+    results = {
+        "legacy_parse": time_calls(lambda title: safe_legacy_parse(title, 0), titles, args.iterations),
+        "parse_title_uncached": time_calls(uncached, titles, args.iterations),
+        "parse_title_cached": time_calls(parse_title, titles, args.iterations),
+    }
+    for name, seconds in results.items():
+        print(json.dumps({"benchmark": name, "iterations": args.iterations, "seconds": round(seconds, 6),
+                          "ns_per_title": round(seconds / args.iterations * 1e9)}))
+
+    print(json.dumps(fuzz(args.fuzz), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark how quickly PlayerWatcher reports player changes and how often it wakes up to do it. The watcher samples a
+simulated Winamp on a virtual clock while tracks end, are skipped and paused, so hours of listening are simulated in a
+few seconds. Measured with fixed interval polling, with a PollScheduler, and with a PollScheduler notified by a window
+title hook. The delivery delay of the hook itself is not simulated.
+
+Usage: python benchmarks/bench_watcher.py [--modes fixed scheduler hook] [--duration 36000] [--action-interval 60]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import PlayerWatcher, PlayerEvent, Seeked, TrackChanged  # noqa: E402
+from poll_scheduler import PollScheduler  # noqa: E402
+from winamp import Winamp, MenuCommand, PlayingStatus  # noqa: E402
+from winamp_simulator import SimulatedWinamp, generate_playlist  # noqa: E402
+
+PLAYLIST_LENGTH = 5000
+
+
+class VirtualClock:
+    """
+    Monotonic clock that only moves when it is told to.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LatencyRecorder:
+    """
+    Match the events of the watcher to the player changes made by the benchmark.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.latencies = []
+        self.missed = 0
+        self.track_changes = 0
+
+    def on_player_event(self, event: PlayerEvent):
+        # Seeks are not made by the benchmark, and the first track change reports the initial state
+        if isinstance(event, Seeked) or not self.pending:
+            return
+        if isinstance(event, TrackChanged):
+            self.track_changes += 1
+        self.latencies.append(event.timestamp - self.pending[0])
+        # Several changes between two samples are reported as one
+        self.missed += len(self.pending) - 1
+        self.pending.clear()
+
+
+def create_watcher(mode: str, winamp: Winamp, clock: VirtualClock) -> PlayerWatcher:
+    if mode == "fixed":
+        return PlayerWatcher(winamp, clock=clock)
+    # The same maximum idle intervals main.py uses with and without the window title hook
+    scheduler = PollScheduler(max_idle_interval=60.0 if mode == "hook" else 5.0, clock=clock)
+    return PlayerWatcher(winamp, clock=clock, scheduler=scheduler)
+
+
+def bench_watcher(mode: str, duration: float, action_interval: float, seed: int = 0) -> dict:
+    clock = VirtualClock()
+    simulator = SimulatedWinamp(generate_playlist(PLAYLIST_LENGTH, seed), clock=clock)
+    watcher = create_watcher(mode, Winamp(simulator), clock)
+    recorder = LatencyRecorder()
+    watcher.subscribe(recorder.on_player_event)
+    rng = random.Random(seed)
+
+    simulator.press(MenuCommand.Play)
+    simulator.reset_counters()
+    next_sample = 0.0
+    next_action = rng.expovariate(1 / action_interval)
+    resume_at = math.inf
+    while clock.now < duration:
+        status, _, position = simulator.state()
+        track_end = math.inf
+        if status == PlayingStatus.Playing:
+            track_end = clock.now + (simulator.current_entry.duration * 1000 - position) / 1000
+        next_change = min(track_end, next_action, resume_at)
+
+        if next_sample <= next_change:
+            clock.now = next_sample
+            watcher.check()
+            next_sample = clock.now + watcher.next_interval()
+            continue
+
+        if next_change == track_end:
+            # Step a millisecond over the end, so the simulated position is not truncated just below it
+            clock.now = track_end + 0.001
+            simulator.state()
+        elif next_change == resume_at:
+            clock.now = resume_at
+            simulator.press(MenuCommand.TogglePause)
+            resume_at = math.inf
+        else:
+            clock.now = next_action
+            next_action = clock.now + rng.expovariate(1 / action_interval)
+            if status != PlayingStatus.Playing:
+                continue
+            if rng.random() < 0.3:
+                simulator.press(MenuCommand.TogglePause)
+                resume_at = clock.now + rng.uniform(2.0, 30.0)
+            else:
+                simulator.press(MenuCommand.NextTrack)
+        recorder.pending.append(next_change)
+        # Changes that were undone before the next sample, like a short pause, are never seen
+        snapshot = watcher.snapshot
+        if snapshot is not None and (simulator.status, simulator.playlist_position) == \
+                (snapshot.status, snapshot.playlist_position):
+            recorder.missed += len(recorder.pending)
+            recorder.pending.clear()
+
+        # Every change the benchmark makes changes the window text, which wakes up a hooked watcher immediately
+        if mode == "hook":
+            next_sample = clock.now
+
+    latencies = sorted(recorder.latencies) or [0.0]
+    return {"benchmark": "watcher", "mode": mode, "duration": duration,
+            "changes": len(recorder.latencies) + recorder.missed, "track_changes": recorder.track_changes,
+            "missed_changes": recorder.missed,
+            "latency_ms_mean": round(statistics.mean(latencies) * 1000, 3),
+            "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+            "latency_ms_max": round(latencies[-1] * 1000, 3),
+            "wakeups_per_minute": round(watcher.wakeups / duration * 60, 3),
+            "messages_per_wakeup": round(simulator.messages / max(1, watcher.wakeups), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=("fixed", "scheduler", "hook"),
+                        default=["fixed", "scheduler", "hook"])
+    parser.add_argument("--duration", type=float, default=36000.0, help="Simulated listening time in seconds")
+    parser.add_argument("--action-interval", type=float, default=60.0,
+                        help="Average time in seconds between skipping or pausing a track")
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        print(json.dumps(bench_watcher(mode, args.duration, args.action_interval)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Run every benchmark and collect the results as JSON lines tagged with the commit, so runs of different commits can be
+compared. Each benchmark script runs in its own process against the simulated Winamp, so the suite also runs on Linux.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--output results.jsonl]
+    python benchmarks/run_benchmarks.py --compare base.jsonl new.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARKS = {
+    "bench_title.py": [],
+    "bench_playlist.py": ["--entries", "1000", "100000", "1000000"],
+    "bench_presence.py": [],
+    "bench_history.py": ["--records", "1000000"],
+    "bench_library.py": ["--files", "500000"],
+    "bench_watcher.py": [],
+    "bench_playlist_index.py": ["--entries", "1000", "100000"],
+}
+QUICK_BENCHMARKS = {
+    "bench_title.py": ["--iterations", "20000", "--fuzz", "2000"],
+    "bench_playlist.py": ["--entries", "1000", "100000"],
+    "bench_presence.py": ["--entries", "1000", "100000", "--lookups", "500", "--ticks", "500"],
+    "bench_history.py": ["--records", "100000"],
+    "bench_library.py": ["--files", "20000", "--lookups", "2000"],
+    "bench_watcher.py": ["--duration", "3600"],
+    "bench_playlist_index.py": ["--entries", "1000", "100000", "--queries", "200"],
+}
+
+PARAMETER_KEYS = ("benchmark", "mode", "entries", "records", "files", "iterations", "titles", "ipc", "ticks",
+                  "sync_every")
+"""
+Result fields that identify a measurement. Results with the same values are compared with each other.
+"""
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIRECTORY, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(benchmarks: Dict[str, List[str]]) -> List[dict]:
+    """
+    Run benchmark scripts and tag their results.
+
+    :param benchmarks: Arguments by benchmark script name
+    :return: The results of every script
+    """
+
+    environment = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                   "timestamp": int(time.time())}
+    results = []
+    for script, arguments in benchmarks.items():
+        completed = subprocess.run([sys.executable, os.path.join(BENCHMARK_DIRECTORY, script)] + arguments,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{script} failed:\n{completed.stderr}", file=sys.stderr)
+            continue
+        for line in completed.stdout.splitlines():
+            if line.startswith("{"):
+                result = dict(json.loads(line), script=script, **environment)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    return results
+
+
+def load_results(filepath: str) -> Dict[Tuple, dict]:
+    with open(filepath, encoding="utf8") as results_file:
+        results = [json.loads(line) for line in results_file if line.strip()]
+
+    # If a file has several runs of the same measurement, the latest one is used
+    return {tuple(result.get(key) for key in PARAMETER_KEYS): result for result in results}
+
+
+def compare(base_filepath: str, new_filepath: str):
+    """
+    Print the ratio of each numeric measurement in the new results to the base results.
+    """
+
+    base_results = load_results(base_filepath)
+    new_results = load_results(new_filepath)
+    for identity, new in new_results.items():
+        base = base_results.get(identity)
+        if base is None:
+            continue
+        name = ", ".join(f"{key}={value}" for key, value in zip(PARAMETER_KEYS, identity) if value is not None)
+        for key, value in new.items():
+            base_value = base.get(key)
+            if key in PARAMETER_KEYS or key == "timestamp" or isinstance(value, bool) or \
+                    not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)):
+                continue
+            ratio = value / base_value if base_value else float("inf") if value else 1.0
+            print(json.dumps({"measurement": name, "field": key, "base": base_value, "new": value,
+                              "ratio": round(ratio, 3), "base_commit": base.get("commit"),
+                              "new_commit": new.get("commit")}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Use smaller inputs")
+    parser.add_argument("--output", help="Append the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(QUICK_BENCHMARKS if args.quick else BENCHMARKS)
+    if args.output:
+        with open(args.output, "a", encoding="utf8") as output_file:
+            for result in results:
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""
+Persistent Winamp control over a local socket. Use ControlDaemon to keep one connected Winamp controller running and
+execute batches of commands from other processes, and ControlClient to send the batches. Scripts using the client do
+not need pywin32, and pay neither for finding the Winamp window nor for fetching its version on every run. Only clients
+that can read the token file written by the daemon can send commands.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence
+)
+
+from winamp import MenuCommand, Winamp
+
+DEFAULT_PORT = 47815
+
+
+def _default_token_path() -> str:
+    # File permission bits are ignored on Windows, but the per-user application data directory is not readable by
+    # other users
+    appdata = os.getenv("APPDATA")
+    if appdata:
+        return os.path.join(appdata, "WinampRPC", "control_daemon.token")
+
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "control_daemon.token")
+
+
+DEFAULT_TOKEN_PATH = _default_token_path()
+"""
+File the daemon writes its token into, and clients read it from. On Windows it is
+C:\\Users\\username\\AppData\\Roaming\\WinampRPC\\control_daemon.token, elsewhere control_daemon.token next to
+this file.
+"""
+MAX_REQUEST_SIZE = 1024 * 1024
+"""
+Maximum length of a request line in bytes. Longer requests are rejected.
+"""
+MAX_BATCH_DURATION = 60.0
+"""
+Maximum time in seconds the sleep and fade_volume commands of a batch may take in total, so one client cannot block
+the daemon for long.
+"""
+
+
+class ControlError(Exception):
+    """
+    Raised by ControlClient when the daemon rejects a request or a command fails.
+    """
+
+
+def to_json(value: Any) -> Any:
+    """
+    Convert a command result to a JSON serializable value. Enumerations are converted to their names, and objects
+    with slots, e.g. PlayerSnapshot and PlaylistEntry, to dictionaries.
+    """
+
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if hasattr(value, "__slots__"):
+        return {name: to_json(getattr(value, name)) for name in value.__slots__}
+
+    return value
+
+
+def write_token(token_path: str, token: str):
+    """
+    Write the token of a daemon into a file only the current user can read. Missing directories are created. On
+    Windows the file mode is ignored and the file inherits the permissions of its directory, so the file must be in a
+    directory only the current user can read, like the default one under %APPDATA%.
+
+    :param token_path: Path of the token file
+    :param token: The token
+    """
+
+    directory = os.path.dirname(token_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(token_path):
+        os.remove(token_path)
+    with open(os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as token_file:
+        token_file.write(token)
+
+
+def read_token(token_path: str) -> str:
+    """
+    Read the token of a running daemon.
+
+    :param token_path: Path of the token file
+    :return: The token
+    :raises FileNotFoundError: If the daemon has not been started.
+    """
+
+    with open(token_path) as token_file:
+        return token_file.read().strip()
+
+
+class ControlDaemon:
+    """
+    Execute command batches on a Winamp controller. Every batch runs on the same single worker thread from the first
+    command to the last, so commands of different clients are never interleaved and the controller is never used
+    from two threads at once.
+
+    Requests and responses are JSON lines. A request has the token of the daemon, a list of commands, each a list of
+    the command name and its arguments, and an optional id that is copied to the response::
+
+        {"id": 1, "token": "...", "commands": [["fade_volume", 0, 2.0], ["change_track", 10], ["press", "Play"]]}
+        {"id": 1, "results": [{"ok": true, "result": 0}, {"ok": true, "result": 0}, ...]}
+
+    The commands after a failed command are skipped, unless the request has "continue_on_error": true. A request that
+    is rejected as a whole, e.g. because it is not JSON or has a wrong token, is answered with an error and the
+    connection is closed. Any local program, including a web page in a browser, can connect to the port, so the
+    token keeps out those that cannot read the token file.
+    """
+
+    def __init__(self, winamp: Winamp, port: int = DEFAULT_PORT, host: str = "127.0.0.1", playlist_cache=None,
+                 token: Optional[str] = None):
+        """
+        :param winamp: Controller the commands are executed on. It is connected again when Winamp has restarted.
+        :param port: Port to listen on. 0 picks a free port, see address.
+        :param host: Address to listen on. Only local clients can connect by default.
+        :param playlist_cache: PlaylistCache used by the play_match command. A new one is created by default.
+        :param token: Secret the clients must send with every request. A random token is generated by default.
+        """
+        self.winamp = winamp
+        self.token = token or secrets.token_hex(16)
+        self.playlist_cache = playlist_cache
+        self.batches = 0
+        self.commands_executed = 0
+        self.playlist_index = None
+        """
+        playlist_index.PlaylistIndex used by the play_match command, created on first use.
+        """
+
+        self.commands: Dict[str, Callable] = {
+            "press": self._press,
+            "fade_volume": self._fade_volume,
+            "sleep": self._sleep,
+            "play_match": self._play_match,
+            "version": lambda: self.winamp.version,
+            "snapshot": winamp.snapshot,
+            "get_track_title": winamp.get_track_title,
+            "get_playing_status": winamp.get_playing_status,
+            "get_track_status": winamp.get_track_status,
+            "get_track_info": winamp.get_track_info,
+            "get_playlist_position": winamp.get_playlist_position,
+            "get_playlist_length": winamp.get_playlist_length,
+            "get_playlist_entry": winamp.get_playlist_entry,
+            "get_shuffle": winamp.get_shuffle,
+            "get_volume": winamp.get_volume,
+            "set_volume": winamp.set_volume,
+            "seek_track": winamp.seek_track,
+            "change_track": winamp.change_track,
+        }
+        """
+        Command handlers by command name.
+        """
+
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="ControlDaemon")
+        self._server = _Server((host, port), _RequestHandler)
+        self._server.control_daemon = self
+        self._thread = None
+        self._batch_deadline = 0.0
+
+    @property
+    def address(self):
+        """
+        The address the daemon listens on.
+        """
+        return self._server.server_address
+
+    def _press(self, command_name: str) -> int:
+        """
+        Press a button in the player, e.g. 'NextTrack'. See MenuCommand for the names.
+        """
+
+        try:
+            command = MenuCommand[command_name]
+        except KeyError:
+            raise ValueError(f"Unknown menu command {command_name!r}") from None
+
+        return self.winamp.send_command(command)
+
+    def _check_duration(self, seconds: float):
+        if not 0 <= seconds <= self._batch_deadline - time.monotonic():
+            raise ValueError(f"Sleeps and fades of a batch must take at most {MAX_BATCH_DURATION} seconds in total")
+
+    def _sleep(self, seconds: float) -> None:
+        self._check_duration(seconds)
+        time.sleep(seconds)
+
+    def _fade_volume(self, volume_level: int, duration: float = 1.0, steps: int = 20) -> int:
+        """
+        Change the volume gradually from the current volume.
+
+        :param volume_level: Final volume level in range from 0 to 255
+        :param duration: Time in seconds the fade takes
+        :param steps: Number of volume changes
+        """
+
+        if not 0 <= volume_level <= 255:
+            raise ValueError("Volume level must be in range [0, 255]")
+        if steps < 1:
+            raise ValueError("Fade must have at least one step")
+        self._check_duration(duration)
+
+        start_level = self.winamp.get_volume()
+        for step in range(1, steps + 1):
+            self.winamp.set_volume(round(start_level + (volume_level - start_level) * step / steps))
+            if step < steps:
+                time.sleep(duration / steps)
+
+        return volume_level
+
+    def _play_match(self, query: str):
+        if self.playlist_index is None:
+            from playlist_index import PlaylistIndex
+            self.playlist_index = PlaylistIndex(self.winamp, self.playlist_cache)
+
+        return self.playlist_index.play_match(query)
+
+    def execute(self, commands: List[Sequence], continue_on_error: bool = False) -> List[Dict]:
+        """
+        Execute a batch of commands in the calling thread. Called on the worker thread by handle_request().
+
+        :param commands: Lists of a command name and its arguments
+        :param continue_on_error: If True, the commands after a failed command are executed too
+        :return: A result for each command, with either the return value in 'result' or the error in 'error'
+        """
+
+        self.batches += 1
+        self._batch_deadline = time.monotonic() + MAX_BATCH_DURATION
+        results = []
+        failed = False
+        for command in commands:
+            if failed:
+                results.append({"ok": False, "error": "Skipped after a failed command"})
+                continue
+            try:
+                if not self.winamp.is_connected():
+                    self.winamp.connect()
+                result = self.commands[command[0]](*command[1:])
+            except Exception as e:
+                # The error is returned to the client, so an error in one command does not stop the daemon
+                results.append({"ok": False, "error": f"{type(e).__name__}: {e}"})
+                failed = not continue_on_error
+            else:
+                results.append({"ok": True, "result": to_json(result)})
+            self.commands_executed += 1
+
+        return results
+
+    def handle_request(self, line: bytes) -> Dict:
+        """
+        Validate a request line and execute its commands on the worker thread. This method is thread safe.
+
+        :return: The response. It has an 'error' if the request was rejected.
+        """
+
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "error": f"Invalid JSON: {e}"}
+        if not isinstance(request, dict):
+            return {"id": None, "error": "Request must be a JSON object"}
+
+        request_id = request.get("id")
+        token = request.get("token")
+        if not isinstance(token, str) or not hmac.compare_digest(token.encode("utf8"), self.token.encode("utf8")):
+            return {"id": request_id, "error": "Invalid token"}
+        commands = request.get("commands")
+        if not isinstance(commands, list) or \
+                not all(isinstance(command, list) and command and isinstance(command[0], str) for command in commands):
+            return {"id": request_id, "error": "Request must have a list of commands, each a list of a command name "
+                                               "and its arguments"}
+        unknown = [command[0] for command in commands if command[0] not in self.commands]
+        if unknown:
+            return {"id": request_id, "error": f"Unknown commands: {', '.join(unknown)}"}
+
+        results = self._executor.submit(self.execute, commands, bool(request.get("continue_on_error"))).result()
+        return {"id": request_id, "results": results}
+
+    def start(self):
+        """
+        Start accepting clients in a background thread.
+        """
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ControlDaemon-accept", daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        """
+        Accept clients in the calling thread until stop() is called from another thread.
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stop accepting clients and wait for the running batch to finish.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    control_daemon: ControlDaemon = None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serve the requests of one client connection. A client can send any number of requests, and the responses are
+    sent in the same order. The connection is closed after the first rejected request, so the body of e.g. an HTTP
+    request is not executed after its headers are rejected.
+    """
+
+    def handle(self):
+        daemon = self.server.control_daemon
+        while True:
+            try:
+                line = self.rfile.readline(MAX_REQUEST_SIZE + 1)
+            except OSError:
+                return
+            if not line:
+                return
+            if not line.strip():
+                continue
+            too_long = len(line) > MAX_REQUEST_SIZE
+            response = {"id": None, "error": "Request is too long"} if too_long else daemon.handle_request(line)
+            try:
+                self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf8"))
+            except OSError:
+                return
+            if "error" in response:
+                # The client is not speaking this protocol, or the rest of a long line could be taken for a request
+                return
+
+
+class ControlClient:
+    """
+    Client of ControlDaemon. The connection is kept open between batches. This class is not thread safe.
+    """
+
+    def __init__(self, port: int = DEFAULT_PORT, host: str = "127.0.0.1",
+                 timeout: Optional[float] = MAX_BATCH_DURATION + 30.0, token: Optional[str] = None,
+                 token_path: str = DEFAULT_TOKEN_PATH):
+        """
+        :param port: Port of the daemon
+        :param host: Address of the daemon
+        :param timeout: Time in seconds to wait for a response. Batches with sleeps and fades take longer to answer,
+        and a batch waits for the batches of other clients sent before it.
+        :param token: Token of the daemon. By default it is read from token_path on every connect, so a restarted
+        daemon is reconnected to with its new token.
+        :param token_path: File the daemon wrote its token into
+        """
+        self.address = (host, port)
+        self.timeout = timeout
+        self.token = token
+        self.token_path = token_path
+        self._token = token
+        self._socket = None
+        self._file = None
+        self._next_id = 1
+
+    def connect(self):
+        """
+        :raises ConnectionRefusedError: If the daemon is not running.
+        :raises FileNotFoundError: If no token was given and the token file does not exist.
+        """
+
+        self._token = self.token if self.token is not None else read_token(self.token_path)
+        self._socket = socket.create_connection(self.address, self.timeout)
+        self._file = self._socket.makefile("rwb")
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+    def __enter__(self) -> "ControlClient":
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def send(self, commands: Sequence[Sequence], continue_on_error: bool = False) -> List[Dict]:
+        """
+        Execute a batch of commands in one round trip. Connects first if not connected.
+
+        :param commands: Sequences of a command name and its arguments, e.g. [('set_volume', 128), ('press', 'Play')]
+        :param continue_on_error: If True, the commands after a failed command are executed too
+        :return: A result for each command, with either the return value in 'result' or the error in 'error'
+        :raises ControlError: If the daemon rejects the request.
+        """
+
+        if self._socket is None:
+            self.connect()
+
+        request_id = self._next_id
+        self._next_id += 1
+        request = {"id": request_id, "token": self._token, "commands": [list(command) for command in commands],
+                   "continue_on_error": continue_on_error}
+        self._file.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf8"))
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise ControlError("The daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            # The daemon closes the connection after a rejected request
+            self.close()
+            raise ControlError(response["error"])
+
+        return response["results"]
+
+    def call(self, command: str, *args) -> Any:
+        """
+        Execute a single command.
+
+        :return: The return value of the command
+        :raises ControlError: If the command fails.
+        """
+
+        result = self.send([(command,) + args])[0]
+        if not result["ok"]:
+            raise ControlError(result["error"])
+
+        return result["result"]
+
+
+def _parse_command(text: str) -> List:
+    """
+    Parse a command from the command line, e.g. 'set_volume 128'. Arguments are parsed as JSON if possible, and are
+    strings otherwise.
+    """
+
+    import shlex
+
+    command = shlex.split(text)
+    for i in range(1, len(command)):
+        try:
+            command[i] = json.loads(command[i])
+        except ValueError:
+            pass
+
+    return command
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Control Winamp through a persistent daemon.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port of the daemon, {DEFAULT_PORT} by default")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_PATH,
+                        help="File the daemon writes its token into, %%APPDATA%%\\WinampRPC\\control_daemon.token by "
+                             "default")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    subparsers.add_parser("serve", help="Run the daemon")
+    send_parser = subparsers.add_parser("send", help="Send commands to the daemon in one batch")
+    send_parser.add_argument("commands", nargs="+", help="Commands with their arguments, e.g. 'set_volume 128'")
+    send_parser.add_argument("--continue-on-error", action="store_true",
+                             help="Execute the commands after a failed command too")
+    args = parser.parse_args()
+
+    if args.action == "send":
+        commands = [_parse_command(text) for text in args.commands]
+        try:
+            with ControlClient(args.port, token_path=args.token_file) as client:
+                results = client.send(commands, args.continue_on_error)
+        except (ConnectionRefusedError, FileNotFoundError):
+            print("Control daemon is not running. Start it with 'python control_daemon.py serve'.")
+            return
+        except ControlError as e:
+            print(e)
+            return
+        for command, result in zip(args.commands, results):
+            print(f"{command}: {json.dumps(result['result']) if result['ok'] else result['error']}")
+        return
+
+    winamp = Winamp()
+    daemon = ControlDaemon(winamp, args.port)
+    write_token(args.token_file, daemon.token)
+    print(f"Control daemon is listening on port {daemon.address[1]}.")
+    print("To exit, simply press CTRL + C.")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        os.remove(args.token_file)
+
+
+if __name__ == "__main__":
+    main()
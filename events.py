@@ -0,0 +1,419 @@
+"""
+Change notification layer for Winamp. Use PlayerWatcher to observe a Winamp controller and receive typed events when
+the player state changes, instead of comparing titles and statuses manually in a fixed interval loop.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import sys
+import threading
+import time
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Tuple,
+    Type
+)
+
+from timeline import PlaybackTimeline
+from title_parser import parse_title
+from winamp import PlayingStatus
+
+STATUS_SUFFIXES = (" [Paused]", " [Stopped]")
+"""
+Suffixes Winamp appends to its window text when the playback is not running.
+"""
+
+
+class PlayerEvent:
+    """
+    Base class for all events raised by PlayerWatcher.
+    """
+
+    __slots__ = ("title", "position", "timestamp")
+
+    def __init__(self, title: str, position: Optional[int], timestamp: float):
+        """
+        :param title: The track title in Winamp window without possible status suffix
+        :param position: Track position in milliseconds when the event was detected, or None if it is not known
+        :param timestamp: Monotonic clock time in seconds when the event was detected
+        """
+        self.title = title
+        self.position = position
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(title={self.title!r}, position={self.position!r})"
+
+
+class TrackChanged(PlayerEvent):
+    """
+    A new track started playing, or playback was started from stopped state.
+    """
+
+    __slots__ = ("previous_title",)
+
+    def __init__(self, title: str, position: Optional[int], timestamp: float, previous_title: str):
+        """
+        :param previous_title: The track title before the change. Empty string if nothing was playing before.
+        """
+        super().__init__(title, position, timestamp)
+        self.previous_title = previous_title
+
+
+class Paused(PlayerEvent):
+    """
+    The current track was paused.
+    """
+
+    __slots__ = ()
+
+
+class Resumed(PlayerEvent):
+    """
+    The current track was resumed from paused state.
+    """
+
+    __slots__ = ()
+
+
+class Stopped(PlayerEvent):
+    """
+    The playback was stopped or Winamp is no longer playing anything.
+    """
+
+    __slots__ = ()
+
+
+class Seeked(PlayerEvent):
+    """
+    The current track position differs from the playback timeline more than the seek threshold, because the track was
+    seeked or the playback has drifted. The position is the corrected position.
+    """
+
+    __slots__ = ("expected_position",)
+
+    def __init__(self, title: str, position: Optional[int], timestamp: float, expected_position: int):
+        """
+        :param expected_position: The position in milliseconds the track would have been in without seeking
+        """
+        super().__init__(title, position, timestamp)
+        self.expected_position = expected_position
+
+
+EventCallback = Callable[[PlayerEvent], None]
+
+
+def strip_status_suffix(title: str) -> str:
+    """
+    Remove the playing status suffix Winamp adds to its window text when paused or stopped.
+
+    :param title: Winamp window text
+    :return: The window text without status suffix
+    """
+
+    for suffix in STATUS_SUFFIXES:
+        if title.endswith(suffix):
+            return title[:-len(suffix)]
+
+    return title
+
+
+def track_key(title: str) -> Tuple[Optional[str], str]:
+    """
+    Identify a track by its artist and title, ignoring the playing status and scrolling of Winamp's window text. Used
+    by PlayerWatcher with Winamp.snapshot() to notice when the track changes.
+
+    :param title: Winamp window text
+    :return: Artist and title of the track
+    """
+
+    parsed = parse_title(title)
+    return parsed.artist, parsed.title
+
+
+class PlayerWatcher:
+    """
+    Watch a Winamp controller for changes in playing status, track title and track position, and dispatch typed
+    events to subscribed callbacks.
+
+    The watcher sleeps until it is either woken up with notify() or its poll interval runs out. A window title hook
+    (see WindowTitleHook) calls notify() when Winamp changes its window text, so track and status changes are
+    reported immediately. Polling is kept as a fallback and for seek detection, which does not change the window text.
+    """
+
+    def __init__(self,
+                 winamp,
+                 poll_interval: float = 1.0,
+                 idle_poll_interval: float = 1.0,
+                 seek_threshold: int = 2000,
+                 clock: Callable[[], float] = time.monotonic,
+                 scheduler=None
+                 ):
+        """
+        :param winamp: Winamp controller or any object implementing snapshot(title_key) in the same way
+        :param poll_interval: Maximum time in seconds between samples while a track is playing
+        :param idle_poll_interval: Maximum time in seconds between samples while paused or stopped. This can be set
+        high if a window title hook is notifying the watcher, since status changes also change the window text.
+        :param seek_threshold: Difference in milliseconds between predicted and sampled position that is reported as
+        a seek. See PlaybackTimeline for how the positions are filtered.
+        :param clock: Monotonic clock function returning seconds
+        :param scheduler: Optional poll_scheduler.PollScheduler choosing the time between samples from the player state.
+        If given, poll_interval and idle_poll_interval are not used.
+        """
+        self.winamp = winamp
+        self.poll_interval = poll_interval
+        self.idle_poll_interval = idle_poll_interval
+        self.clock = clock
+        self.scheduler = scheduler
+        self.timeline = PlaybackTimeline(seek_threshold)
+
+        self.status = None
+        self.title = ""
+        self.snapshot = None
+        """
+        The player state read by the latest sample, or None before the first sample.
+        """
+        self.wakeups = 0
+        """
+        Number of times the watcher has sampled the player.
+        """
+
+        self.metrics = None
+        """
+        Optional instrumentation.Metrics object. If set, every check is recorded as a tick.
+        """
+
+        self._callbacks = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def subscribe(self, callback: EventCallback, event_type: Type[PlayerEvent] = PlayerEvent):
+        """
+        Subscribe a callback to events.
+
+        :param callback: Function called with the event as the only argument
+        :param event_type: Event class to subscribe to. Subclasses are also matched, so by default all events are
+        passed to the callback.
+        """
+        self._callbacks.append((event_type, callback))
+
+    def notify(self):
+        """
+        Wake up the watcher to sample the player immediately. This method is thread safe.
+        """
+        self._wake.set()
+
+    def stop(self):
+        """
+        Stop a running watcher loop. This method is thread safe.
+        """
+        self._stopped.set()
+        self._wake.set()
+
+    def reset(self):
+        """
+        Forget the sampled player state, so the next sample reports the current state as a change, and forget a
+        previous stop(). Used before connecting to Winamp or Discord again. A stop() after this is not forgotten, so
+        a connection lost before run() starts makes it return immediately.
+        """
+        self._stopped.clear()
+        self.status = None
+        self.title = ""
+        self.snapshot = None
+        self.timeline.clear()
+        if self.scheduler is not None:
+            self.scheduler.reset()
+
+    def check(self) -> List[PlayerEvent]:
+        """
+        Sample the player once and dispatch events for all changes since the previous sample. Positions in the events
+        are filtered through the playback timeline, so they are never the bogus values Winamp reports when a track
+        starts.
+
+        :return: List of dispatched events
+        """
+
+        self.wakeups += 1
+        if self.metrics is not None:
+            self.metrics.begin_tick()
+            try:
+                return self._check()
+            finally:
+                self.metrics.end_tick()
+
+        return self._check()
+
+    def _check(self) -> List[PlayerEvent]:
+        snapshot = self.snapshot = self.winamp.snapshot(track_key)
+        status = snapshot.status
+        title = strip_status_suffix(snapshot.title)
+        now = self.clock()
+        length, position = (snapshot.length, snapshot.position) if status == PlayingStatus.Playing else (0, None)
+        timeline = self.timeline
+        events = []
+
+        if status != self.status or (status == PlayingStatus.Playing and title != self.title):
+            if status == PlayingStatus.Playing:
+                timeline.reset(position, length, now)
+                if self.status == PlayingStatus.Paused and title == self.title:
+                    events.append(Resumed(title, timeline.predict(now), now))
+                else:
+                    events.append(TrackChanged(title, timeline.predict(now), now, self.title))
+            elif status == PlayingStatus.Paused:
+                timeline.pause(now)
+                events.append(Paused(title, timeline.predict(now), now))
+            else:
+                timeline.clear()
+                events.append(Stopped(title, None, now))
+
+        elif status == PlayingStatus.Playing and position is not None:
+            expected = timeline.predict(now)
+            corrected = timeline.observe(position, now)
+            if corrected is not None:
+                events.append(Seeked(title, corrected, now, expected))
+
+        self.status = status
+        self.title = title
+
+        for event in events:
+            self._dispatch(event)
+
+        return events
+
+    def _dispatch(self, event: PlayerEvent):
+        for event_type, callback in self._callbacks:
+            if isinstance(event, event_type):
+                callback(event)
+
+    def next_interval(self) -> float:
+        """
+        Get the time until the player should be sampled again. Call this once after each sample.
+
+        :return: Time in seconds until the next sample
+        """
+
+        if self.scheduler is not None:
+            return self.scheduler.next_interval(self.status, self.timeline)
+        if self.status == PlayingStatus.Playing:
+            return self.poll_interval
+        return self.idle_poll_interval
+
+    def run(self):
+        """
+        Run the watcher loop in the current thread until stop() is called. Returns immediately if stop() has been
+        called after the latest reset().
+        """
+
+        while not self._stopped.is_set():
+            self._wake.clear()
+            self.check()
+            self._wake.wait(self.next_interval())
+
+
+class WindowTitleHook:
+    """
+    Notify a PlayerWatcher when the Winamp window text changes. Uses SetWinEventHook, so this is only available on
+    Windows. The hook runs its own message loop in a daemon thread.
+    """
+
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    OBJID_WINDOW = 0
+    WINEVENT_OUTOFCONTEXT = 0
+    WM_QUIT = 0x0012
+
+    def __init__(self, watcher: PlayerWatcher, window_id: int):
+        """
+        :param watcher: The watcher to notify on window text changes
+        :param window_id: Handle of the Winamp window
+        """
+        self.watcher = watcher
+        self.window_id = window_id
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """
+        Install the hook.
+
+        :raises OSError: If the hook cannot be installed, e.g. when not running on Windows.
+        """
+
+        if sys.platform != "win32":
+            raise OSError("Window title hooks are only supported on Windows")
+
+        self._thread = threading.Thread(target=self._run, name="WindowTitleHook", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        """
+        Uninstall the hook and stop its message loop.
+        """
+
+        if self._thread_id is not None:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+            self._thread.join()
+            self._thread_id = None
+
+    def _run(self):
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND, wintypes.LONG,
+                                          wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def callback(_hook, _event, hwnd, id_object, _id_child, _thread, _time):
+            if hwnd == self.window_id and id_object == self.OBJID_WINDOW:
+                self.watcher.notify()
+
+        # Keep a reference to the callback for the lifetime of the hook
+        proc = WinEventProc(callback)
+        process_id = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(self.window_id, ctypes.byref(process_id))
+        hook = user32.SetWinEventHook(self.EVENT_OBJECT_NAMECHANGE, self.EVENT_OBJECT_NAMECHANGE, 0, proc,
+                                      process_id.value, 0, self.WINEVENT_OUTOFCONTEXT)
+        if not hook:
+            self._error = OSError("Could not install window title hook")
+            self._ready.set()
+            return
+
+        self._thread_id = kernel32.GetCurrentThreadId()
+        self._ready.set()
+
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+
+        user32.UnhookWinEvent(hook)
@@ -0,0 +1,652 @@
+"""
+Listening history for WinampRPC. Use HistoryRecorder with a PlayerWatcher to append every played track to a
+HistoryLog, a compact append-only binary log with incrementally maintained statistics.
+
+Run this module as a script to query the history by time range, e.g.
+python history.py --start 2024-01-01 --end 2024-02-01 --top 10
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import io
+import json
+import os
+import struct
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+from atomic_file import write_atomic
+from events import PlayerEvent, TrackChanged, Paused, Resumed, Stopped
+from title_parser import parse_title
+
+RECORD = struct.Struct("<dIIII")
+"""
+Layout of a play record: start time as UNIX time in seconds, played duration in milliseconds, and artist, album and
+title IDs in the name table.
+"""
+SEGMENT_MAGIC = b"WRPCHIS1"
+"""
+Header of every segment file.
+"""
+UNKNOWN = 0
+"""
+Name ID of an unknown artist, album or title. It is the empty string in the name table.
+"""
+
+RawRecord = Tuple[float, int, int, int, int]
+
+
+class PlayRecord:
+    """
+    A class representing a single play of a track.
+    """
+
+    __slots__ = ("timestamp", "duration", "artist", "album", "title")
+
+    def __init__(self, timestamp: float, duration: int, artist: str, album: str, title: str):
+        """
+        :param timestamp: UNIX time in seconds when the track started playing
+        :param duration: How long the track was played in milliseconds, excluding pauses
+        :param artist: The artist, or empty string if not known
+        :param album: The album, or empty string if not known
+        :param title: The track title
+        """
+        self.timestamp = timestamp
+        self.duration = duration
+        self.artist = artist
+        self.album = album
+        self.title = title
+
+    def __repr__(self) -> str:
+        return (f"PlayRecord(timestamp={self.timestamp!r}, duration={self.duration!r}, artist={self.artist!r}, "
+                f"album={self.album!r}, title={self.title!r})")
+
+
+class NameTable:
+    """
+    An append-only table interning artist, album and title names to integer IDs. Names are stored in a text file as
+    one JSON string per line, and the ID of a name is its line number starting from 0.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        :param filepath: Path of the name file. It is created if it does not exist.
+        """
+        self.filepath = filepath
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._unsaved: List[str] = []
+
+        try:
+            with open(filepath, encoding="utf8") as names_file:
+                for line in names_file:
+                    try:
+                        name = json.loads(line)
+                    except ValueError:
+                        # A partially written last line after a crash
+                        break
+                    self.ids.setdefault(name, len(self.names))
+                    self.names.append(name)
+        except FileNotFoundError:
+            pass
+
+        if not self.names:
+            self.intern("")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> int:
+        """
+        :param name: The name
+        :return: ID of the name. A new ID is added for an unseen name.
+        """
+
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self._unsaved.append(name)
+
+        return name_id
+
+    def sync(self):
+        """
+        Write new names to the name file and flush them to disk.
+        """
+
+        if not self._unsaved:
+            return
+
+        with open(self.filepath, "a", encoding="utf8") as names_file:
+            names_file.write("".join(json.dumps(name, ensure_ascii=False) + "\n" for name in self._unsaved))
+            names_file.flush()
+            os.fsync(names_file.fileno())
+        self._unsaved.clear()
+
+
+class Aggregates:
+    """
+    Play counts and listening time in total and per artist and album, updated with each appended record.
+    """
+
+    def __init__(self):
+        self.records = 0
+        """
+        Number of records included in the aggregates.
+        """
+        self.total_duration = 0
+        self.artists: Dict[int, List[int]] = {}
+        """
+        Play count and total duration in milliseconds by artist ID.
+        """
+        self.albums: Dict[int, List[int]] = {}
+        """
+        Play count and total duration in milliseconds by album ID.
+        """
+
+    def add(self, record: RawRecord):
+        _, duration, artist_id, album_id, _ = record
+        self.records += 1
+        self.total_duration += duration
+        for totals, name_id in ((self.artists, artist_id), (self.albums, album_id)):
+            if name_id == UNKNOWN:
+                continue
+            entry = totals.get(name_id)
+            if entry is None:
+                totals[name_id] = [1, duration]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+
+    def to_dict(self) -> Dict:
+        return {"records": self.records, "total_duration": self.total_duration,
+                "artists": {str(key): value for key, value in self.artists.items()},
+                "albums": {str(key): value for key, value in self.albums.items()}}
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> "Aggregates":
+        aggregates = cls()
+        aggregates.records = values["records"]
+        aggregates.total_duration = values["total_duration"]
+        aggregates.artists = {int(key): value for key, value in values["artists"].items()}
+        aggregates.albums = {int(key): value for key, value in values["albums"].items()}
+        return aggregates
+
+
+class HistoryLog:
+    """
+    An append-only log of play records. Records have a fixed size and are written into segment files of at most
+    segment_records records, so a time range is found with a binary search and old segments can be archived or removed
+    as whole files.
+
+    Appended records are buffered and written with a single fsync when sync_every records are pending or sync_interval
+    seconds have passed since the first one. A crash loses at most the buffered records. Aggregates are saved on sync
+    at most every aggregates_interval seconds and on close, and records appended after the saved aggregates are
+    replayed when the log is opened.
+
+    Records must be appended in time order, which is the case when they are appended as the plays finish.
+
+    A log opened read-only can be queried while another process appends to it. A partially written record at the end
+    of a segment is skipped instead of truncated, since the writer may still be writing it, and nothing is written.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_records: int = 1 << 20,
+                 sync_every: int = 8,
+                 sync_interval: float = 300.0,
+                 aggregates_interval: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 read_only: bool = False
+                 ):
+        """
+        :param directory: Directory of the log files. It is created if it does not exist, unless the log is opened
+        read-only.
+        :param segment_records: Maximum number of records in a segment file
+        :param sync_every: Number of pending records that causes a sync
+        :param sync_interval: Maximum time in seconds a record stays pending, checked on appends
+        :param aggregates_interval: Minimum time in seconds between saving the aggregates on sync
+        :param clock: Monotonic clock function returning seconds
+        :param read_only: If True, the log can only be queried, and it can be appended to by another process at the
+        same time
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.aggregates_interval = aggregates_interval
+        self.clock = clock
+        self.read_only = read_only
+        self.syncs = 0
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.aggregates_filepath = os.path.join(directory, "aggregates.json")
+        self.segments: List[Tuple[str, int]] = []
+        """
+        Path and number of written records of each segment file in order.
+        """
+
+        self._pending = bytearray()
+        self._pending_count = 0
+        self._pending_since = None
+        self._aggregates_saved = clock()
+        self._lock = threading.RLock()
+
+        self._open_segments()
+        # Names are written before the records using them, so the names are read after the segments to resolve every
+        # record even if another process is appending
+        self.names = NameTable(os.path.join(directory, "names.txt"))
+        self.aggregates = self._load_aggregates()
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self.segments) + self._pending_count
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{index:06d}.seg")
+
+    def _open_segments(self):
+        try:
+            filenames = sorted(filename for filename in os.listdir(self.directory) if filename.endswith(".seg"))
+        except FileNotFoundError:
+            # Only possible when read-only, otherwise the directory has been created
+            return
+
+        for filename in filenames:
+            path = os.path.join(self.directory, filename)
+            size = os.path.getsize(path)
+            count = max(0, size - len(SEGMENT_MAGIC)) // RECORD.size
+            expected_size = len(SEGMENT_MAGIC) + count * RECORD.size
+            if size != expected_size and not self.read_only:
+                # Drop a partially written record left by a crash
+                with open(path, "r+b") as segment_file:
+                    if size < len(SEGMENT_MAGIC):
+                        segment_file.write(SEGMENT_MAGIC)
+                    segment_file.truncate(expected_size)
+            self.segments.append((path, count))
+
+    def _load_aggregates(self) -> Aggregates:
+        try:
+            with open(self.aggregates_filepath, encoding="utf8") as aggregates_file:
+                aggregates = Aggregates.from_dict(json.load(aggregates_file))
+        except (FileNotFoundError, ValueError, KeyError):
+            aggregates = Aggregates()
+
+        written = len(self)
+        if aggregates.records > written:
+            # The aggregates are newer than the log, e.g. after removing segments, so they are built from scratch
+            aggregates = Aggregates()
+        if aggregates.records < written:
+            for record in self._iter_range(aggregates.records, written):
+                aggregates.add(record)
+
+        return aggregates
+
+    def append(self, timestamp: float, duration: int, artist: str, album: str, title: str):
+        """
+        Append a play record.
+
+        :param timestamp: UNIX time in seconds when the track started playing
+        :param duration: How long the track was played in milliseconds
+        :param artist: The artist, or empty string if not known
+        :param album: The album, or empty string if not known
+        :param title: The track title
+        :raises io.UnsupportedOperation: If the log is opened read-only
+        """
+
+        if self.read_only:
+            raise io.UnsupportedOperation("History log is opened read-only")
+
+        with self._lock:
+            names = self.names
+            record = (timestamp, duration, names.intern(artist), names.intern(album), names.intern(title))
+            self.append_raw(record)
+
+    def append_raw(self, record: RawRecord):
+        """
+        Append a play record with interned names.
+
+        :param record: Timestamp, duration and artist, album and title IDs
+        :raises io.UnsupportedOperation: If the log is opened read-only
+        """
+
+        if self.read_only:
+            raise io.UnsupportedOperation("History log is opened read-only")
+
+        with self._lock:
+            self._pending += RECORD.pack(*record)
+            self._pending_count += 1
+            self.aggregates.add(record)
+            if self._pending_since is None:
+                self._pending_since = self.clock()
+
+            if self._pending_count >= self.sync_every or self.clock() - self._pending_since >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        """
+        Write pending records to the segment files and flush them to disk. The aggregates are saved too if they have
+        not been saved in aggregates_interval seconds.
+        """
+
+        with self._lock:
+            if self._pending_count:
+                self._write_pending()
+                if self.clock() - self._aggregates_saved >= self.aggregates_interval:
+                    self._write_aggregates()
+
+    def _write_pending(self):
+        # Names are synced first, so every ID in the written records can be resolved after a crash
+        self.names.sync()
+        view = memoryview(self._pending)
+        while view:
+            if not self.segments or self.segments[-1][1] >= self.segment_records:
+                path = self._segment_path(len(self.segments))
+                with open(path, "wb") as segment_file:
+                    segment_file.write(SEGMENT_MAGIC)
+                self.segments.append((path, 0))
+
+            path, count = self.segments[-1]
+            records = min(len(view) // RECORD.size, self.segment_records - count)
+            with open(path, "ab") as segment_file:
+                segment_file.write(view[:records * RECORD.size])
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+            self.segments[-1] = (path, count + records)
+            view = view[records * RECORD.size:]
+
+        self._pending = bytearray()
+        self._pending_count = 0
+        self._pending_since = None
+        self.syncs += 1
+
+    def _write_aggregates(self):
+        write_atomic(self.aggregates_filepath, json.dumps(self.aggregates.to_dict()))
+        self._aggregates_saved = self.clock()
+
+    def close(self):
+        """
+        Sync pending records and save the aggregates. Does nothing if the log is opened read-only.
+        """
+
+        if self.read_only:
+            return
+
+        with self._lock:
+            if self._pending_count:
+                self._write_pending()
+            # Aggregates include pending records, so they are saved only after the records are written
+            self._write_aggregates()
+
+    def _read_record(self, segment_file, index: int) -> RawRecord:
+        segment_file.seek(len(SEGMENT_MAGIC) + index * RECORD.size)
+        return RECORD.unpack(segment_file.read(RECORD.size))
+
+    def _bisect(self, segment_file, count: int, timestamp: float) -> int:
+        # Index of the first record starting at or after timestamp
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._read_record(segment_file, middle)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _iter_range(self, first: int, last: int, chunk_records: int = 4096) -> Iterator[RawRecord]:
+        # Records by their index in the whole log, excluding pending records
+        segment_start = 0
+        for path, count in self.segments:
+            start, stop = max(first - segment_start, 0), min(last - segment_start, count)
+            segment_start += count
+            if start >= stop:
+                continue
+
+            with open(path, "rb") as segment_file:
+                segment_file.seek(len(SEGMENT_MAGIC) + start * RECORD.size)
+                while start < stop:
+                    records = min(chunk_records, stop - start)
+                    yield from RECORD.iter_unpack(segment_file.read(records * RECORD.size))
+                    start += records
+
+    def iter_records(self, start: Optional[float] = None, end: Optional[float] = None,
+                     chunk_records: int = 4096) -> Iterator[RawRecord]:
+        """
+        Iterate over the records in a time range. Pending records are synced first.
+
+        :param start: UNIX time in seconds of the range start, inclusive. None for no limit.
+        :param end: UNIX time in seconds of the range end, exclusive. None for no limit.
+        :param chunk_records: Number of records read from the disk at once
+        :return: Generator yielding timestamp, duration and artist, album and title IDs of each record
+        """
+
+        self.sync()
+        for path, count in list(self.segments):
+            if not count:
+                continue
+
+            with open(path, "rb") as segment_file:
+                if end is not None and self._read_record(segment_file, 0)[0] >= end:
+                    return
+                if start is not None and self._read_record(segment_file, count - 1)[0] < start:
+                    continue
+
+                index = self._bisect(segment_file, count, start) if start is not None else 0
+                segment_file.seek(len(SEGMENT_MAGIC) + index * RECORD.size)
+                while index < count:
+                    records = min(chunk_records, count - index)
+                    for record in RECORD.iter_unpack(segment_file.read(records * RECORD.size)):
+                        if end is not None and record[0] >= end:
+                            return
+                        yield record
+                    index += records
+
+    def records(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[PlayRecord]:
+        """
+        Iterate over the records in a time range with their names resolved. See iter_records().
+        """
+
+        names = self.names.names
+        for timestamp, duration, artist_id, album_id, title_id in self.iter_records(start, end):
+            yield PlayRecord(timestamp, duration, names[artist_id], names[album_id], names[title_id])
+
+    def summarize(self, start: Optional[float] = None, end: Optional[float] = None) -> Aggregates:
+        """
+        Get the aggregates of a time range. The maintained aggregates are returned without reading the log if the
+        range is not limited.
+
+        :param start: UNIX time in seconds of the range start, inclusive. None for no limit.
+        :param end: UNIX time in seconds of the range end, exclusive. None for no limit.
+        :return: The aggregates of the records in the range
+        """
+
+        if start is None and end is None:
+            return self.aggregates
+
+        aggregates = Aggregates()
+        for record in self.iter_records(start, end):
+            aggregates.add(record)
+
+        return aggregates
+
+    def top(self, totals: Dict[int, List[int]], count: int = 10) -> List[Tuple[str, int, int]]:
+        """
+        Get the most listened artists or albums.
+
+        :param totals: Artist or album totals of an Aggregates object
+        :param count: Maximum number of results
+        :return: Name, play count and total duration in milliseconds, ordered by the duration
+        """
+
+        names = self.names.names
+        return [(names[name_id], plays, duration)
+                for name_id, (plays, duration) in heapq.nlargest(count, totals.items(), key=lambda item: item[1][1])]
+
+
+class HistoryRecorder:
+    """
+    Record plays from PlayerWatcher events into a history log. The played duration excludes pauses, and a play is
+    recorded when the track changes or the playback stops.
+    """
+
+    def __init__(self,
+                 log: HistoryLog,
+                 album_lookup: Optional[Callable[[str, Optional[int]], Optional[str]]] = None,
+                 min_duration: float = 5.0,
+                 wall_clock: Callable[[], float] = time.time,
+                 position_lookup: Optional[Callable[[], Optional[int]]] = None
+                 ):
+        """
+        :param log: The log the plays are appended to
+        :param album_lookup: Function returning the album of a track by the Winamp window title and the playlist
+        position the track had when it started, or None if not known. Called when the play is recorded, which is
+        usually when the next track has already started.
+        :param min_duration: Minimum played time in seconds for a play to be recorded, so skipped tracks are left out
+        :param wall_clock: Function returning the current UNIX time in seconds
+        :param position_lookup: Function returning the playlist position of the track that just started, or None if
+        not known. Called when a track starts.
+        """
+        self.log = log
+        self.album_lookup = album_lookup
+        self.min_duration = min_duration
+        self.wall_clock = wall_clock
+        self.position_lookup = position_lookup
+
+        self._title = None
+        self._playlist_position = None
+        self._started = None
+        self._played = 0.0
+        self._resumed_at = None
+
+    def on_event(self, event: PlayerEvent):
+        """
+        Update the current play. Subscribe this method to a PlayerWatcher.
+
+        :param event: Event dispatched by PlayerWatcher
+        """
+
+        if isinstance(event, TrackChanged):
+            self.finish(event.timestamp)
+            self._title = event.title
+            self._playlist_position = self.position_lookup() if self.position_lookup is not None else None
+            self._started = self.wall_clock() - (event.position or 0) / 1000
+            self._played = 0.0
+            self._resumed_at = event.timestamp
+        elif self._title is None:
+            return
+        elif isinstance(event, Paused):
+            if self._resumed_at is not None:
+                self._played += event.timestamp - self._resumed_at
+                self._resumed_at = None
+        elif isinstance(event, Resumed):
+            self._resumed_at = event.timestamp
+        elif isinstance(event, Stopped):
+            self.finish(event.timestamp)
+
+    def finish(self, now: Optional[float] = None):
+        """
+        Record the current play, if any, e.g. when Winamp is closed.
+
+        :param now: Monotonic clock time in seconds of the same clock as the event timestamps. Defaults to
+        time.monotonic().
+        """
+
+        if self._title is None:
+            return
+
+        now = now if now is not None else time.monotonic()
+        played = self._played + (now - self._resumed_at if self._resumed_at is not None else 0.0)
+        title, self._title = self._title, None
+        if played < self.min_duration:
+            return
+
+        parsed = parse_title(title)
+        album = None
+        if self.album_lookup is not None:
+            try:
+                album = self.album_lookup(title, self._playlist_position)
+            except Exception as e:
+                print(f"Could not find the album of {parsed.title}: {e}")
+        self.log.append(self._started, int(played * 1000), parsed.artist or "", album or "", parsed.title)
+
+
+def _parse_time(value: str) -> float:
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _format_duration(milliseconds: int) -> str:
+    minutes, seconds = divmod(milliseconds // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def main():
+    import argparse
+    from datetime import datetime
+    from payload import load_settings
+
+    parser = argparse.ArgumentParser(description="Query the WinampRPC listening history.")
+    parser.add_argument("--directory", help="History directory. Defaults to history_directory in settings.json.")
+    parser.add_argument("--start", type=_parse_time, help="Range start as ISO date or time, e.g. 2024-01-31")
+    parser.add_argument("--end", type=_parse_time, help="Range end as ISO date or time, exclusive")
+    parser.add_argument("--top", type=int, default=10, help="Number of top artists and albums shown")
+    parser.add_argument("--list", action="store_true", help="List every play in the range")
+    args = parser.parse_args()
+
+    main_path = os.path.dirname(__file__)
+    directory = args.directory or load_settings(main_path)["history_directory"] or os.path.join(main_path, "history")
+    # The log may be appended to by main.py at the same time
+    log = HistoryLog(directory, read_only=True)
+
+    if args.list:
+        for record in log.records(args.start, args.end):
+            print(f"{datetime.fromtimestamp(record.timestamp):%Y-%m-%d %H:%M}  {_format_duration(record.duration)}  "
+                  f"{record.artist} - {record.title} ({record.album})")
+        print()
+
+    aggregates = log.summarize(args.start, args.end)
+    print(f"Plays: {aggregates.records}")
+    print(f"Listening time: {_format_duration(aggregates.total_duration)}")
+    for heading, totals in (("Top artists", aggregates.artists), ("Top albums", aggregates.albums)):
+        print()
+        print(f"{heading}:")
+        for name, plays, duration in log.top(totals, args.top):
+            print(f"  {_format_duration(duration)}  {plays:5d}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Latency and call count instrumentation for WinampRPC. Assign a Metrics object to Winamp.metrics and PayloadBuilder
+to record how long each message and presence update takes, and export the results as JSON or as a Prometheus
+textfile.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Tuple
+)
+
+from atomic_file import write_atomic
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+"""
+Upper bounds of the latency histogram buckets in seconds. Values above the last bound go to an implicit +Inf bucket.
+"""
+
+
+class Histogram:
+    """
+    A latency histogram with fixed buckets.
+    """
+
+    __slots__ = ("counts", "count", "sum", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float):
+        """
+        :param seconds: Measured latency in seconds
+        """
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: The histogram with cumulative bucket counts, like Prometheus histograms
+        """
+
+        cumulative, buckets = 0, {}
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+
+        return {"count": self.count, "sum": self.sum, "errors": self.errors, "buckets": buckets}
+
+
+class Metrics:
+    """
+    Collect latency histograms and error counts per operation and command, and call totals per tick. A tick is one
+    sample of the player, i.e. one PlayerWatcher.check().
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        """
+        :param clock: Clock function returning seconds, used for measuring latencies
+        """
+        self.clock = clock
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.ticks = Histogram()
+        """
+        Histogram of tick durations.
+        """
+        self.tick_calls = 0
+        """
+        Total number of Winamp messages sent during ticks.
+        """
+        self.last_tick = {"calls": 0, "seconds": 0.0}
+        """
+        Number of Winamp messages sent and total time spent in them during the latest tick.
+        """
+        self.gauges: Dict[str, float] = {}
+        """
+        Latest values of measurements that are not latencies, e.g. the sampling rate.
+        """
+
+        self._lock = threading.Lock()
+        self._tick_start = None
+        self._tick_thread = None
+        self._current_calls = 0
+        self._current_seconds = 0.0
+
+    def _histogram(self, operation: str, name: str) -> Histogram:
+        histogram = self.histograms.get((operation, name))
+        if histogram is None:
+            histogram = self.histograms[(operation, name)] = Histogram()
+
+        return histogram
+
+    def record(self, operation: str, name: str, seconds: float, error: bool = False):
+        """
+        Record a measured call.
+
+        :param operation: Name of the operation, e.g. 'send_user_command'
+        :param name: Name of the command or other detail of the operation
+        :param seconds: Duration of the call in seconds
+        :param error: True if the call raised an exception
+        """
+
+        with self._lock:
+            histogram = self._histogram(operation, name)
+            histogram.observe(seconds)
+            if error:
+                histogram.errors += 1
+            # Messages sent by other threads during a tick, e.g. by the prefetcher, are not part of the tick
+            if self._tick_start is not None and self._tick_thread == threading.get_ident() and \
+                    operation in ("send_command", "send_user_command", "get_track_title"):
+                self._current_calls += 1
+                self._current_seconds += seconds
+
+    def call(self, operation: str, name: str, func: Callable, *args) -> Any:
+        """
+        Call a function and record its latency.
+
+        :param operation: Name of the operation
+        :param name: Name of the command or other detail of the operation
+        :param func: The function to call
+        :param args: Arguments passed to the function
+        :return: Return value of the function
+        """
+
+        start = self.clock()
+        try:
+            result = func(*args)
+        except Exception:
+            self.record(operation, name, self.clock() - start, error=True)
+            raise
+
+        self.record(operation, name, self.clock() - start)
+        return result
+
+    @contextmanager
+    def measure(self, operation: str, name: str = "") -> Iterator[None]:
+        """
+        Context manager recording the latency of its block.
+
+        :param operation: Name of the operation
+        :param name: Name of the command or other detail of the operation
+        """
+
+        start = self.clock()
+        try:
+            yield
+        except Exception:
+            self.record(operation, name, self.clock() - start, error=True)
+            raise
+
+        self.record(operation, name, self.clock() - start)
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Set the current value of a gauge.
+
+        :param name: Name of the gauge, e.g. 'poll_rate'
+        :param value: The current value
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    def begin_tick(self):
+        """
+        Start counting messages sent from the calling thread for a new tick.
+        """
+        with self._lock:
+            self._tick_start = self.clock()
+            self._tick_thread = threading.get_ident()
+            self._current_calls = 0
+            self._current_seconds = 0.0
+
+    def end_tick(self):
+        """
+        Finish the current tick and record its totals.
+        """
+        with self._lock:
+            if self._tick_start is None:
+                return
+            self.ticks.observe(self.clock() - self._tick_start)
+            self.tick_calls += self._current_calls
+            self.last_tick = {"calls": self._current_calls, "seconds": self._current_seconds}
+            self._tick_start = None
+            self._tick_thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: All collected metrics in a JSON serializable dictionary
+        """
+
+        with self._lock:
+            operations = {}
+            for (operation, name), histogram in sorted(self.histograms.items()):
+                operations.setdefault(operation, {})[name] = histogram.to_dict()
+
+            return {
+                "timestamp": time.time(),
+                "operations": operations,
+                "ticks": self.ticks.to_dict(),
+                "tick_calls": self.tick_calls,
+                "calls_per_tick": self.tick_calls / self.ticks.count if self.ticks.count else 0.0,
+                "last_tick": dict(self.last_tick),
+                "gauges": dict(self.gauges),
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: All collected metrics in Prometheus text exposition format
+        """
+
+        snapshot = self.snapshot()
+        lines = ["# HELP winamprpc_call_seconds Latency of Winamp messages and presence operations.",
+                 "# TYPE winamprpc_call_seconds histogram"]
+        errors = ["# HELP winamprpc_call_errors_total Calls that raised an exception.",
+                  "# TYPE winamprpc_call_errors_total counter"]
+
+        for operation, names in snapshot["operations"].items():
+            for name, histogram in names.items():
+                labels = f'operation="{operation}",name="{name}"'
+                for bound, count in histogram["buckets"].items():
+                    lines.append(f'winamprpc_call_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"winamprpc_call_seconds_sum{{{labels}}} {histogram['sum']}")
+                lines.append(f"winamprpc_call_seconds_count{{{labels}}} {histogram['count']}")
+                errors.append(f"winamprpc_call_errors_total{{{labels}}} {histogram['errors']}")
+
+        ticks = snapshot["ticks"]
+        lines += ["# HELP winamprpc_tick_seconds Duration of player samples.",
+                  "# TYPE winamprpc_tick_seconds histogram"]
+        for bound, count in ticks["buckets"].items():
+            lines.append(f'winamprpc_tick_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f"winamprpc_tick_seconds_sum {ticks['sum']}")
+        lines.append(f"winamprpc_tick_seconds_count {ticks['count']}")
+        lines += ["# HELP winamprpc_tick_calls_total Winamp messages sent during player samples.",
+                  "# TYPE winamprpc_tick_calls_total counter",
+                  f"winamprpc_tick_calls_total {snapshot['tick_calls']}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines += [f"# TYPE winamprpc_{name} gauge", f"winamprpc_{name} {value}"]
+
+        return "\n".join(lines + errors) + "\n"
+
+    def write_json(self, filepath: str):
+        """
+        Write a JSON snapshot of the metrics. The file is replaced atomically.
+
+        :param filepath: Path of the JSON file
+        """
+        write_atomic(filepath, json.dumps(self.snapshot(), indent=2))
+
+    def write_prometheus(self, filepath: str):
+        """
+        Write the metrics in a Prometheus textfile. The file is replaced atomically, so it can be read by the node
+        exporter textfile collector at any time.
+
+        :param filepath: Path of the .prom file
+        """
+        write_atomic(filepath, self.to_prometheus())
+
+
+class MetricsExporter:
+    """
+    Write metrics to a JSON snapshot and a Prometheus textfile periodically in a background thread.
+    """
+
+    def __init__(self, metrics: Metrics, directory: str, interval: float = 60.0):
+        """
+        :param metrics: The metrics to export
+        :param directory: Directory where metrics.json and winamprpc.prom are written
+        :param interval: Time in seconds between exports
+        """
+        self.metrics = metrics
+        self.json_filepath = os.path.join(directory, "metrics.json")
+        self.prometheus_filepath = os.path.join(directory, "winamprpc.prom")
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def export(self):
+        """
+        Write both files now.
+        """
+        self.metrics.write_json(self.json_filepath)
+        self.metrics.write_prometheus(self.prometheus_filepath)
+
+    def start(self):
+        """
+        Start exporting in a background thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and export one last time.
+        """
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Could not export metrics: {e}")
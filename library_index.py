@@ -0,0 +1,513 @@
+"""
+Persistent index of the music library for album resolution. Use LibraryIndex to scan music directories into an SQLite
+database of track files with their size, modification time, album, artist and the cover image of their directory, and
+to look up the album of a playing track with a single indexed query instead of reading its tags or guessing from its
+path.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple
+)
+
+import metadata
+from metadata import (
+    AUDIO_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    MetadataProvider,
+    TrackMetadata,
+    choose_cover,
+    metadata_from_path,
+    read_tags
+)
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE directories (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent_id INTEGER,
+    mtime_ns INTEGER NOT NULL,
+    cover TEXT
+);
+CREATE INDEX directories_parent ON directories (parent_id);
+CREATE TABLE tracks (
+    path_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    directory_id INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    artist TEXT,
+    album TEXT,
+    album_artist TEXT,
+    track_number INTEGER,
+    source TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX tracks_directory ON tracks (directory_id);
+CREATE INDEX tracks_album ON tracks (album);
+"""
+
+BATCH_TRACKS = 5000
+"""
+Number of new or changed tracks read and written per transaction during a scan.
+"""
+RACY_WINDOW_NS = 2_000_000_000
+"""
+Directories modified less than this many nanoseconds before they were scanned are scanned again on the next rescan,
+since a file could have been added within the same modification time.
+"""
+
+
+def path_key(path: str) -> str:
+    """
+    :return: The path in the form tracks are looked up with, so paths differing only in case or separators on Windows
+    are the same track
+    """
+    return os.path.normcase(os.path.normpath(path))
+
+
+class ScanResult:
+    """
+    Statistics of a library scan.
+    """
+
+    __slots__ = ("directories", "changed_directories", "tracks", "added", "updated", "removed", "seconds")
+
+    def __init__(self):
+        self.directories = 0
+        self.changed_directories = 0
+        """
+        Number of directories listed because they were new or modified. Other directories were only checked with
+        a stat.
+        """
+        self.tracks = 0
+        """
+        Number of tracks in the index after the scan.
+        """
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return (f"ScanResult(directories={self.directories}, changed_directories={self.changed_directories}, "
+                f"tracks={self.tracks}, added={self.added}, updated={self.updated}, removed={self.removed}, "
+                f"seconds={self.seconds:.3f})")
+
+    def __str__(self) -> str:
+        return (f"Scanned {self.directories} directories ({self.changed_directories} changed) with {self.tracks} "
+                f"tracks in {self.seconds:.1f} seconds: {self.added} added, {self.updated} updated, "
+                f"{self.removed} removed")
+
+
+class _Listing:
+    """
+    Contents of a scanned directory.
+    """
+
+    __slots__ = ("path", "parent", "mtime_ns", "subdirectories", "tracks", "cover")
+
+    def __init__(self, path: str, parent: Optional[str], mtime_ns: int):
+        self.path = path
+        self.parent = parent
+        self.mtime_ns = mtime_ns
+        self.subdirectories: List[str] = []
+        self.tracks: Optional[List[Tuple[str, int, int]]] = None
+        """
+        Path, size and modification time of each track, or None if the directory has not changed since the
+        previous scan and was not listed.
+        """
+        self.cover = None
+
+
+def _list_directory(path: str, parent: Optional[str], known_mtime_ns: Optional[int]) -> Optional[_Listing]:
+    """
+    List a directory if it has changed since the previous scan. Called in the worker threads.
+
+    :return: The listing, or None if the directory could not be read
+    """
+
+    try:
+        listing = _Listing(path, parent, os.stat(path).st_mtime_ns)
+        if listing.mtime_ns == known_mtime_ns:
+            return listing
+
+        listing.tracks = []
+        images = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    listing.subdirectories.append(entry.path)
+                    continue
+                extension = os.path.splitext(entry.name)[1].lower()
+                if extension in AUDIO_EXTENSIONS:
+                    stat = entry.stat()
+                    listing.tracks.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                elif extension in IMAGE_EXTENSIONS:
+                    images.append(entry.name)
+    except OSError as e:
+        print(f"Could not scan {path}: {e}")
+        return None
+
+    listing.cover = choose_cover(images)
+    return listing
+
+
+def _read_metadata(track_path: str, use_tags: bool) -> TrackMetadata:
+    return (read_tags(track_path) if use_tags else None) or metadata_from_path(track_path)
+
+
+class LibraryIndex:
+    """
+    Index the track files in music directories into an SQLite database. A rescan lists only the directories whose
+    modification time has changed and reads the tags only of new and changed files, so rescanning an unchanged
+    library costs one stat per directory. Directories are scanned and tags are read on a thread pool.
+
+    Editing the tags of a file does not change the modification time of its directory, so the edit is noticed only on
+    a full rescan. Lookups compare the size and modification time of the file with the index, and use the fallback
+    provider for files that have changed since they were indexed, so results are never stale.
+
+    The index has the same get() and flush() methods as MetadataProvider, so it can be used in its place.
+    """
+
+    def __init__(self,
+                 database_filepath: str,
+                 roots: Iterable[str],
+                 use_tags: bool = True,
+                 fallback: Optional[MetadataProvider] = None,
+                 workers: Optional[int] = None
+                 ):
+        """
+        :param database_filepath: Path to the SQLite database, or ':memory:'
+        :param roots: Music directories to index recursively
+        :param use_tags: If False, the album and artist are always guessed from the directory structure
+        :param fallback: Provider for tracks that are not in the index, e.g. tracks outside the music directories.
+        If None, the metadata of those tracks is guessed from their path.
+        :param workers: Number of threads scanning directories and reading tags. Defaults to the ThreadPoolExecutor
+        default.
+        """
+        self.database_filepath = database_filepath
+        self.roots = [os.path.normpath(root) for root in roots]
+        self.use_tags = use_tags and metadata.mutagen is not None
+        self.fallback = fallback
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self.last_scan: Optional[ScanResult] = None
+
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._connection = sqlite3.connect(database_filepath, check_same_thread=False)
+        self._open()
+
+    def _open(self):
+        connection = self._connection
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        if version != 0:
+            print("Library index is from a different version and is rebuilt.")
+        with connection:
+            connection.execute("DROP TABLE IF EXISTS tracks")
+            connection.execute("DROP TABLE IF EXISTS directories")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        """
+        Stop background rescans and close the database.
+        """
+
+        self.stop()
+        with self._lock:
+            self._connection.close()
+
+    def get(self, track_path: str) -> TrackMetadata:
+        """
+        Get the metadata of a track.
+
+        :param track_path: Path to the track file
+        :return: The metadata from the index if the file has not changed since it was indexed, otherwise from the
+        fallback provider
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, artist, album, album_artist, track_number, source FROM tracks "
+                "WHERE path_key = ?", (path_key(track_path),)).fetchone()
+
+        if row is not None:
+            try:
+                stat = os.stat(track_path)
+                if (stat.st_size, stat.st_mtime_ns) == row[:2]:
+                    self.hits += 1
+                    return TrackMetadata(*row[2:])
+            except OSError:
+                pass
+
+        self.misses += 1
+        if self.fallback is not None:
+            return self.fallback.get(track_path)
+        return metadata_from_path(track_path)
+
+    def get_cover(self, track_path: str) -> Optional[str]:
+        """
+        :param track_path: Path to the track file
+        :return: Path to the cover image in the directory of the track, or None if the track is not indexed or its
+        directory has no images
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT directories.path, directories.cover FROM tracks JOIN directories "
+                "ON directories.id = tracks.directory_id WHERE tracks.path_key = ?",
+                (path_key(track_path),)).fetchone()
+
+        if row is None or row[1] is None:
+            return None
+        return os.path.join(row[0], row[1])
+
+    def flush(self):
+        """
+        Write the unsaved entries of the fallback provider. The index itself is saved after every scan batch.
+        """
+        if self.fallback is not None:
+            self.fallback.flush()
+
+    def _known_directories(self) -> Tuple[Dict[str, Tuple[int, int]], Dict[int, List[str]]]:
+        """
+        :return: ID and modification time by directory path, and paths of the subdirectories by directory ID
+        """
+
+        known = {}
+        children: Dict[int, List[str]] = {}
+        with self._lock:
+            for directory_id, path, parent_id, mtime_ns in self._connection.execute(
+                    "SELECT id, path, parent_id, mtime_ns FROM directories"):
+                known[path] = (directory_id, mtime_ns)
+                if parent_id is not None:
+                    children.setdefault(parent_id, []).append(path)
+
+        return known, children
+
+    def _apply(self, listings: List[_Listing], known: Dict[str, Tuple[int, int]], executor: ThreadPoolExecutor,
+               scan_started_ns: int, result: ScanResult):
+        """
+        Read the new and changed tracks of listed directories and write them into the index in one transaction.
+        """
+
+        changed = []
+        removed_keys = []
+        with self._lock:
+            for listing in listings:
+                directory = known.get(listing.path)
+                existing = {}
+                if directory is not None:
+                    existing = {key: (size, mtime_ns) for key, size, mtime_ns in self._connection.execute(
+                        "SELECT path_key, size, mtime_ns FROM tracks WHERE directory_id = ?", (directory[0],))}
+                for track_path, size, mtime_ns in listing.tracks:
+                    key = path_key(track_path)
+                    signature = existing.pop(key, None)
+                    if signature != (size, mtime_ns):
+                        changed.append((listing, track_path, key, size, mtime_ns, signature is not None))
+                removed_keys.extend(existing)
+
+        # Reading the tags is the slow part, so it is done without holding the lock
+        metadata_list = list(executor.map(lambda track: _read_metadata(track[1], self.use_tags), changed))
+
+        with self._lock, self._connection:
+            connection = self._connection
+            for listing in listings:
+                # A directory modified during the scan may have changed again within the same modification time
+                mtime_ns = -1 if scan_started_ns - listing.mtime_ns < RACY_WINDOW_NS else listing.mtime_ns
+                parent = known.get(listing.parent) if listing.parent is not None else None
+                parent_id = parent[0] if parent is not None else None
+                directory = known.get(listing.path)
+                if directory is None:
+                    directory_id = connection.execute(
+                        "INSERT INTO directories (path, parent_id, mtime_ns, cover) VALUES (?, ?, ?, ?)",
+                        (listing.path, parent_id, mtime_ns, listing.cover)).lastrowid
+                else:
+                    directory_id = directory[0]
+                    connection.execute("UPDATE directories SET parent_id = ?, mtime_ns = ?, cover = ? WHERE id = ?",
+                                       (parent_id, mtime_ns, listing.cover, directory_id))
+                known[listing.path] = (directory_id, mtime_ns)
+
+            rows = []
+            for (listing, track_path, key, size, mtime_ns, exists), track in zip(changed, metadata_list):
+                rows.append((key, track_path, known[listing.path][0], size, mtime_ns, track.artist, track.album,
+                             track.album_artist, track.track_number, track.source))
+                if exists:
+                    result.updated += 1
+                else:
+                    result.added += 1
+            connection.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.executemany("DELETE FROM tracks WHERE path_key = ?", ((key,) for key in removed_keys))
+            result.removed += len(removed_keys)
+
+    def _remove_directories(self, paths: List[str], known: Dict[str, Tuple[int, int]], result: ScanResult):
+        with self._lock, self._connection:
+            for path in paths:
+                directory_id = known.pop(path)[0]
+                result.removed += self._connection.execute("DELETE FROM tracks WHERE directory_id = ?",
+                                                           (directory_id,)).rowcount
+                self._connection.execute("DELETE FROM directories WHERE id = ?", (directory_id,))
+
+    def rescan(self, full: bool = False) -> ScanResult:
+        """
+        Bring the index up to date with the music directories. Only one scan runs at a time.
+
+        :param full: If True, every directory is listed, so files changed in place, e.g. by a tag editor, are read
+        again
+        :return: Statistics of the scan
+        """
+
+        with self._scan_lock:
+            result = ScanResult()
+            started = time.perf_counter()
+            scan_started_ns = time.time_ns()
+            known, children = self._known_directories()
+            visited = set()
+            unreachable_roots = []
+            pending: List[_Listing] = []
+            pending_tracks = 0
+
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="LibraryIndex") as executor:
+                # Directories are scanned one depth at a time, so all directories of a depth are scanned in parallel
+                level: List[Tuple[str, Optional[str]]] = [(root, None) for root in self.roots]
+                while level:
+                    # Directories with an unchanged modification time are not listed unless the scan is full
+                    listings = executor.map(lambda item: _list_directory(*item),
+                                            [(path, parent, None if full or path not in known else known[path][1])
+                                             for path, parent in level])
+                    next_level = []
+                    for (path, parent), listing in zip(level, listings):
+                        if listing is None:
+                            if parent is None:
+                                unreachable_roots.append(path)
+                            continue
+                        visited.add(path)
+                        result.directories += 1
+                        if listing.tracks is None:
+                            next_level.extend((child, path) for child in children.get(known[path][0], ()))
+                            continue
+
+                        result.changed_directories += 1
+                        next_level.extend((child, path) for child in listing.subdirectories)
+                        pending.append(listing)
+                        pending_tracks += len(listing.tracks)
+                        if pending_tracks >= BATCH_TRACKS:
+                            self._apply(pending, known, executor, scan_started_ns, result)
+                            pending = []
+                            pending_tracks = 0
+                    level = next_level
+
+                if pending:
+                    self._apply(pending, known, executor, scan_started_ns, result)
+
+            # Directories of unreachable roots, e.g. a disconnected drive, are kept until the root is back
+            removed = [path for path in known if path not in visited and
+                       not any(path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+                               for root in unreachable_roots)]
+            if removed:
+                self._remove_directories(removed, known, result)
+
+            with self._lock:
+                result.tracks = self._connection.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            result.seconds = time.perf_counter() - started
+            self.last_scan = result
+
+        return result
+
+    def start(self, interval: float = 0.0):
+        """
+        Rescan in a background thread now and then every interval seconds. Lookups use the index while it is being
+        scanned.
+
+        :param interval: Time in seconds between rescans. 0 scans only once.
+        """
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="LibraryIndex", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop background rescans. A running scan finishes first.
+        """
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, interval: float):
+        while True:
+            try:
+                print(f"Library index: {self.rescan()}")
+            except (OSError, sqlite3.Error) as e:
+                print(f"Could not scan the music library: {e}")
+            if interval <= 0 or self._stopped.wait(interval):
+                return
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index music directories for album resolution.")
+    parser.add_argument("library", nargs="+", help="Music directories to index")
+    parser.add_argument("--database", default=os.path.join(os.path.dirname(__file__), "library.sqlite3"),
+                        help="Path to the index database. Defaults to library.sqlite3 next to this script.")
+    parser.add_argument("--full", action="store_true", help="List every directory, also unchanged ones")
+    parser.add_argument("--no-tags", action="store_true", help="Guess albums from the directory structure only")
+    parser.add_argument("--workers", type=int, help="Number of scanning threads")
+    args = parser.parse_args()
+
+    index = LibraryIndex(args.database, args.library, use_tags=not args.no_tags, workers=args.workers)
+    try:
+        print(index.rescan(args.full))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
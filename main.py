@@ -24,161 +24,251 @@ SOFTWARE.
 
 import time
 import os
-import json
+import sys
+from typing import Optional
 
-from winamp import Winamp, PlayingStatus
+from winamp import Winamp
+from playlist import PlaylistCache
+from title_parser import parse_title
+from payload import PayloadBuilder, load_settings, load_asset_resolver, load_metadata_provider
+from events import PlayerWatcher, WindowTitleHook, PlayerEvent, Paused, Stopped, Seeked
+from prefetch import PayloadPrefetcher
+from poll_scheduler import PollScheduler
+from presence_scheduler import PresenceScheduler
+from sinks import NowPlaying, StatePublisher, load_sinks
+from supervisor import ConnectionSupervisor, ConnectionEvent, ConnectionState, WinampEndpoint, DiscordEndpoint
+from instrumentation import Metrics, MetricsExporter
+from profiler import Profiler
+from history import HistoryLog, HistoryRecorder
+from metadata import metadata_from_path
 from pypresence import Presence
 
 
-def update_rpc():
+def update_rpc(trackinfo_raw: str, position: int):
+    """
+    Publish a track to the rich presence and the other sinks, if it is not already shown.
+
+    :param trackinfo_raw: Winamp window title in format {tracknum}. {artist} - {track title} - Winamp
+    :param position: Track position in milliseconds
+    """
     global previous_track
     global cleared
-    trackinfo_raw = w.get_track_title()  # This is in format {tracknum}. {artist} - {track title} - Winamp
+    global current_payload
 
     if trackinfo_raw != previous_track:
         previous_track = trackinfo_raw
-        trackinfo = trackinfo_raw.split(" - ")[:-1]
-        track_pos = w.get_playlist_position()  # Track position in the playlist
-        artist = trackinfo[0].strip(f"{track_pos + 1}. ")
-        track_name = " - ".join(trackinfo[1:])
-        pos, now = w.get_track_status()[1] / 1000, time.time()  # Both are in seconds
-
-        if len(track_name) < 2:
-            track_name = f"Track: {track_name}"
-        if pos >= 100000:  # Sometimes this is over 4 million if a new track starts
-            pos = 0
-        start = now - pos
-
-        # If boolean custom_assets is set true, get the asset key and text from album_covers.json
-        if custom_assets:
-            large_asset_key, large_asset_text = get_album_art(track_pos, artist)
-        else:
-            large_asset_key = "logo"
-            large_asset_text = f"Winamp v{winamp_version}"
-
-        rpc.update(details=track_name, state=f"by {artist}", start=int(start), large_image=large_asset_key,
-                   small_image=small_asset_key, large_text=large_asset_text, small_text=small_asset_text)
+        # The player state was read by the watcher in the sample that dispatched the event
+        track_pos = watcher.snapshot.playlist_position
+
+        current_payload = payload_builder.build(trackinfo_raw, track_pos, position, time.time())
+        parsed = parse_title(trackinfo_raw)
+        publisher.publish(NowPlaying(parsed.artist, parsed.title, track_pos, current_payload["start"], current_payload))
         cleared = False
 
 
-def get_album_art(track_position: int, artist: str):
+def correct_rpc_start(position: int):
     """
-    Dump current playlist into C:\\Users\\username\\Appdata\\Roaming\\Winamp\\Winamp.m3u8. Then read the path of current
-    track from the file and find the album name from it. If album has corresponding album name with key in file
-    album_covers.json, return the asset key and album name. Otherwise return default asset key and text. Also, this
-    function assumes the music directory structure is like artist\\album\\tracks. If the folder structure is something
-    else, the album_name variable may not be the album name and you need to check these manually.
-    This function is used only if custom_assets is set to True and album_covers.json is found.
-
-    :param track_position: Current track's position in the playlist, starting from 0
-    :param artist: Current track's artist. This is needed in case album name is in exceptions i.e. there are multiple
-    albums with same name
-    :return: Album asset key and album name. Asset key in api must be exactly same as this key.
+    Correct the elapsed time of the shown track without building the rest of the presence again.
+
+    :param position: Corrected track position in milliseconds
+    """
+    global current_payload
+
+    if current_payload is not None and not cleared:
+        current_payload = dict(current_payload, start=int(time.time() - position / 1000))
+        parsed = parse_title(previous_track)
+        publisher.publish(NowPlaying(parsed.artist, parsed.title, watcher.snapshot.playlist_position,
+                                     current_payload["start"], current_payload))
+
+
+def on_player_event(event: PlayerEvent):
     """
+    Update or clear the rich presence according to an event from the player watcher.
 
-    w.dump_playlist()
-    appdata_path = os.getenv("APPDATA")
-    # Returns list of paths to every track in playlist which are in format
-    # 'path_to_music_directory\\artist\\album\\track'
-    tracklist_paths = w.get_playlist(f"{appdata_path}\\Winamp\\Winamp.m3u8")
-    # Get the current track's directory path
-    track_path = os.path.dirname(tracklist_paths[track_position])
-    # Get the tail of the path i.e. the album name
-    album_name = os.path.basename(track_path)
-
-    large_asset_text = album_name
-    # If there are multiple albums with same name, and they are added into exceptions file, use 'Artist - Album' instead
-    if album_name in album_exceptions:
-        album_key = f"{artist} - {album_name}"
+    :param event: Event dispatched by PlayerWatcher
+    """
+    global previous_track
+    global cleared
+
+    if isinstance(event, (Paused, Stopped)):
+        if not cleared:
+            publisher.publish(None)
+            previous_track = ""
+            cleared = True
+    elif isinstance(event, Seeked):
+        correct_rpc_start(event.position)
+    elif metrics is not None:
+        with metrics.measure("update_rpc"):
+            update_rpc(event.title, event.position or 0)
     else:
-        album_key = album_name
-    try:
-        large_asset_key = album_asset_keys[album_key]
-    except KeyError:
-        # Could not find asset key for album cover. Use default asset and asset text instead
-        large_asset_key = default_large_key
-        if default_large_text == "winamp version":
-            large_asset_text = f"Winamp v{winamp_version}"
-        elif default_large_text == "album name":
-            large_asset_text = album_name
-        else:
-            large_asset_text = default_large_text
+        update_rpc(event.title, event.position or 0)
+
+
+def lookup_album(trackinfo_raw: str, track_pos: Optional[int]) -> Optional[str]:
+    """
+    Find the album of a track for the listening history. This is called when the play is recorded, which is usually
+    when the next track has already started, so the playlist position of the track is the one sampled when it started.
+
+    :param trackinfo_raw: Winamp window title in format {tracknum}. {artist} - {track title} - Winamp
+    :param track_pos: Playlist position of the track when it started, or None if it is not known
+    :return: The album name, or None if the track is not in the playlist
+    """
+
+    if track_pos is None:
+        track_pos = parse_title(trackinfo_raw).playlist_position
+    if track_pos is None:
+        return None
 
-    if len(large_asset_text) < 2:
-        large_asset_text = f"Album: {large_asset_text}"
+    track_path = playlist_cache.get_path(track_pos)
+    metadata = metadata_provider.get(track_path) if metadata_provider is not None else metadata_from_path(track_path)
+    return metadata.album
 
-    return large_asset_key, large_asset_text
+
+def on_connection_event(event: ConnectionEvent):
+    """
+    Report connection changes and stop sampling the player while Winamp or Discord is not connected.
+
+    :param event: Event dispatched by ConnectionSupervisor
+    """
+
+    if event.state == ConnectionState.Connected:
+        print(f"Connected to {event.endpoint.capitalize()}.")
+        return
+
+    if event.previous == ConnectionState.Connected:
+        print(f"Lost connection to {event.endpoint.capitalize()}. Waiting for it to be available again.")
+    # Sampling is continued when every connection is up again
+    watcher.stop()
 
 
 # Get the directory where this script was executed to make sure Python can find all files.
 main_path = os.path.dirname(__file__)
+settings = load_settings(main_path)
 
-# Load current settings to a dictionary and assign them to variables. If settings file can't be found, make a new one
-# with default settings.
-try:
-    with open(f"{main_path}\\settings.json") as settings_file:
-        settings = json.load(settings_file)
-except FileNotFoundError:
-    settings = {"_comment": "Default_large_asset_text 'winamp version' shows your Winamp version and 'album name' "
-                            "the current playing album",
-                "client_id": "default",
-                "default_large_asset_key": "logo",
-                "default_large_asset_text": "winamp version",
-                "small_asset_key": "playbutton",
-                "small_asset_text": "Playing",
-                "custom_assets": False}
-
-    with open(f"{main_path}\\settings.json", "w") as settings_file:
-        json.dump(settings, settings_file, indent=2)
-    print("Could not find settings.json. Made new settings file with default values.")
-
-client_id = settings["client_id"]
-default_large_key = settings["default_large_asset_key"]
-default_large_text = settings["default_large_asset_text"]
-small_asset_key = settings["small_asset_key"]
-small_asset_text = settings["small_asset_text"]
-custom_assets = settings["custom_assets"]
-
-if client_id == "default":
-    client_id = "507484022675603456"
+# Profiling samples the stacks of all threads and traces memory allocations. A profile is written on exit, and when
+# the process receives SIGBREAK (CTRL + Break) on Windows or SIGUSR1 elsewhere.
+profiler = None
+if settings["profiling"] or "--profile" in sys.argv[1:]:
+    profiler = Profiler(settings["profile_directory"] or os.path.join(main_path, "profiles"),
+                        window_interval=settings["profile_interval"])
+    profiler.start()
+    signal_name = profiler.install_signal_handler()
+    print(f"Profiling is enabled. Send {signal_name} to write a profile." if signal_name else
+          "Profiling is enabled. A profile is written on exit.")
 
+# Instrumentation records the latency of every Winamp message, presence update and album art lookup
+metrics = Metrics() if settings["instrumentation"] else None
+# Winamp is connected later by the connection supervisor if it is not running yet
 w = Winamp()
-rpc = Presence(client_id)
-rpc.connect()
+w.metrics = metrics
+playlist_cache = PlaylistCache(w)
+# Updates are sent in the background, so rapid track changes are coalesced and the Discord rate limit is respected.
+# The Discord client is given to the scheduler by the connection supervisor.
+presence = PresenceScheduler(None, settings["presence_updates_per_interval"], settings["presence_update_interval"])
+presence.start()
+winamp_endpoint = WinampEndpoint(w)
+supervisor = ConnectionSupervisor([winamp_endpoint,
+                                   DiscordEndpoint(lambda: Presence(settings["client_id"]), presence)])
+# The now playing state is published to Discord and the other sinks enabled in the settings, each written in its own
+# thread, so a slow sink never delays sampling the player
+publisher = StatePublisher(load_sinks(settings, presence))
+publisher.start()
 
-winamp_version = w.version
 previous_track = ""
+current_payload = None
 cleared = False
 
-# If boolean custom_assets is set True, try to load file for album assets and album name exceptions.
-# Files for album cover assets and album name exceptions are loaded only when starting the script so restart is
-# needed when new albums are added
-if custom_assets:
-    try:
-        with open(f"{main_path}\\album_name_exceptions.txt", "r", encoding="utf8") as exceptions_file:
-            album_exceptions = exceptions_file.read().splitlines()
-    except FileNotFoundError:
-        print("Could not find album_name_exceptions.txt. Default (or possibly wrong) assets will be used for duplicate "
-              "album names.")
-        album_exceptions = []
-    try:
-        with open(f"{main_path}\\album_covers.json", encoding="utf8") as data_file:
-            album_asset_keys = json.load(data_file)
-    except FileNotFoundError:
-        print("Could not find album_covers.json. Default assets will be used.")
-        custom_assets = False
+# If custom_assets is set True, album assets are resolved from album_covers.json and album_name_exceptions.txt, and
+# album names are read from track tags
+metadata_provider = load_metadata_provider(main_path, settings)
+# The Winamp version is set when Winamp is connected
+builder = PayloadBuilder(settings, "", playlist_cache, load_asset_resolver(main_path, settings), metrics,
+                         metadata_provider)
+payload_builder = builder
+# Album assets of the next tracks are resolved in the background, so track changes do not wait for the playlist
+if settings["prefetch_tracks"] > 0:
+    payload_builder = PayloadPrefetcher(builder, w, settings["prefetch_tracks"])
+    payload_builder.start()
+if metrics is not None:
+    metrics_exporter = MetricsExporter(metrics, settings["metrics_directory"] or main_path,
+                                       settings["metrics_interval"])
+    metrics_exporter.start()
 
 
+# The player is sampled quickly near track ends and less often the longer it is paused or stopped
+poll_scheduler = PollScheduler(wakeups_per_minute=settings["poll_wakeups_per_minute"])
+poll_scheduler.metrics = metrics
+watcher = PlayerWatcher(w, scheduler=poll_scheduler)
+watcher.subscribe(on_player_event)
+watcher.metrics = metrics
+
+# Every played track is appended to the listening history, see history.py for querying it
+history_recorder = None
+if settings["history"]:
+    # The watcher dispatches events after storing the snapshot they were detected in
+    history_recorder = HistoryRecorder(HistoryLog(settings["history_directory"] or os.path.join(main_path, "history")),
+                                       lookup_album, position_lookup=lambda: watcher.snapshot.playlist_position)
+    watcher.subscribe(history_recorder.on_event)
+
+supervisor.subscribe(on_connection_event)
+supervisor.start()
 print()
 print("Winamp status is now being updated to Discord (if the Discord activity privacy settings allow this).")
 print("To exit, simply press CTRL + C.")
-while True:
-    status = w.get_playing_status()
-    if status == PlayingStatus.Paused or status == PlayingStatus.Stopped and not cleared:
-        rpc.clear()
+
+title_hook = None
+try:
+    while True:
+        # Winamp may be restarted with a different playlist. The watcher is reset before waiting, so a lost connection
+        # reported by the supervisor between the wait and watcher.run() stops the watcher instead of being forgotten.
+        playlist_cache.invalidate()
+        watcher.reset()
         previous_track = ""
-        cleared = True
+        cleared = False
+
+        # Wait without sampling while Winamp or Discord is closed. The timeout keeps CTRL + C working on Windows.
+        while not supervisor.wait_until_connected(5.0):
+            pass
+
+        # Winamp changes its window text on track and status changes. If the hook can be installed, those changes are
+        # received immediately and the player does not need to be sampled often while it is paused or stopped.
+        title_hook = WindowTitleHook(watcher, w.window_id)
+        try:
+            title_hook.start()
+            poll_scheduler.max_idle_interval = 60.0
+        except OSError:
+            poll_scheduler.max_idle_interval = 5.0
+
+        try:
+            builder.winamp_version = w.version
+            watcher.run()
+        except ConnectionError as e:
+            supervisor.report_failure(winamp_endpoint, e)
+        finally:
+            title_hook.stop()
 
-    elif status == PlayingStatus.Playing:
-        update_rpc()
-    time.sleep(1)
+        # Nothing is playing while Winamp is closed
+        if not supervisor.connected and not cleared:
+            publisher.publish(None)
+            cleared = True
+        if history_recorder is not None and supervisor.states[winamp_endpoint.name] != ConnectionState.Connected:
+            history_recorder.finish()
+finally:
+    supervisor.stop()
+    print(f"Sampled the player {poll_scheduler.average_rate * 60:.1f} times per minute on average.")
+    if title_hook is not None:
+        title_hook.stop()
+    publisher.stop()
+    presence.stop()
+    if history_recorder is not None:
+        history_recorder.finish()
+        history_recorder.log.close()
+    if isinstance(payload_builder, PayloadPrefetcher):
+        payload_builder.stop()
+    if metadata_provider is not None:
+        metadata_provider.flush()
+    if metrics is not None:
+        metrics_exporter.stop()
+    if profiler is not None:
+        stacks_filepath, allocations_filepath = profiler.stop()
+        print(f"Profile written into {stacks_filepath} and {allocations_filepath}")
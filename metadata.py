@@ -0,0 +1,290 @@
+"""
+Track metadata for album resolution. Use MetadataProvider to read the artist, album, album artist and track number of
+a track from the tags in its file, with a persistent cache so each file is read only once. Reading tags requires the
+optional mutagen package. Without it, or for files without tags, the metadata is guessed from the directory structure.
+The audio and image file extensions and the choice of an album's cover image are shared by the library scanners.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import ntpath
+import os
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from atomic_file import write_atomic
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+SOURCE_TAGS = "tags"
+SOURCE_PATH = "path"
+
+AUDIO_EXTENSIONS = frozenset((".mp3", ".flac", ".ogg", ".oga", ".opus", ".m4a", ".mp4", ".aac", ".wma", ".wav",
+                              ".ape", ".mpc", ".wv"))
+IMAGE_EXTENSIONS = frozenset((".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"))
+COVER_NAMES = ("cover", "folder", "front", "albumart", "album")
+"""
+File names of cover images in order of preference. Other images in an album directory are used only if none of these
+exist.
+"""
+
+
+class TrackMetadata:
+    """
+    A class representing the metadata of a track file.
+    """
+
+    __slots__ = ("artist", "album", "album_artist", "track_number", "source")
+
+    def __init__(self, artist: Optional[str], album: Optional[str], album_artist: Optional[str] = None,
+                 track_number: Optional[int] = None, source: str = SOURCE_PATH):
+        """
+        :param artist: The track artist
+        :param album: The album name
+        :param album_artist: The album artist, if different from the track artist in tags
+        :param track_number: Track number in the album
+        :param source: Where the metadata is from, either 'tags' or 'path'
+        """
+        self.artist = artist
+        self.album = album
+        self.album_artist = album_artist
+        self.track_number = track_number
+        self.source = source
+
+    def __repr__(self) -> str:
+        return (f"TrackMetadata(artist={self.artist!r}, album={self.album!r}, album_artist={self.album_artist!r}, "
+                f"track_number={self.track_number!r}, source={self.source!r})")
+
+    def to_list(self) -> list:
+        return [self.artist, self.album, self.album_artist, self.track_number, self.source]
+
+    @classmethod
+    def from_list(cls, values: list) -> "TrackMetadata":
+        return cls(*values)
+
+
+def metadata_from_path(track_path: str) -> TrackMetadata:
+    """
+    Guess the metadata from a path in format 'path_to_music_directory\\artist\\album\\track'. If the folder structure
+    is something else, the album and artist may be wrong.
+
+    :param track_path: Path to the track file. Both Windows and POSIX separators are accepted.
+    :return: The guessed metadata
+    """
+
+    album_path = ntpath.dirname(track_path)
+    album = ntpath.basename(album_path)
+    artist = ntpath.basename(ntpath.dirname(album_path))
+
+    return TrackMetadata(artist or None, album or None, source=SOURCE_PATH)
+
+
+def choose_cover(images: List[str]) -> Optional[str]:
+    """
+    Choose the cover image of an album directory.
+
+    :param images: File names of the images in the directory
+    :return: File name of the cover, or None if there are no images
+    """
+
+    if not images:
+        return None
+
+    stems = {os.path.splitext(image)[0].casefold(): image for image in images}
+    for name in COVER_NAMES:
+        if name in stems:
+            return stems[name]
+
+    return sorted(images)[0]
+
+
+def _first_tag(tags, key: str) -> Optional[str]:
+    values = tags.get(key)
+    if not values:
+        return None
+    value = str(values[0]).strip()
+    return value or None
+
+
+def read_tags(track_path: str) -> Optional[TrackMetadata]:
+    """
+    Read the metadata from the tags of a track file.
+
+    :param track_path: Path to the track file
+    :return: The metadata, or None if mutagen is not installed or the file has no album tag
+    """
+
+    if mutagen is None:
+        return None
+
+    try:
+        audio = mutagen.File(track_path, easy=True)
+    except (OSError, mutagen.MutagenError):
+        return None
+    if audio is None or audio.tags is None:
+        return None
+
+    album = _first_tag(audio.tags, "album")
+    if album is None:
+        return None
+
+    track_number = _first_tag(audio.tags, "tracknumber")
+    try:
+        # Track numbers may be in format 'number/total'
+        track_number = int(track_number.split("/")[0]) if track_number else None
+    except ValueError:
+        track_number = None
+
+    return TrackMetadata(_first_tag(audio.tags, "artist"), album, _first_tag(audio.tags, "albumartist"),
+                         track_number, SOURCE_TAGS)
+
+
+class MetadataProvider:
+    """
+    Provide track metadata from tags, falling back to the directory structure. Results are cached in memory and in a
+    JSON file by path, size and modification time, so a track is read again only if its file changes. The cache file
+    is written in batches.
+    """
+
+    def __init__(self,
+                 cache_filepath: Optional[str] = None,
+                 use_tags: bool = True,
+                 flush_every: int = 20,
+                 flush_interval: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param cache_filepath: Path to the JSON cache file, or None to cache only in memory
+        :param use_tags: If False, metadata is always guessed from the path and nothing is cached
+        :param flush_every: Number of new cache entries after which the cache file is written
+        :param flush_interval: Maximum time in seconds a new cache entry stays unwritten, checked on lookups
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.cache_filepath = cache_filepath
+        self.use_tags = use_tags and mutagen is not None
+        if use_tags and mutagen is None:
+            print("Could not import mutagen, so track tags are not read. Install it with "
+                  "'python -m pip install mutagen'.")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+
+        self._cache: Dict[str, Tuple[int, int, list]] = {}
+        self._unsaved = 0
+        self._unsaved_since = None
+        self._lock = threading.Lock()
+        # Held while the cache file is written, so flushes from several threads do not write the same temporary file
+        self._flush_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.cache_filepath is None:
+            return
+
+        try:
+            with open(self.cache_filepath, encoding="utf8") as cache_file:
+                self._cache = {path: tuple(entry) for path, entry in json.load(cache_file).items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError):
+            print("Metadata cache is corrupted and is rebuilt.")
+
+    def flush(self):
+        """
+        Write new cache entries to the cache file. This method is thread safe.
+        """
+
+        with self._flush_lock:
+            with self._lock:
+                if self.cache_filepath is None or not self._unsaved:
+                    return
+                content = json.dumps(self._cache, ensure_ascii=False)
+                self._unsaved = 0
+                self._unsaved_since = None
+
+            write_atomic(self.cache_filepath, content)
+
+    def get(self, track_path: str) -> TrackMetadata:
+        """
+        Get the metadata of a track.
+
+        :param track_path: Path to the track file
+        :return: The metadata from tags if available, otherwise from the path
+        """
+
+        if not self.use_tags:
+            return metadata_from_path(track_path)
+
+        try:
+            stat = os.stat(track_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            # The file is not accessible, e.g. a stream or a removed file
+            return metadata_from_path(track_path)
+
+        with self._lock:
+            entry = self._cache.get(track_path)
+        if entry is not None and (entry[0], entry[1]) == signature:
+            self.hits += 1
+            # Entries added before a streak of hits are written when they have waited long enough
+            unsaved_since = self._unsaved_since
+            if unsaved_since is not None and self.clock() - unsaved_since >= self.flush_interval:
+                self._try_flush()
+            return TrackMetadata.from_list(entry[2])
+
+        self.misses += 1
+        metadata = read_tags(track_path) or metadata_from_path(track_path)
+
+        with self._lock:
+            self._cache[track_path] = (signature[0], signature[1], metadata.to_list())
+            self._unsaved += 1
+            if self._unsaved_since is None:
+                self._unsaved_since = self.clock()
+            should_flush = self._unsaved >= self.flush_every or \
+                self.clock() - self._unsaved_since >= self.flush_interval
+
+        if should_flush:
+            self._try_flush()
+
+        return metadata
+
+    def _try_flush(self):
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Could not write metadata cache: {e}")
@@ -0,0 +1,366 @@
+"""
+Monitor several Winamp clients at once. Use MultiMonitor to find every open Winamp window and keep a separate
+rich presence for each, sampling the players on a bounded pool of worker threads.
+
+Run this module as a script to monitor every Winamp client with settings from settings.json. Per instance settings
+are given in list 'instances' of settings.json, in the order the Winamp windows are found.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional
+)
+
+from events import PlayerWatcher, PlayerEvent, Paused, Stopped, Seeked
+from payload import PayloadBuilder
+from presence_scheduler import PresenceScheduler
+from winamp import Winamp, WinampTransport, Win32Transport
+
+
+class InstanceMonitor:
+    """
+    Keep the rich presence of one Winamp client up to date. The monitor does the same as the main loop in main.py, but
+    is driven by MultiMonitor instead of running its own loop.
+    """
+
+    def __init__(self,
+                 winamp: Winamp,
+                 presence,
+                 payload_builder: PayloadBuilder,
+                 poll_interval: float = 1.0,
+                 idle_poll_interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 scheduler=None
+                 ):
+        """
+        :param winamp: Controller connected to the Winamp client
+        :param presence: Presence client or PresenceScheduler of this instance
+        :param payload_builder: Payload builder with the asset configuration of this instance
+        :param poll_interval: Time in seconds between samples while a track is playing
+        :param idle_poll_interval: Time in seconds between samples while paused or stopped
+        :param clock: Monotonic clock function returning seconds
+        :param scheduler: Optional poll_scheduler.PollScheduler of this instance. If given, the poll intervals are
+        chosen by it.
+        """
+        self.winamp = winamp
+        self.presence = presence
+        self.payload_builder = payload_builder
+        self.watcher = PlayerWatcher(winamp, poll_interval, idle_poll_interval, clock=clock, scheduler=scheduler)
+        self.watcher.subscribe(self._on_player_event)
+
+        self.previous_track = ""
+        self.current_payload = None
+        self.cleared = False
+
+    @property
+    def next_interval(self) -> float:
+        """
+        Time in seconds until the player should be sampled again. Read this once after each sample.
+        """
+        return self.watcher.next_interval()
+
+    def check(self) -> List[PlayerEvent]:
+        """
+        Sample the player once and update the presence if needed.
+
+        :return: Events dispatched by the sample
+        """
+        return self.watcher.check()
+
+    def close(self):
+        """
+        Stop updating the presence, e.g. when the Winamp client has been closed. A PresenceScheduler given as the
+        presence is stopped, and the presence client is cleared and closed, so Discord does not keep showing the
+        closed client.
+        """
+
+        client = self.presence
+        if isinstance(client, PresenceScheduler):
+            client.stop()
+            client = client.presence
+        self.winamp.disconnect()
+        if client is None:
+            return
+
+        try:
+            client.clear()
+            client.close()
+        except Exception as e:
+            print(f"Could not clear Discord presence: {e}")
+
+    def _on_player_event(self, event: PlayerEvent):
+        if isinstance(event, (Paused, Stopped)):
+            if not self.cleared:
+                self.presence.clear()
+                self.previous_track = ""
+                self.cleared = True
+        elif isinstance(event, Seeked):
+            if self.current_payload is not None and not self.cleared:
+                self.current_payload = dict(self.current_payload, start=int(time.time() - event.position / 1000))
+                self.presence.update(**self.current_payload)
+        elif event.title != self.previous_track:
+            self.previous_track = event.title
+            track_pos = self.watcher.snapshot.playlist_position
+
+            self.current_payload = self.payload_builder.build(event.title, track_pos, event.position or 0, time.time())
+            self.presence.update(**self.current_payload)
+            self.cleared = False
+
+
+class MultiMonitor:
+    """
+    Find every Winamp window and run an InstanceMonitor for each. Monitors are sampled on a bounded thread pool when
+    their next sample is due, so paused and stopped players use only a fraction of the sampling capacity. The windows
+    are enumerated again periodically to pick up started and closed Winamp clients.
+    """
+
+    def __init__(self,
+                 monitor_factory: Callable[[Winamp, int], InstanceMonitor],
+                 transport: Optional[WinampTransport] = None,
+                 max_workers: int = 4,
+                 discovery_interval: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param monitor_factory: Function creating a monitor for a connected controller. The second argument is the
+        slot of the instance: the lowest index not taken by another monitored window. A restarted Winamp client gets
+        the slot of the client it replaces, unless a client started in the meantime has taken it.
+        :param transport: Transport used to find and communicate with Winamp windows. Defaults to Win32Transport.
+        :param max_workers: Maximum number of players sampled at the same time
+        :param discovery_interval: Time in seconds between enumerating the Winamp windows
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.monitor_factory = monitor_factory
+        self.transport = transport if transport is not None else Win32Transport()
+        self.discovery_interval = discovery_interval
+        self.clock = clock
+        self.monitors: Dict[int, InstanceMonitor] = {}
+        self.slots: Dict[int, int] = {}
+        """
+        Slot of each monitored window by its handle.
+        """
+        self.samples = 0
+        """
+        Total number of samples taken from all players.
+        """
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MultiMonitor")
+        self._lock = threading.Lock()
+        self._due: List = []
+        self._running_checks = set()
+        self._starting = set()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._next_discovery = None
+
+    def discover(self):
+        """
+        Enumerate the Winamp windows, start monitoring new ones and stop monitoring closed ones. The monitors are
+        created without holding the lock, so a factory blocking e.g. on connecting to Discord does not delay sampling
+        the other players.
+        """
+
+        found = self.transport.find_windows()
+        windows = set(found)
+        now = self.clock()
+        with self._lock:
+            closed = [self.monitors.pop(window_id) for window_id in list(self.monitors) if window_id not in windows]
+            for window_id in list(self.slots):
+                if window_id not in self.monitors and window_id not in self._starting:
+                    del self.slots[window_id]
+
+            # Reserve the slots of new windows, so a concurrent discovery does not start them again
+            started = []
+            for window_id in found:
+                if window_id in self.monitors or window_id in self._starting:
+                    continue
+                used_slots = set(self.slots.values())
+                slot = next(slot for slot in range(len(used_slots) + 1) if slot not in used_slots)
+                self.slots[window_id] = slot
+                self._starting.add(window_id)
+                started.append((window_id, slot))
+
+        for monitor in closed:
+            monitor.close()
+
+        for window_id, slot in started:
+            try:
+                winamp = Winamp(self.transport, window_id)
+                monitor = self.monitor_factory(winamp, slot)
+            except Exception as e:
+                print(f"Could not start monitoring Winamp window {window_id}: {e}")
+                monitor = None
+
+            with self._lock:
+                self._starting.discard(window_id)
+                if monitor is None:
+                    del self.slots[window_id]
+                    continue
+                self.monitors[window_id] = monitor
+                heapq.heappush(self._due, (self.clock(), window_id))
+            self._wake.set()
+
+        self._next_discovery = now + self.discovery_interval
+
+    def notify(self, window_id: int):
+        """
+        Sample a player as soon as possible, e.g. when its window title changes. This method is thread safe.
+
+        :param window_id: Handle of the Winamp window
+        """
+
+        with self._lock:
+            if window_id in self.monitors:
+                heapq.heappush(self._due, (self.clock(), window_id))
+        self._wake.set()
+
+    def _check(self, window_id: int, monitor: InstanceMonitor):
+        try:
+            monitor.check()
+        except Exception as e:
+            print(f"Could not sample Winamp window {window_id}: {e}")
+        finally:
+            with self._lock:
+                self.samples += 1
+                self._running_checks.discard(window_id)
+                if self.monitors.get(window_id) is monitor:
+                    heapq.heappush(self._due, (self.clock() + monitor.next_interval, window_id))
+            self._wake.set()
+
+    def run_due(self) -> Optional[float]:
+        """
+        Start sampling every player whose sample is due.
+
+        :return: Time in seconds until the next sample is due, or None if no player is monitored
+        """
+
+        now = self.clock()
+        if self._next_discovery is None or now >= self._next_discovery:
+            self.discover()
+
+        with self._lock:
+            while self._due and self._due[0][0] <= now:
+                _, window_id = heapq.heappop(self._due)
+                monitor = self.monitors.get(window_id)
+                # Skip windows that were closed and duplicates of samples already running or scheduled
+                if monitor is None or window_id in self._running_checks:
+                    continue
+                self._running_checks.add(window_id)
+                self._executor.submit(self._check, window_id, monitor)
+
+            # Drop stale duplicates of the same window, keeping the earliest entry for each
+            seen, due = set(), []
+            for item in sorted(self._due):
+                if item[1] not in seen and item[1] not in self._running_checks:
+                    seen.add(item[1])
+                    due.append(item)
+            self._due = due
+
+            next_due = self._due[0][0] if self._due else None
+
+        until_discovery = self._next_discovery - now
+        if next_due is None:
+            return until_discovery if not self._running_checks else None
+        return max(0.0, min(next_due - now, until_discovery))
+
+    def run(self):
+        """
+        Run the monitor loop in the current thread until stop() is called.
+        """
+
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            self._wake.clear()
+            timeout = self.run_due()
+            self._wake.wait(timeout if timeout is not None else self.discovery_interval)
+
+    def stop(self):
+        """
+        Stop a running monitor loop and the worker threads, and close every monitor. This method is thread safe.
+        """
+
+        self._stopped.set()
+        self._wake.set()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            monitors = list(self.monitors.values())
+            self.monitors.clear()
+            self.slots.clear()
+        for monitor in monitors:
+            monitor.close()
+
+
+def main():
+    from payload import DEFAULT_CLIENT_ID, load_settings, load_asset_resolver, load_metadata_provider
+    from playlist import PlaylistCache, default_playlist_path
+    from pypresence import Presence
+
+    main_path = os.path.dirname(__file__)
+    settings = load_settings(main_path)
+    instances = settings.get("instances", [])
+    # The metadata cache is shared by all instances, since they usually play from the same music library
+    metadata_provider = load_metadata_provider(main_path, settings)
+
+    def create_monitor(winamp: Winamp, slot: int) -> InstanceMonitor:
+        # Settings of an instance override the common settings
+        instance_settings = dict(settings, **(instances[slot] if slot < len(instances) else {}))
+        if instance_settings["client_id"] == "default":
+            instance_settings["client_id"] = DEFAULT_CLIENT_ID
+        rpc = Presence(instance_settings["client_id"], pipe=instance_settings.get("pipe", 0))
+        rpc.connect()
+        presence = PresenceScheduler(rpc, instance_settings["presence_updates_per_interval"],
+                                     instance_settings["presence_update_interval"])
+        presence.start()
+
+        playlist_cache = PlaylistCache(winamp, instance_settings.get("playlist_path") or default_playlist_path())
+        asset_resolver = load_asset_resolver(instance_settings.get("assets_directory") or main_path,
+                                             instance_settings)
+        payload_builder = PayloadBuilder(instance_settings, winamp.version, playlist_cache, asset_resolver,
+                                         metadata_provider=metadata_provider)
+        return InstanceMonitor(winamp, presence, payload_builder)
+
+    multi_monitor = MultiMonitor(create_monitor, max_workers=settings.get("max_workers", 4))
+    print("Status of every Winamp client is now being updated to Discord.")
+    print("To exit, simply press CTRL + C.")
+    try:
+        multi_monitor.run()
+    finally:
+        # Stopping the monitor clears and closes the presence of every instance
+        multi_monitor.stop()
+        if metadata_provider is not None:
+            metadata_provider.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Settings and rich presence payloads for WinampRPC. Use PayloadBuilder to turn the Winamp window title and track
+position into keyword arguments for Presence.update().
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from assets import AssetResolver
+from metadata import MetadataProvider, metadata_from_path
+from title_parser import parse_title
+
+DEFAULT_CLIENT_ID = "507484022675603456"
+"""
+Discord application ID used when client_id is set to 'default'.
+"""
+DEFAULT_SETTINGS = {"_comment": "Default_large_asset_text 'winamp version' shows your Winamp version and 'album name' "
+                                "the current playing album",
+                    "client_id": "default",
+                    "default_large_asset_key": "logo",
+                    "default_large_asset_text": "winamp version",
+                    "small_asset_key": "playbutton",
+                    "small_asset_text": "Playing",
+                    "custom_assets": False,
+                    "read_tags": True,
+                    "library_roots": [],
+                    "library_rescan_interval": 3600.0,
+                    "prefetch_tracks": 5,
+                    "presence_updates_per_interval": 5,
+                    "presence_update_interval": 20.0,
+                    "instrumentation": False,
+                    "metrics_directory": "",
+                    "metrics_interval": 60.0,
+                    "poll_wakeups_per_minute": 120,
+                    "profiling": False,
+                    "profile_directory": "",
+                    "profile_interval": 300.0,
+                    "history": False,
+                    "history_directory": "",
+                    "obs_text_file": "",
+                    "obs_text_format": "{artist} - {title}",
+                    "status_json_file": "",
+                    "status_socket_port": 0}
+
+
+def load_settings(main_path: str) -> Dict:
+    """
+    Load current settings to a dictionary. If settings file can't be found, make a new one with default settings.
+    Settings missing from an existing file are filled with default values.
+
+    :param main_path: Directory of settings.json
+    :return: The settings
+    """
+
+    settings_path = os.path.join(main_path, "settings.json")
+    try:
+        with open(settings_path) as settings_file:
+            settings = json.load(settings_file)
+    except FileNotFoundError:
+        settings = dict(DEFAULT_SETTINGS)
+        with open(settings_path, "w") as settings_file:
+            json.dump(settings, settings_file, indent=2)
+        print("Could not find settings.json. Made new settings file with default values.")
+
+    for key, value in DEFAULT_SETTINGS.items():
+        settings.setdefault(key, value)
+    if settings["client_id"] == "default":
+        settings["client_id"] = DEFAULT_CLIENT_ID
+
+    return settings
+
+
+def load_asset_resolver(main_path: str, settings: Dict) -> Optional[AssetResolver]:
+    """
+    Load files for album assets and album name exceptions if custom assets are enabled. The files are reloaded
+    automatically when they are changed, so new albums can be added without a restart.
+
+    :param main_path: Directory of album_covers.json and album_name_exceptions.txt
+    :param settings: The settings
+    :return: Asset resolver, or None if custom assets are disabled or album_covers.json could not be found
+    """
+
+    if not settings["custom_assets"]:
+        return None
+
+    asset_resolver = AssetResolver(os.path.join(main_path, "album_covers.json"),
+                                   os.path.join(main_path, "album_name_exceptions.txt"),
+                                   reserved_keys=(settings["default_large_asset_key"], settings["small_asset_key"]))
+    if not os.path.isfile(asset_resolver.exceptions_filepath):
+        print("Could not find album_name_exceptions.txt. Default (or possibly wrong) assets will be used for duplicate "
+              "album names.")
+    try:
+        for problem in asset_resolver.load():
+            print(problem)
+    except FileNotFoundError:
+        print("Could not find album_covers.json. Default assets will be used.")
+        return None
+    except ValueError as e:
+        print(f"Could not load album_covers.json, default assets will be used: {e}")
+        return None
+
+    return asset_resolver
+
+
+def load_metadata_provider(main_path: str, settings: Dict):
+    """
+    Create a metadata provider for album resolution if custom assets are enabled. Tags are read only if read_tags is
+    enabled, and the results are cached in metadata_cache.json. If library_roots are set, the music library is indexed
+    into library.sqlite3 in the background every library_rescan_interval seconds, and tracks are looked up from the
+    index first.
+
+    :param main_path: Directory of metadata_cache.json and library.sqlite3
+    :param settings: The settings
+    :return: MetadataProvider or library_index.LibraryIndex, or None if custom assets are disabled
+    """
+
+    if not settings["custom_assets"]:
+        return None
+
+    metadata_provider = MetadataProvider(os.path.join(main_path, "metadata_cache.json"), use_tags=settings["read_tags"])
+    if not settings["library_roots"]:
+        return metadata_provider
+
+    from library_index import LibraryIndex
+    library_index = LibraryIndex(os.path.join(main_path, "library.sqlite3"), settings["library_roots"],
+                                 use_tags=settings["read_tags"], fallback=metadata_provider)
+    library_index.start(settings["library_rescan_interval"])
+    return library_index
+
+
+class PayloadBuilder:
+    """
+    Build rich presence payloads for tracks playing in Winamp.
+    """
+
+    def __init__(self, settings: Dict, winamp_version: str, playlist_cache=None,
+                 asset_resolver: Optional[AssetResolver] = None, metrics=None,
+                 metadata_provider=None):
+        """
+        :param settings: The settings
+        :param winamp_version: Version of the connected Winamp
+        :param playlist_cache: PlaylistCache used to find track paths. Required if asset_resolver is given.
+        :param asset_resolver: Resolver for album assets, or None if custom assets are not used
+        :param metrics: Optional instrumentation.Metrics object recording the latency of album art lookups
+        :param metadata_provider: MetadataProvider or library_index.LibraryIndex reading album names from track tags. If
+        None, album names are guessed from the directory structure.
+        """
+        self.metrics = metrics
+        self.winamp_version = winamp_version
+        self.playlist_cache = playlist_cache
+        self.asset_resolver = asset_resolver
+        self.metadata_provider = metadata_provider
+        self.default_large_key = settings["default_large_asset_key"]
+        self.default_large_text = settings["default_large_asset_text"]
+        self.small_asset_key = settings["small_asset_key"]
+        self.small_asset_text = settings["small_asset_text"]
+        self.album_art_errors = 0
+        """
+        Number of payloads built with the default asset because the album of the track could not be found.
+        """
+
+    def build(self, trackinfo_raw: str, track_pos: Optional[int], position: int, now: float,
+              album_art: Optional[Tuple[str, str]] = None) -> Dict:
+        """
+        Build a payload for a track.
+
+        :param trackinfo_raw: Winamp window title in format {tracknum}. {artist} - {track title} - Winamp
+        :param track_pos: Track position in the playlist, starting from 0. If None, the track number in the title is
+        used instead.
+        :param position: Current position in the track in milliseconds. Bogus positions reported when a track starts
+        must be filtered out before, e.g. with PlaybackTimeline.
+        :param now: Current UNIX time in seconds
+        :param album_art: Large asset key and text resolved beforehand, e.g. by PayloadPrefetcher. If None, they are
+        resolved now.
+        :return: Keyword arguments for Presence.update()
+        """
+
+        parsed = parse_title(trackinfo_raw)
+        if track_pos is None:
+            track_pos = parsed.playlist_position
+        artist, track_name = parsed.artist, parsed.title
+        if len(track_name) < 2:
+            track_name = f"Track: {track_name}"
+        start = now - position / 1000
+
+        # If custom assets are used, get the asset key and text from album_covers.json
+        if album_art is not None:
+            large_asset_key, large_asset_text = album_art
+        elif self.asset_resolver is not None and track_pos is not None:
+            try:
+                if self.metrics is not None:
+                    with self.metrics.measure("get_album_art"):
+                        large_asset_key, large_asset_text = self.get_album_art(track_pos, artist or "")
+                else:
+                    large_asset_key, large_asset_text = self.get_album_art(track_pos, artist or "")
+            except ConnectionError:
+                # A lost Winamp connection is handled by the caller
+                raise
+            except (IndexError, OSError) as e:
+                # E.g. the playlist dump lags behind a changed playlist, or the track file cannot be read
+                print(f"Could not find the album of track {track_pos + 1}, using the default asset: {e}")
+                self.album_art_errors += 1
+                # The album name is not known, so the Winamp version is shown instead of it
+                large_asset_key = self.default_large_key
+                large_asset_text = self._default_large_text("") or f"Winamp v{self.winamp_version}"
+        else:
+            large_asset_key = "logo"
+            large_asset_text = f"Winamp v{self.winamp_version}"
+
+        # pypresence leaves out fields that are None, so tracks without an artist only show the track name
+        return dict(details=track_name, state=f"by {artist}" if artist else None, start=int(start),
+                    large_image=large_asset_key, small_image=self.small_asset_key, large_text=large_asset_text,
+                    small_text=self.small_asset_text)
+
+    def get_album_art(self, track_position: int, artist: str) -> Tuple[str, str]:
+        """
+        Get the path of current track from Winamp and find the album name for it. The path is read directly from
+        Winamp's memory if possible. Otherwise the playlist is dumped into
+        C:\\Users\\username\\Appdata\\Roaming\\Winamp\\Winamp.m3u8 only when it has changed. If album has
+        corresponding album name with key in file album_covers.json, return the asset key and album name. Otherwise
+        return default asset key and text. The album name and artist are read from the track tags if a metadata
+        provider is set. Otherwise, or if the track has no tags, this function assumes the music directory structure
+        is like artist\\album\\tracks. If the folder structure is something else, the album_name variable may not be
+        the album name and you need to check these manually.
+        This function is used only if custom_assets is set to True and album_covers.json is found.
+
+        :param track_position: Current track's position in the playlist, starting from 0
+        :param artist: Current track's artist. This is needed in case album name is in exceptions i.e. there are
+        multiple albums with same name. The album artist or artist from tags is preferred if available.
+        :return: Album asset key and album name. Asset key in api must be exactly same as this key.
+        """
+
+        track_path = self.playlist_cache.get_path(track_position)
+        if self.metadata_provider is not None:
+            metadata = self.metadata_provider.get(track_path)
+        else:
+            metadata = metadata_from_path(track_path)
+
+        album_name = metadata.album or ""
+        if metadata.source == "tags":
+            artist = metadata.album_artist or metadata.artist or artist
+
+        large_asset_text = album_name
+        # If there are multiple albums with same name, and they are added into exceptions file, 'Artist - Album' is
+        # used instead
+        large_asset_key = self.asset_resolver.resolve(album_name, artist)
+        if large_asset_key is None:
+            # Could not find asset key for album cover. Use default asset and asset text instead
+            large_asset_key = self.default_large_key
+            large_asset_text = self._default_large_text(album_name)
+
+        if len(large_asset_text) < 2:
+            large_asset_text = f"Album: {large_asset_text}"
+
+        return large_asset_key, large_asset_text
+
+    def _default_large_text(self, album_name: str) -> str:
+        if self.default_large_text == "winamp version":
+            return f"Winamp v{self.winamp_version}"
+        if self.default_large_text == "album name":
+            return album_name
+        return self.default_large_text
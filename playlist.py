@@ -0,0 +1,263 @@
+"""
+Playlist helpers for Winamp. Use PlaylistCache to look up track paths from the dumped Winamp playlist without dumping
+and parsing the whole playlist on every track change.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import threading
+from array import array
+from typing import (
+    Optional,
+    Tuple
+)
+
+from title_parser import parse_title
+from winamp import PlaylistEntry, parse_extinf
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def default_playlist_path() -> str:
+    """
+    Get the path where Winamp dumps its current playlist by default.
+
+    :return: Path to Winamp.m3u8 in the Winamp application data directory
+    """
+
+    return os.path.join(os.getenv("APPDATA", ""), "Winamp", "Winamp.m3u8")
+
+
+class PlaylistCache:
+    """
+    A cache for the dumped Winamp playlist. The playlist is dumped again when the playlist length reported by Winamp
+    changes or a cheap check finds that the cached entries no longer match Winamp's playlist, and the dump file is
+    indexed again only when its size or modification time changes.
+
+    Instead of keeping all paths in memory, the cache keeps byte offsets of the entry lines and their #EXTINF lines in
+    the dump file. Looking up a track path is a seek and a single line read regardless of the playlist size.
+
+    Replacing or reordering the playlist does not necessarily change its length. If Winamp's memory can be read, the
+    paths of the first, the last and the current entry are compared to the cached ones. Otherwise the title of the
+    current entry is compared to the window text, which misses changes that keep the current entry in its place. Call
+    invalidate() to force a new dump if the playlist is known to have changed.
+
+    If the transport can read Winamp's memory, entries are read directly from Winamp one at a time instead, and the
+    playlist is never dumped. The dump is used as a fallback if reading the memory fails.
+
+    The cache can be used from several threads. Dumping, indexing and reading the dump are serialized by the cache,
+    and reading entries from Winamp's memory by the Winamp controller.
+    """
+
+    def __init__(self, winamp, playlist_filepath: Optional[str] = None, use_ipc: bool = True):
+        """
+        :param winamp: Winamp controller used to query the playlist length and dump the playlist
+        :param playlist_filepath: Path to the dumped playlist file. Defaults to Winamp.m3u8 in the Winamp application
+        data directory.
+        :param use_ipc: If True, entries are read directly from Winamp's memory when possible
+        """
+        self.winamp = winamp
+        self.playlist_filepath = playlist_filepath or default_playlist_path()
+        self.use_ipc = use_ipc
+        """
+        True while entries are read directly from Winamp. Set to False when reading fails.
+        """
+        self.dumps = 0
+        """
+        Number of times the playlist has been dumped by this cache.
+        """
+        self.reindexes = 0
+        """
+        Number of times the dump file has been indexed by this cache.
+        """
+
+        self._playlist_length = None
+        self._file_signature = None
+        self._checked_title = None
+        self._probe_memory = True
+        self._lock = threading.RLock()
+        self._offsets = array("q")
+        self._extinf_offsets = array("q")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def invalidate(self):
+        """
+        Force a playlist dump on next lookup.
+        """
+        with self._lock:
+            self._playlist_length = None
+            self._checked_title = None
+
+    def _stat_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.playlist_filepath)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """
+        Dump and index the playlist if it has changed since the previous refresh.
+
+        :return: True if the playlist was indexed again, False if the cached index is still valid
+        """
+
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        playlist_length = self.winamp.get_playlist_length()
+        if playlist_length != self._playlist_length or self._is_stale():
+            self.winamp.dump_playlist()
+            self.dumps += 1
+            self._playlist_length = playlist_length
+
+        signature = self._stat_signature()
+        if signature == self._file_signature:
+            return False
+
+        self._offsets, self._extinf_offsets = self._build_index()
+        self._file_signature = signature
+        self.reindexes += 1
+        return True
+
+    def _is_stale(self) -> bool:
+        # Check whether the playlist has changed without changing its length, see the class docstring
+        if not self._offsets:
+            return False
+
+        position = self.winamp.get_playlist_position()
+        if position is not None and position >= len(self._offsets):
+            return True
+
+        if self._probe_memory:
+            try:
+                return any(self.winamp.get_playlist_file(index) != self._read_line(self._offsets[index])
+                           for index in sorted({0, len(self._offsets) - 1, position} - {None}))
+            except IndexError:
+                return True
+            except (NotImplementedError, OSError):
+                self._probe_memory = False
+
+        if position is None:
+            return False
+        parsed = parse_title(self.winamp.get_track_title())
+        shown = (position, parsed.title if parsed.artist is None else f"{parsed.artist} - {parsed.title}")
+        # A title that was checked once is not checked again, so a track that is no longer in the playlist does not
+        # cause a dump on every lookup
+        if shown == self._checked_title:
+            return False
+        self._checked_title = shown
+
+        extinf_offset = self._extinf_offsets[position]
+        if extinf_offset < 0:
+            return False
+        return parse_extinf(self._read_line(extinf_offset))[1] not in (None, shown[1])
+
+    def _read_line(self, offset: int) -> str:
+        with open(self.playlist_filepath, "rb") as playlist_file:
+            playlist_file.seek(offset)
+            return playlist_file.readline().decode("utf-8").rstrip("\r\n")
+
+    def _build_index(self) -> Tuple[array, array]:
+        offsets = array("q")
+        # Offset of the #EXTINF line preceding each entry, or -1 if there is none
+        extinf_offsets = array("q")
+        extinf_offset = -1
+        offset = 0
+
+        with open(self.playlist_filepath, "rb") as playlist_file:
+            for line in playlist_file:
+                stripped = line[len(UTF8_BOM):] if offset == 0 and line.startswith(UTF8_BOM) else line
+                if stripped.startswith(b"#EXTINF:"):
+                    extinf_offset = offset + len(line) - len(stripped)
+                elif stripped.strip() and not stripped.startswith(b"#"):
+                    offsets.append(offset + len(line) - len(stripped))
+                    extinf_offsets.append(extinf_offset)
+                    extinf_offset = -1
+                offset += len(line)
+
+        return offsets, extinf_offsets
+
+    def get_path(self, track_position: int) -> str:
+        """
+        Get the path of a track in the current playlist.
+
+        :param track_position: Track position in the playlist, starting from 0
+        :return: Absolute path to the track as written in the playlist dump
+        :raises IndexError: If the position is not in the playlist
+        """
+
+        if track_position < 0:
+            raise IndexError(f"Playlist has no entry at position {track_position}")
+
+        if self.use_ipc:
+            try:
+                return self.winamp.get_playlist_file(track_position)
+            except (NotImplementedError, OSError):
+                self.use_ipc = False
+
+        with self._lock:
+            self._refresh()
+            return self._read_line(self._offsets[track_position])
+
+    def get_entry(self, track_position: int, from_dump: bool = False) -> PlaylistEntry:
+        """
+        Get a track in the current playlist with its duration and title from the #EXTINF line.
+
+        :param track_position: Track position in the playlist, starting from 0
+        :param from_dump: If True, the entry is read from the playlist dump even if Winamp's memory can be read
+        :return: The playlist entry. Duration is -1 and title None if the entry has no #EXTINF line. Duration is
+        always -1 if the entry was read directly from Winamp.
+        :raises IndexError: If the position is not in the playlist
+        """
+
+        if track_position < 0:
+            raise IndexError(f"Playlist has no entry at position {track_position}")
+
+        if self.use_ipc and not from_dump:
+            try:
+                return self.winamp.get_playlist_entry(track_position)
+            except (NotImplementedError, OSError):
+                self.use_ipc = False
+
+        with self._lock:
+            self._refresh()
+            offset = self._offsets[track_position]
+            extinf_offset = self._extinf_offsets[track_position]
+
+            with open(self.playlist_filepath, "rb") as playlist_file:
+                duration, title = -1, None
+                if extinf_offset >= 0:
+                    playlist_file.seek(extinf_offset)
+                    duration, title = parse_extinf(playlist_file.readline().decode("utf-8").rstrip("\r\n"))
+                playlist_file.seek(offset)
+                path = playlist_file.readline().decode("utf-8").rstrip("\r\n")
+
+        return PlaylistEntry(path, duration, title)
@@ -0,0 +1,435 @@
+"""
+Search for tracks in the Winamp playlist. Use PlaylistIndex to find tracks by words in their titles and paths, with
+typos and partial words allowed, and to start playing the best match.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import math
+import ntpath
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple
+)
+
+from playlist import PlaylistCache
+from winamp import MenuCommand, PlaylistEntry, Winamp
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+PATH_COMPONENTS = 3
+"""
+Number of trailing path components indexed, i.e. artist, album and file name in an artist\\album\\track structure.
+Components above them, like the music directory, are the same for most tracks and would only slow down searching.
+"""
+MIN_PREFIX_LENGTH = 2
+"""
+Minimum length of a query word that matches the words starting with it. A single digit would match most numbers.
+"""
+MAX_CACHED_EXPANSIONS = 1024
+CANDIDATE_LOOKUP_COST = 16
+"""
+Relative cost of looking up a candidate in postings with a binary search compared to walking one posting.
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase words without accents.
+
+    :param text: Title, path or query
+    :return: The words
+    """
+
+    text = text.casefold()
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char))
+
+    return TOKEN_PATTERN.findall(text)
+
+
+def trigrams(token: str) -> List[str]:
+    """
+    :return: Unique three character substrings of a word padded with spaces, so the start and the end of the word and
+    two character words have trigrams too
+    """
+
+    padded = f" {token} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def entry_tokens(entry: PlaylistEntry) -> List[str]:
+    """
+    :return: Unique words of the title and the last path components of a playlist entry
+    """
+
+    components = ntpath.splitext(entry.path)[0].replace("/", "\\").rsplit("\\", PATH_COMPONENTS)[-PATH_COMPONENTS:]
+    components.append(entry.title or "")
+
+    return list(dict.fromkeys(tokenize(" ".join(components))))
+
+
+class TrackMatch:
+    """
+    A track found by PlaylistIndex.find_tracks().
+    """
+
+    __slots__ = ("position", "score", "path", "title")
+
+    def __init__(self, position: int, score: float, path: str, title: Optional[str]):
+        """
+        :param position: Position of the track in the playlist, starting from 0
+        :param score: Relevance of the match. Higher is better.
+        :param path: Path to the track
+        :param title: Title of the track in the playlist, or None if it is not known
+        """
+        self.position = position
+        self.score = score
+        self.path = path
+        self.title = title
+
+    def __repr__(self) -> str:
+        return f"TrackMatch(position={self.position}, score={self.score:.3f}, title={self.title!r})"
+
+
+class PlaylistIndex:
+    """
+    An inverted index of the words in the titles and paths of the dumped playlist. Each word has a sorted array of the
+    playlist positions it appears in, and each trigram of a word has the IDs of the words containing it, so words
+    with typos or missing letters are found without scanning the playlist.
+
+    The index is brought up to date before each search. The playlist is dumped again only if PlaylistCache finds it
+    changed, and if only the end of the playlist has changed, e.g. tracks were appended, only the changed entries are
+    indexed. PlaylistCache checks only a few entries, so before playing a match, play_match() compares the matched path
+    to the one Winamp has at that position, and searches again from a new dump if they differ.
+    """
+
+    def __init__(self, winamp: Winamp, playlist_cache: Optional[PlaylistCache] = None, min_similarity: float = 0.5):
+        """
+        :param winamp: Controller of the Winamp whose playlist is searched
+        :param playlist_cache: Cache used to dump the playlist. A new one is created by default.
+        :param min_similarity: Minimum trigram similarity between 0 and 1 for a word to match a misspelled query word
+        """
+        self.winamp = winamp
+        self.playlist_cache = playlist_cache if playlist_cache is not None else PlaylistCache(winamp)
+        self.min_similarity = min_similarity
+        self.rebuilds = 0
+        """
+        Number of times the whole playlist has been indexed.
+        """
+        self.indexed_entries = 0
+        """
+        Total number of entries indexed, including entries indexed again after the playlist changed.
+        """
+
+        self._built = False
+        self._entry_keys: List[int] = []
+        self._words: Dict[str, int] = {}
+        self._word_list: List[str] = []
+        self._postings: List[array] = []
+        self._trigrams: Dict[str, array] = {}
+        self._trigram_counts = array("H")
+        self._sorted_words: Optional[List[str]] = None
+        self._expansions: Dict[str, List[Tuple[int, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entry_keys)
+
+    def _word_id(self, word: str) -> int:
+        word_id = self._words.get(word)
+        if word_id is not None:
+            return word_id
+
+        word_id = self._words[word] = len(self._word_list)
+        self._word_list.append(word)
+        self._postings.append(array("I"))
+        word_trigrams = trigrams(word)
+        for trigram in word_trigrams:
+            ids = self._trigrams.get(trigram)
+            if ids is None:
+                ids = self._trigrams[trigram] = array("I")
+            ids.append(word_id)
+        self._trigram_counts.append(len(word_trigrams))
+        self._sorted_words = None
+        self._expansions.clear()
+
+        return word_id
+
+    def _truncate(self, length: int):
+        """
+        Remove entries from the position length onwards. The postings are sorted, so each is cut at one point.
+        """
+
+        if length >= len(self._entry_keys):
+            return
+        del self._entry_keys[length:]
+        for postings in self._postings:
+            if postings and postings[-1] >= length:
+                del postings[bisect_left(postings, length):]
+
+    def _add(self, entries: Iterable[PlaylistEntry], start: int):
+        position = start
+        for entry in entries:
+            self._entry_keys.append(hash((entry.path, entry.title)))
+            for word in entry_tokens(entry):
+                self._postings[self._word_id(word)].append(position)
+            position += 1
+            self.indexed_entries += 1
+
+    def update(self) -> bool:
+        """
+        Bring the index up to date with the playlist.
+
+        :return: True if the index changed
+        """
+
+        if not self.playlist_cache.refresh() and self._built:
+            return False
+        self._built = True
+
+        entries = Winamp.iter_playlist(self.playlist_cache.playlist_filepath)
+        # Keep the entries that are unchanged from the start of the playlist, and index the rest
+        unchanged = 0
+        pending = None
+        for entry in entries:
+            if unchanged < len(self._entry_keys) and self._entry_keys[unchanged] == hash((entry.path, entry.title)):
+                unchanged += 1
+                continue
+            pending = entry
+            break
+
+        if unchanged == 0 and pending is not None:
+            self.rebuilds += 1
+        self._truncate(unchanged)
+        if pending is not None:
+            self._add([pending], unchanged)
+            self._add(entries, unchanged + 1)
+
+        return True
+
+    def _prefix_words(self, prefix: str) -> List[str]:
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._word_list)
+        words = self._sorted_words
+        matches = []
+        for index in range(bisect_left(words, prefix), len(words)):
+            if not words[index].startswith(prefix):
+                break
+            matches.append(words[index])
+
+        return matches
+
+    def _expand(self, query_word: str) -> List[Tuple[int, float]]:
+        """
+        Find the indexed words matching a query word: the word itself, words starting with it, and words whose
+        trigrams are similar enough.
+
+        :return: Word IDs and their similarity to the query word between 0 and 1
+        """
+
+        expansion = self._expansions.get(query_word)
+        if expansion is not None:
+            return expansion
+
+        similarities: Dict[int, float] = {}
+        word_id = self._words.get(query_word)
+        if word_id is not None:
+            similarities[word_id] = 1.0
+        if len(query_word) >= MIN_PREFIX_LENGTH:
+            for word in self._prefix_words(query_word):
+                word_id = self._words[word]
+                similarities.setdefault(word_id, 0.9 * len(query_word) / len(word) + 0.1)
+
+        query_trigrams = trigrams(query_word)
+        if len(query_word) >= 3:
+            shared: Dict[int, int] = {}
+            for trigram in query_trigrams:
+                for word_id in self._trigrams.get(trigram, ()):
+                    shared[word_id] = shared.get(word_id, 0) + 1
+            query_count = len(query_trigrams)
+            counts = self._trigram_counts
+            for word_id, count in shared.items():
+                # Dice coefficient of the trigram sets
+                similarity = 2 * count / (query_count + counts[word_id])
+                if similarity >= self.min_similarity and similarity * 0.8 > similarities.get(word_id, 0.0):
+                    similarities[word_id] = similarity * 0.8
+
+        if len(self._expansions) >= MAX_CACHED_EXPANSIONS:
+            self._expansions.clear()
+        expansion = self._expansions[query_word] = list(similarities.items())
+        return expansion
+
+    @staticmethod
+    def _score(weighted_postings: List[Tuple[array, float]],
+               candidates: Optional[Dict[int, float]]) -> Dict[int, float]:
+        """
+        Score entries by the best weight of the postings they appear in.
+
+        :param weighted_postings: Postings of the words matching a query word and their weights
+        :param candidates: If given, only these entries are scored
+        :return: Scores by playlist position
+        """
+
+        scores: Dict[int, float] = {}
+        for postings, weight in weighted_postings:
+            if candidates is None:
+                positions = postings
+            elif len(postings) <= len(candidates) * CANDIDATE_LOOKUP_COST:
+                positions = [position for position in postings if position in candidates]
+            else:
+                # A common word is checked against the few candidates instead of walking its postings
+                positions = []
+                for position in candidates:
+                    index = bisect_left(postings, position)
+                    if index < len(postings) and postings[index] == position:
+                        positions.append(position)
+            for position in positions:
+                if weight > scores.get(position, 0.0):
+                    scores[position] = weight
+
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        Search the index without updating it.
+
+        :param query: Words to search for
+        :param limit: Maximum number of results
+        :return: Playlist positions and scores of the best matches, best first
+        """
+
+        query_words = list(dict.fromkeys(tokenize(query)))
+        entry_count = len(self._entry_keys)
+        matching_words = []
+        for query_word in query_words:
+            weighted_postings = []
+            for word_id, similarity in self._expand(query_word):
+                postings = self._postings[word_id]
+                if postings:
+                    # Rare words tell more about the track than common ones
+                    weighted_postings.append((postings, similarity * math.log(1 + entry_count / len(postings))))
+            # Query words that match nothing, e.g. typos too far from any word, are ignored
+            if weighted_postings:
+                matching_words.append(weighted_postings)
+        if not matching_words:
+            return []
+
+        # Tracks must match every query word. The intersection starts from the query word matching the fewest tracks,
+        # so the words matching most of the playlist are only checked against a few candidates.
+        matching_words.sort(key=lambda weighted_postings: sum(len(postings) for postings, _ in weighted_postings))
+        totals = self._score(matching_words[0], None)
+        for weighted_postings in matching_words[1:]:
+            scores = self._score(weighted_postings, totals)
+            totals = {position: total + scores[position] for position, total in totals.items() if position in scores}
+            if not totals:
+                break
+
+        if not totals:
+            # No track matches every word, so the tracks matching the most valuable words are ranked first
+            for weighted_postings in matching_words:
+                for position, score in self._score(weighted_postings, None).items():
+                    totals[position] = totals.get(position, 0.0) + score
+
+        best = heapq.nlargest(limit, ((total, -position) for position, total in totals.items()))
+        return [(-negative_position, total) for total, negative_position in best]
+
+    def find_tracks(self, query: str, limit: int = 10) -> List[TrackMatch]:
+        """
+        Find tracks in the playlist by words in their titles and paths. Words may be misspelled or partial, and the
+        words of the query may be in any order.
+
+        :param query: Words to search for, e.g. 'beatles yesterday'
+        :param limit: Maximum number of results
+        :return: The best matches, best first
+        """
+
+        self.update()
+        matches = []
+        for position, score in self.search(query, limit):
+            # The dump is read instead of Winamp's memory, so the entries are the ones that were indexed
+            entry = self.playlist_cache.get_entry(position, from_dump=True)
+            matches.append(TrackMatch(position, score, entry.path, entry.title))
+
+        return matches
+
+    def play_match(self, query: str) -> Optional[TrackMatch]:
+        """
+        Start playing the best match of a query.
+
+        :param query: Words to search for
+        :return: The played track, or None if nothing matched
+        """
+
+        matches = self.find_tracks(query, 1)
+        if matches and self.playlist_cache.get_path(matches[0].position) != matches[0].path:
+            # The playlist changed without PlaylistCache noticing, e.g. two tracks in the middle were swapped
+            self.playlist_cache.invalidate()
+            matches = self.find_tracks(query, 1)
+        if not matches:
+            return None
+
+        self.winamp.change_track(matches[0].position)
+        self.winamp.send_command(MenuCommand.Play)
+        return matches[0]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the Winamp playlist and play the best match.")
+    parser.add_argument("query", nargs="+", help="Words to search for in track titles and paths")
+    parser.add_argument("--list", type=int, nargs="?", const=10, metavar="N",
+                        help="List the N best matches instead of playing, 10 by default")
+    args = parser.parse_args()
+
+    winamp = Winamp()
+    if not winamp.window_id:
+        print("Winamp is not running.")
+        return
+
+    index = PlaylistIndex(winamp)
+    query = " ".join(args.query)
+    if args.list:
+        for match in index.find_tracks(query, args.list):
+            print(f"{match.position + 1:6d}  {match.title or match.path}")
+        return
+
+    match = index.play_match(query)
+    if match is None:
+        print(f"No tracks found for '{query}'.")
+    else:
+        print(f"Playing {match.position + 1}. {match.title or match.path}")
+
+
+if __name__ == "__main__":
+    main()
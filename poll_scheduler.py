@@ -0,0 +1,182 @@
+"""
+Adaptive sampling intervals for PlayerWatcher. Use PollScheduler to sample the player often near the end of a track,
+where a track change is expected, and less and less often while the player is paused or stopped, within a budget of
+wake-ups per minute.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Optional
+)
+
+from presence_scheduler import TokenBucket
+from timeline import PlaybackTimeline
+from winamp import PlayingStatus
+
+
+class PollScheduler:
+    """
+    Choose the time until the next player sample from the player state:
+
+    - While a track is playing, the player is sampled every play_interval seconds, and every boundary_interval seconds
+      when the predicted end of the track is less than boundary_window seconds away.
+    - While paused or stopped, the interval starts from idle_interval and is multiplied by idle_multiplier after each
+      sample, up to max_idle_interval. It starts over when the status changes.
+
+    Every sample takes a token from a bucket refilled with wakeups_per_minute tokens per minute, and the interval is
+    extended while the bucket is empty, so fast sampling near track ends never exceeds the budget on average.
+    """
+
+    def __init__(self,
+                 play_interval: float = 1.0,
+                 boundary_interval: float = 0.1,
+                 boundary_window: float = 2.0,
+                 idle_interval: float = 1.0,
+                 max_idle_interval: float = 30.0,
+                 idle_multiplier: float = 2.0,
+                 wakeups_per_minute: float = 120.0,
+                 burst: float = 30.0,
+                 rate_window: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param play_interval: Time in seconds between samples while a track is playing
+        :param boundary_interval: Time in seconds between samples near the end of a track
+        :param boundary_window: Time in seconds before the predicted end of a track when fast sampling starts
+        :param idle_interval: Time in seconds until the first sample after the player is paused or stopped
+        :param max_idle_interval: Maximum time in seconds between samples while paused or stopped
+        :param idle_multiplier: Factor the idle interval grows by after each sample
+        :param wakeups_per_minute: Maximum average number of samples per minute
+        :param burst: Number of samples that can be taken faster than the budget allows, e.g. near a track end
+        :param rate_window: Time in seconds the achieved sampling rate is averaged over
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.play_interval = play_interval
+        self.boundary_interval = boundary_interval
+        self.boundary_window = boundary_window
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.idle_multiplier = idle_multiplier
+        self.rate_window = rate_window
+        self.clock = clock
+        self.budget = TokenBucket(burst, wakeups_per_minute / 60, clock)
+
+        self.samples = 0
+        self.budget_delays = 0
+        """
+        Number of intervals extended because the wake-up budget was used up.
+        """
+        self.last_interval = 0.0
+        self.metrics = None
+        """
+        Optional instrumentation.Metrics object. If set, the achieved sampling rate is recorded as a gauge.
+        """
+
+        self._status = None
+        self._idle_samples = 0
+        self._sample_times: Deque[float] = deque()
+        self._first_sample = None
+
+    @property
+    def achieved_rate(self) -> float:
+        """
+        Average number of samples per second during the latest rate_window seconds.
+        """
+
+        if not self._sample_times:
+            return 0.0
+        elapsed = min(self.rate_window, self.clock() - self._sample_times[0])
+        return len(self._sample_times) / max(elapsed, self.last_interval, 1.0)
+
+    @property
+    def average_rate(self) -> float:
+        """
+        Average number of samples per second since the first sample.
+        """
+
+        if self._first_sample is None:
+            return 0.0
+        return self.samples / max(self.clock() - self._first_sample, self.last_interval, 1.0)
+
+    def reset(self):
+        """
+        Forget the previous status, so the idle interval starts over.
+        """
+        self._status = None
+        self._idle_samples = 0
+
+    def next_interval(self, status: Optional[PlayingStatus], timeline: PlaybackTimeline) -> float:
+        """
+        Register a sample and choose the time until the next one. Call this once after each sample.
+
+        :param status: The sampled playing status
+        :param timeline: Timeline of the current track, used to predict the end of the track
+        :return: Time in seconds until the next sample
+        """
+
+        now = self.clock()
+        if self._first_sample is None:
+            self._first_sample = now
+        self.samples += 1
+        self._sample_times.append(now)
+        while self._sample_times and now - self._sample_times[0] > self.rate_window:
+            self._sample_times.popleft()
+        self.budget.try_acquire()
+
+        if status != self._status:
+            self._status = status
+            self._idle_samples = 0
+
+        if status == PlayingStatus.Playing:
+            interval = self.play_interval
+            position = timeline.predict(now)
+            # Streams and tracks of unknown length have no predictable end
+            if position is not None and timeline.length > 0:
+                remaining = (timeline.length - position) / 1000
+                if remaining <= self.boundary_window:
+                    interval = self.boundary_interval
+                else:
+                    # Wake up when the boundary window starts, not up to play_interval later
+                    interval = min(interval, max(self.boundary_interval, remaining - self.boundary_window))
+        else:
+            interval = min(self.max_idle_interval, self.idle_interval * self.idle_multiplier ** self._idle_samples)
+            self._idle_samples += 1
+
+        delay = self.budget.time_until_available()
+        if delay > interval:
+            interval = delay
+            self.budget_delays += 1
+
+        self.last_interval = interval
+        if self.metrics is not None:
+            self.metrics.set_gauge("poll_rate", self.achieved_rate)
+            self.metrics.set_gauge("poll_interval", interval)
+
+        return interval
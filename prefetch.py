@@ -0,0 +1,205 @@
+"""
+Background prefetching of presence payloads. Use PayloadPrefetcher in place of PayloadBuilder to resolve the album
+assets of the next tracks in the playlist before they start playing, so a track change only needs a cache lookup.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import ntpath
+import threading
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+
+from payload import PayloadBuilder
+from title_parser import parse_title
+
+CacheKey = Tuple[int, int, str, str]
+
+
+class PayloadPrefetcher:
+    """
+    Build presence payloads like PayloadBuilder, but resolve the album assets of the next tracks in the playlist in a
+    background thread. Resolved assets are kept in a bounded least recently used cache keyed by playlist position,
+    artist and track name, so a stale entry is never used for a different track even if the playlist has changed. The
+    key also has the reload count of the asset resolver, so assets resolved before album_covers.json or
+    album_name_exceptions.txt was changed are not used after the change.
+
+    When shuffle is on, the next track cannot be known, so nothing is prefetched. Assets of played tracks are still
+    cached, and a track that is not in the cache is resolved when it starts like without the prefetcher.
+    """
+
+    def __init__(self, payload_builder: PayloadBuilder, winamp, count: int = 5, cache_size: int = 64):
+        """
+        :param payload_builder: Builder used to build the payloads and to resolve the album assets
+        :param winamp: Winamp controller used to query the playlist length and shuffle status
+        :param count: Number of upcoming tracks to prefetch after each track change
+        :param cache_size: Maximum number of tracks in the cache
+        """
+        self.payload_builder = payload_builder
+        self.winamp = winamp
+        self.count = count
+        self.cache_size = max(cache_size, count + 1)
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+        self._cache: "OrderedDict[CacheKey, Tuple[str, str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._target: Optional[int] = None
+        self._thread = None
+
+    def _get_cached(self, key: CacheKey) -> Optional[Tuple[str, str]]:
+        with self._cache_lock:
+            album_art = self._cache.get(key)
+            if album_art is not None:
+                self._cache.move_to_end(key)
+            return album_art
+
+    def _store(self, key: CacheKey, album_art: Tuple[str, str]):
+        with self._cache_lock:
+            self._cache[key] = album_art
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def build(self, trackinfo_raw: str, track_pos: Optional[int], position: int, now: float) -> Dict:
+        """
+        Build a payload for a track and start prefetching the tracks after it. See PayloadBuilder.build().
+        """
+
+        builder = self.payload_builder
+        parsed = parse_title(trackinfo_raw)
+        if track_pos is None:
+            track_pos = parsed.playlist_position
+        if builder.asset_resolver is None or track_pos is None:
+            return builder.build(trackinfo_raw, track_pos, position, now)
+
+        # A reload is noticed on cache hits too, not only when an asset is resolved
+        builder.asset_resolver.reload_if_changed()
+        key = (builder.asset_resolver.reloads, track_pos, parsed.artist or "", parsed.title)
+        album_art = self._get_cached(key)
+        if album_art is not None:
+            self.hits += 1
+            payload = builder.build(trackinfo_raw, track_pos, position, now, album_art)
+        else:
+            self.misses += 1
+            album_art_errors = builder.album_art_errors
+            payload = builder.build(trackinfo_raw, track_pos, position, now)
+            # The default asset used after a failed lookup is not cached, so the track is looked up again next time
+            if builder.album_art_errors == album_art_errors:
+                self._store(key, (payload["large_image"], payload["large_text"]))
+
+        self.prefetch(track_pos)
+        return payload
+
+    def prefetch(self, track_pos: int):
+        """
+        Prefetch the tracks after a playlist position in the background. A newer request replaces a request that has
+        not been completed yet. This method is thread safe.
+
+        :param track_pos: Playlist position of the current track, starting from 0
+        """
+
+        self._target = track_pos
+        self._wake.set()
+
+    def prefetch_now(self, track_pos: int):
+        """
+        Prefetch the tracks after a playlist position in the current thread.
+
+        :param track_pos: Playlist position of the current track, starting from 0
+        """
+
+        if self.payload_builder.asset_resolver is None or self.winamp.get_shuffle():
+            return
+
+        playlist_length = self.winamp.get_playlist_length()
+        for offset in range(1, min(self.count, playlist_length - 1) + 1):
+            # A newer track change makes the rest of this round useless
+            if self._target is not None and self._target != track_pos:
+                return
+            self._prefetch_position((track_pos + offset) % playlist_length)
+
+    def _prefetch_position(self, track_pos: int):
+        builder = self.payload_builder
+        # The playlist cache and the metadata provider are thread safe, so the main thread can look up tracks while
+        # this runs
+        try:
+            entry = builder.playlist_cache.get_entry(track_pos)
+        except IndexError:
+            return
+
+        # Winamp shows the playlist title in its window, so the key matches the one built from the window text
+        title = entry.title or ntpath.basename(entry.path)
+        parsed = parse_title(f"{track_pos + 1}. {title} - Winamp")
+        builder.asset_resolver.reload_if_changed()
+        key = (builder.asset_resolver.reloads, track_pos, parsed.artist or "", parsed.title)
+        if self._get_cached(key) is not None:
+            return
+
+        album_art = builder.get_album_art(track_pos, parsed.artist or "")
+
+        self._store(key, album_art)
+        self.prefetched += 1
+
+    def start(self):
+        """
+        Start prefetching in a background thread.
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="PayloadPrefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread.
+        """
+
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._stopped.is_set():
+                return
+            self._wake.clear()
+
+            track_pos = self._target
+            if track_pos is None:
+                continue
+            try:
+                self.prefetch_now(track_pos)
+            except Exception as e:
+                print(f"Could not prefetch upcoming tracks: {e}")
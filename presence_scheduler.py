@@ -0,0 +1,295 @@
+"""
+Rate limited presence updates. Use PresenceScheduler between the main loop and a pypresence client to coalesce rapid
+state changes, skip duplicate updates and stay within the Discord rate limit.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    Optional
+)
+
+CLEAR = None
+"""
+Pending state meaning the presence should be cleared.
+"""
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter. The bucket holds at most capacity tokens and is refilled with rate tokens per second.
+    """
+
+    def __init__(self, capacity: float, rate: float, clock: Callable[[], float] = time.monotonic):
+        """
+        :param capacity: Maximum number of tokens, i.e. the size of a burst
+        :param rate: Tokens added per second
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token from the bucket if one is available.
+
+        :return: True if a token was taken
+        """
+
+        self._refill()
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+    def time_until_available(self) -> float:
+        """
+        :return: Time in seconds until a token is available
+        """
+
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+
+class PresenceScheduler:
+    """
+    Schedule updates to a presence client. Only the latest submitted state is sent, so states submitted while waiting
+    for the rate limit are dropped. States identical to the last sent state are not sent at all. A state the presence
+    client failed to send is kept pending and sent again, unless a newer state has been submitted meanwhile.
+
+    Each submitted state is counted once, so submitted equals sent + dropped + deduplicated, plus one while a state is
+    pending.
+
+    The scheduler can be driven either manually with flush() or by a background thread started with start().
+    """
+
+    def __init__(self,
+                 presence,
+                 updates_per_interval: int = 5,
+                 interval: float = 20.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param presence: pypresence Presence client, or any object with update(**kwargs) and clear() methods. Can be
+        None if the client is not connected yet, in which case states are kept pending until a client is attached.
+        :param updates_per_interval: Maximum number of updates sent during interval
+        :param interval: Length of the rate limit interval in seconds
+        :param clock: Monotonic clock function returning seconds
+        """
+        self._presence = presence
+        self.bucket = TokenBucket(updates_per_interval, updates_per_interval / interval, clock)
+
+        self.submitted = 0
+        """
+        Number of states submitted with update() or clear().
+        """
+        self.sent = 0
+        """
+        Number of updates and clears sent to the presence client.
+        """
+        self.dropped = 0
+        """
+        Number of submitted states replaced by a newer state before they were sent.
+        """
+        self.deduplicated = 0
+        """
+        Number of submitted states skipped because they were identical to the last sent state.
+        """
+        self.errors = 0
+        """
+        Number of updates that raised an exception in the presence client. A state sent again after an error is counted
+        once for each failed attempt.
+        """
+        self.on_error: Optional[Callable[[Exception], None]] = None
+        """
+        Optional function called with the exception when the presence client raises one.
+        """
+
+        self._has_pending = False
+        self._pending = CLEAR
+        self._last_sent = CLEAR
+        self._has_sent = False
+        self._failing = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    @property
+    def presence(self):
+        """
+        The presence client states are sent to, or None if no client is attached.
+        """
+        return self._presence
+
+    @presence.setter
+    def presence(self, presence):
+        with self._condition:
+            self._presence = presence
+            # A state submitted while no client was attached can be sent now
+            self._condition.notify()
+
+    def update(self, **payload):
+        """
+        Submit a new presence state. Takes the same keyword arguments as Presence.update().
+        """
+        self._submit(payload)
+
+    def clear(self):
+        """
+        Submit clearing the presence.
+        """
+        self._submit(CLEAR)
+
+    def _submit(self, state: Optional[Dict]):
+        with self._condition:
+            self.submitted += 1
+            # Only the superseded state is counted here. This state is counted when it is sent, skipped or superseded.
+            if self._has_pending:
+                self.dropped += 1
+
+            if self._has_sent and state == self._last_sent:
+                # The newest state is already shown, so an older pending state must not be sent either
+                self._has_pending = False
+                self.deduplicated += 1
+            else:
+                self._pending = state
+                self._has_pending = True
+            self._condition.notify()
+
+    def reset(self):
+        """
+        Forget the last sent state, e.g. after connecting to Discord again, so the next state is sent even if it is
+        identical to the last one.
+        """
+        with self._condition:
+            self._has_sent = False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: The scheduler counters in a dictionary
+        """
+        return {"submitted": self.submitted, "sent": self.sent, "dropped": self.dropped,
+                "deduplicated": self.deduplicated, "errors": self.errors}
+
+    def flush(self) -> bool:
+        """
+        Send the pending state if there is one and the rate limit allows it. Nothing is sent while no presence client
+        is attached, and the state is kept pending.
+
+        :return: True if a state was sent
+        """
+
+        with self._condition:
+            presence = self._presence
+            if presence is None or not self._has_pending or not self.bucket.try_acquire():
+                return False
+            state = self._pending
+            self._has_pending = False
+            submitted = self.submitted
+
+        try:
+            if state is CLEAR:
+                presence.clear()
+            else:
+                presence.update(**state)
+        except Exception as e:
+            with self._condition:
+                self.errors += 1
+                if self.submitted != submitted:
+                    # A newer state replaces the failed one, even if it was skipped as identical to the shown state
+                    self.dropped += 1
+                else:
+                    self._pending = state
+                    self._has_pending = True
+            # The failed state is retried within the rate limit, so only the first error of a streak is reported
+            if not self._failing:
+                print(f"Could not update Discord presence: {e}")
+            self._failing = True
+            if self.on_error is not None:
+                self.on_error(e)
+            return False
+
+        with self._condition:
+            self._last_sent = state
+            self._has_sent = True
+            self.sent += 1
+        self._failing = False
+
+        return True
+
+    def start(self):
+        """
+        Start sending pending states in a background thread.
+        """
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PresenceScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread. A pending state is not sent.
+        """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._has_pending or self._presence is None):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                delay = self.bucket.time_until_available()
+
+            if delay > 0:
+                # Wait for the rate limit, but wake up early if stopped. A newer state replaces the pending one.
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running, delay)
+                continue
+
+            self.flush()
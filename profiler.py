@@ -0,0 +1,334 @@
+"""
+Sampling profiler and memory tracing for long running sessions. Use Profiler to sample the stacks of all threads and
+take tracemalloc snapshots periodically, and to dump collapsed stacks and the allocation growth between snapshots
+without restarting or editing WinampRPC.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+AllocationKey = Tuple[str, int]
+"""
+File name and line number of an allocation site.
+"""
+
+
+class ProfileWindow:
+    """
+    Stack samples and memory usage of one time window.
+    """
+
+    __slots__ = ("started", "ended", "samples", "stacks", "allocations", "traced_memory", "peak_memory")
+
+    def __init__(self, started: float):
+        """
+        :param started: UNIX time in seconds when the window started
+        """
+        self.started = started
+        self.ended = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        """
+        Number of samples by collapsed stack.
+        """
+        self.allocations: Dict[AllocationKey, Tuple[int, int]] = {}
+        """
+        Size in bytes and number of memory blocks allocated by each allocation site at the end of the window.
+        """
+        self.traced_memory = 0
+        self.peak_memory = 0
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+class Profiler:
+    """
+    Sample the stacks of all threads every sample_interval seconds in a background thread, and take a tracemalloc
+    snapshot every window_interval seconds. The samples and snapshots of the latest windows are kept in a ring, so the
+    memory used by the profiler stays bounded in sessions of any length.
+
+    A dump writes the stacks of all windows in the ring in collapsed format, which flamegraph.pl and speedscope read,
+    and the allocation sites that grew the most between the oldest and the latest snapshot.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 sample_interval: float = 0.1,
+                 window_interval: float = 300.0,
+                 windows: int = 12,
+                 trace_memory: bool = True,
+                 top_allocations: int = 50,
+                 clock: Callable[[], float] = time.time
+                 ):
+        """
+        :param directory: Directory where the dumps are written
+        :param sample_interval: Time in seconds between stack samples
+        :param window_interval: Time in seconds between memory snapshots, i.e. the length of a window
+        :param windows: Number of windows kept in the ring
+        :param trace_memory: If True, allocations are traced with tracemalloc. Tracing slows down allocations.
+        :param top_allocations: Number of allocation sites written in the allocation dump
+        :param clock: Clock function returning UNIX time in seconds
+        """
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.window_interval = window_interval
+        self.trace_memory = trace_memory
+        self.top_allocations = top_allocations
+        self.clock = clock
+        self.ring: Deque[ProfileWindow] = deque(maxlen=windows)
+        self.dumps = 0
+
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._dump_requested = threading.Event()
+        self._thread = None
+        self._window = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def sample(self):
+        """
+        Sample the current stack of every thread except the profiler thread.
+        """
+
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks.append(";".join(reversed(labels)))
+
+        with self._lock:
+            window = self._window
+            window.samples += 1
+            window.stacks.update(stacks)
+
+    def rotate(self):
+        """
+        Finish the current window with a memory snapshot and start a new one.
+        """
+
+        allocations = {}
+        traced_memory = peak_memory = 0
+        if self.trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+            # Only the totals per line are kept, which takes much less memory than the snapshot
+            for statistic in snapshot.statistics("lineno"):
+                frame = statistic.traceback[0]
+                allocations[(frame.filename, frame.lineno)] = (statistic.size, statistic.count)
+            traced_memory, peak_memory = tracemalloc.get_traced_memory()
+            # reset_peak() is not available before Python 3.9, so the peak is then the peak of the whole session
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+        now = self.clock()
+        with self._lock:
+            window = self._window
+            if window is not None:
+                window.ended = now
+                window.allocations = allocations
+                window.traced_memory = traced_memory
+                window.peak_memory = peak_memory
+            self._window = ProfileWindow(now)
+            self.ring.append(self._window)
+
+    def collapsed_stacks(self) -> List[str]:
+        """
+        :return: Lines in format 'thread;outer function;...;inner function count' summed over all windows in the ring
+        """
+
+        with self._lock:
+            stacks = Counter()
+            for window in self.ring:
+                stacks.update(window.stacks)
+
+        return [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+
+    def allocation_diff(self) -> List[Tuple[AllocationKey, int, int, int]]:
+        """
+        Compare the memory snapshots of the oldest and the latest finished window in the ring.
+
+        :return: Allocation site, growth in bytes, growth in memory blocks and current size in bytes of the sites that
+        grew the most
+        """
+
+        with self._lock:
+            finished = [window for window in self.ring if window.ended is not None]
+        if not finished:
+            return []
+
+        oldest, latest = finished[0].allocations, finished[-1].allocations
+        differences = []
+        for key in set(oldest).union(latest):
+            size, count = latest.get(key, (0, 0))
+            old_size, old_count = oldest.get(key, (0, 0))
+            if size != old_size:
+                differences.append((key, size - old_size, count - old_count, size))
+        differences.sort(key=lambda difference: difference[1], reverse=True)
+
+        return differences[:self.top_allocations]
+
+    def dump(self) -> Tuple[str, str]:
+        """
+        Write the collapsed stacks and the allocation growth into files named by the current time. The current
+        window is finished first, so the dump includes the latest memory usage.
+
+        :return: Paths to the stacks file and the allocations file
+        """
+
+        self.rotate()
+        os.makedirs(self.directory, exist_ok=True)
+        name = datetime.fromtimestamp(self.clock()).strftime("%Y%m%d_%H%M%S")
+        stacks_filepath = os.path.join(self.directory, f"profile_{name}.stacks.txt")
+        allocations_filepath = os.path.join(self.directory, f"profile_{name}.allocations.txt")
+
+        with open(stacks_filepath, "w", encoding="utf8") as stacks_file:
+            stacks_file.writelines(f"{line}\n" for line in self.collapsed_stacks())
+
+        with self._lock:
+            finished = [window for window in self.ring if window.ended is not None]
+        with open(allocations_filepath, "w", encoding="utf8") as allocations_file:
+            if not self.trace_memory:
+                allocations_file.write("Memory tracing is disabled.\n")
+            elif finished:
+                allocations_file.write(f"Allocation growth from {datetime.fromtimestamp(finished[0].ended)} to "
+                                       f"{datetime.fromtimestamp(finished[-1].ended)}\n\n")
+                for (filename, lineno), size, count, total in self.allocation_diff():
+                    allocations_file.write(f"{_format_size(size):>12} {count:+9d} blocks  {filename}:{lineno}  "
+                                           f"(total {_format_size(total)})\n")
+                allocations_file.write("\nTraced memory by window:\n")
+                for window in finished:
+                    allocations_file.write(f"{datetime.fromtimestamp(window.ended)}  "
+                                           f"current {_format_size(window.traced_memory)}  "
+                                           f"peak {_format_size(window.peak_memory)}  samples {window.samples}\n")
+
+        self.dumps += 1
+        return stacks_filepath, allocations_filepath
+
+    def request_dump(self):
+        """
+        Ask the profiler thread to dump as soon as possible. This method is thread safe and can be called from a
+        signal handler.
+        """
+        self._dump_requested.set()
+
+    def install_signal_handler(self) -> Optional[str]:
+        """
+        Dump when the process receives SIGUSR1, or SIGBREAK (CTRL + Break) on Windows. Must be called from the main
+        thread.
+
+        :return: Name of the signal, or None if neither signal is available
+        """
+
+        for name in ("SIGUSR1", "SIGBREAK"):
+            signal_number = getattr(signal, name, None)
+            if signal_number is not None:
+                signal.signal(signal_number, lambda _signal, _frame: self.request_dump())
+                return name
+
+        return None
+
+    def start(self):
+        """
+        Start tracing memory and sampling in a background thread.
+        """
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.rotate()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="Profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, dump: bool = True) -> Optional[Tuple[str, str]]:
+        """
+        Stop sampling and tracing memory.
+
+        :param dump: If True, dump once more before stopping
+        :return: Paths to the dumped stacks file and allocations file, or None if nothing was dumped
+        """
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        filepaths = self.dump() if dump else None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        return filepaths
+
+    def _run(self):
+        next_rotation = self.clock() + self.window_interval
+        while not self._stopped.wait(self.sample_interval):
+            self.sample()
+            if self._dump_requested.is_set():
+                self._dump_requested.clear()
+                try:
+                    stacks_filepath, allocations_filepath = self.dump()
+                    print(f"Profile written into {stacks_filepath} and {allocations_filepath}")
+                except OSError as e:
+                    print(f"Could not write profile: {e}")
+                next_rotation = self.clock() + self.window_interval
+            elif self.clock() >= next_rotation:
+                self.rotate()
+                next_rotation = self.clock() + self.window_interval
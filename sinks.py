@@ -0,0 +1,402 @@
+"""
+Fan-out of the now playing state to several consumers. Use StatePublisher to send each state to sinks such as Discord,
+a text file for OBS, a JSON status file and a local socket. Every sink has its own queue and worker thread, so a slow
+or broken sink never delays the player sampling or the other sinks.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import socket
+import threading
+import time
+from collections import deque
+from typing import (
+    Deque,
+    Dict,
+    List,
+    Optional
+)
+
+from atomic_file import write_atomic
+
+
+class NowPlaying:
+    """
+    The now playing state published to the sinks. None is published instead when nothing is playing.
+    """
+
+    __slots__ = ("artist", "title", "playlist_position", "start", "payload")
+
+    def __init__(self, artist: Optional[str], title: str, playlist_position: Optional[int], start: float,
+                 payload: Dict):
+        """
+        :param artist: Artist of the track, or None if the window title has no artist
+        :param title: Name of the track
+        :param playlist_position: Position of the track in the playlist, starting from 0
+        :param start: UNIX time in seconds when the track would have started if played without pauses
+        :param payload: Keyword arguments for Presence.update()
+        """
+        self.artist = artist
+        self.title = title
+        self.playlist_position = playlist_position
+        self.start = start
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"NowPlaying(artist={self.artist!r}, title={self.title!r}, start={self.start!r})"
+
+    def to_dict(self) -> Dict:
+        return {"artist": self.artist, "title": self.title, "playlist_position": self.playlist_position,
+                "start": self.start, "album": self.payload.get("large_text"),
+                "asset_key": self.payload.get("large_image")}
+
+
+def state_to_dict(state: Optional[NowPlaying]) -> Dict:
+    """
+    :return: The state as a JSON serializable dictionary with a 'playing' field
+    """
+
+    if state is None:
+        return {"playing": False}
+
+    return dict(state.to_dict(), playing=True)
+
+
+class Sink:
+    """
+    A consumer of now playing states. Submitted states are queued and written by the sink's own worker thread. The
+    queue holds at most queue_size states, and the oldest queued state is dropped when it is full, so the latest state
+    is always written.
+
+    Exceptions raised by write() are counted and reported, and writing continues with the next state.
+    """
+
+    name = "sink"
+
+    def __init__(self, queue_size: int = 1):
+        """
+        :param queue_size: Maximum number of states waiting to be written
+        """
+        self.written = 0
+        self.dropped = 0
+        """
+        Number of states dropped because the queue was full.
+        """
+        self.errors = 0
+
+        self._queue: Deque[Optional[NowPlaying]] = deque(maxlen=queue_size)
+        self._condition = threading.Condition()
+        self._failing = False
+        self._running = False
+        self._thread = None
+
+    def write(self, state: Optional[NowPlaying]):
+        """
+        Write a state. Called only from the worker thread.
+
+        :param state: The now playing state, or None if nothing is playing
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release the resources of the sink. Called from the worker thread when it stops.
+        """
+
+    def submit(self, state: Optional[NowPlaying]):
+        """
+        Queue a state to be written. Never blocks. This method is thread safe.
+        """
+
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(state)
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: The sink counters in a dictionary
+        """
+        return {"written": self.written, "dropped": self.dropped, "errors": self.errors}
+
+    def start(self):
+        """
+        Start writing queued states in a background thread.
+        """
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"Sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """
+        Stop the worker thread after it has written the queued states.
+
+        :param timeout: Maximum time in seconds to wait for the worker, e.g. if it is stuck writing to a network drive
+        """
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _write_isolated(self, state: Optional[NowPlaying]):
+        try:
+            self.write(state)
+        except Exception as e:
+            self.errors += 1
+            # Report only the first error of a failure streak, so a dead sink does not flood the output
+            if not self._failing:
+                print(f"Could not write now playing state to {self.name}: {e}")
+            self._failing = True
+        else:
+            self.written += 1
+            self._failing = False
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while self._running and not self._queue:
+                        self._condition.wait()
+                    if not self._queue:
+                        return
+                    state = self._queue.popleft()
+                self._write_isolated(state)
+        finally:
+            try:
+                self.close()
+            except Exception as e:
+                print(f"Could not close {self.name}: {e}")
+
+
+class DiscordSink(Sink):
+    """
+    Show the state in the Discord rich presence through a PresenceScheduler, which applies the Discord rate limit.
+    """
+
+    name = "discord"
+
+    def __init__(self, scheduler):
+        """
+        :param scheduler: presence_scheduler.PresenceScheduler sending the updates
+        """
+        super().__init__()
+        self.scheduler = scheduler
+
+    def write(self, state: Optional[NowPlaying]):
+        if state is None:
+            self.scheduler.clear()
+        else:
+            self.scheduler.update(**state.payload)
+
+
+class TextFileSink(Sink):
+    """
+    Write the state into a text file, e.g. for an OBS text source. The file is replaced atomically, so OBS never
+    reads a partially written file. The file is emptied when nothing is playing.
+    """
+
+    name = "text file"
+
+    def __init__(self, filepath: str, text_format: str = "{artist} - {title}"):
+        """
+        :param filepath: Path to the text file
+        :param text_format: Format of the text. Fields are the keys of NowPlaying.to_dict(), e.g. artist, title and
+        album. Missing values are empty strings.
+        """
+        super().__init__()
+        self.filepath = filepath
+        self.text_format = text_format
+
+    def write(self, state: Optional[NowPlaying]):
+        if state is None:
+            text = ""
+        else:
+            fields = {key: "" if value is None else value for key, value in state.to_dict().items()}
+            text = self.text_format.format(**fields)
+        write_atomic(self.filepath, text)
+
+
+class JsonFileSink(Sink):
+    """
+    Write the state into a JSON file with the time it was written.
+    """
+
+    name = "JSON file"
+
+    def __init__(self, filepath: str):
+        """
+        :param filepath: Path to the JSON file
+        """
+        super().__init__()
+        self.filepath = filepath
+
+    def write(self, state: Optional[NowPlaying]):
+        write_atomic(self.filepath, json.dumps(dict(state_to_dict(state), updated=time.time()), ensure_ascii=False))
+
+
+class SocketSink(Sink):
+    """
+    Serve the state on a local TCP socket. Each state is sent to every connected client as a JSON line, and a client
+    receives the latest state right after connecting. Clients that do not read fast enough are disconnected.
+    """
+
+    name = "socket"
+
+    def __init__(self, port: int, host: str = "127.0.0.1", send_timeout: float = 1.0):
+        """
+        :param port: Port to listen on. 0 picks a free port, see address.
+        :param host: Address to listen on. Only local clients can connect by default.
+        :param send_timeout: Time in seconds a client may block a send before it is disconnected
+        """
+        super().__init__()
+        self.send_timeout = send_timeout
+        self.clients: List[socket.socket] = []
+
+        self._server = socket.create_server((host, port))
+        self._latest = (json.dumps(state_to_dict(None)) + "\n").encode("utf8")
+        self._clients_lock = threading.Lock()
+        self._accept_thread = None
+
+    @property
+    def address(self):
+        """
+        The address the socket listens on.
+        """
+        return self._server.getsockname()
+
+    def start(self):
+        super().start()
+        self._accept_thread = threading.Thread(target=self._accept, name="SocketSink-accept", daemon=True)
+        self._accept_thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                # The server socket was closed
+                return
+            client.settimeout(self.send_timeout)
+            with self._clients_lock:
+                try:
+                    client.sendall(self._latest)
+                except OSError:
+                    client.close()
+                    continue
+                self.clients.append(client)
+
+    def write(self, state: Optional[NowPlaying]):
+        line = (json.dumps(state_to_dict(state), ensure_ascii=False) + "\n").encode("utf8")
+        with self._clients_lock:
+            self._latest = line
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    client.close()
+                    self.clients.remove(client)
+
+    def close(self):
+        self._server.close()
+        with self._clients_lock:
+            for client in self.clients:
+                client.close()
+            self.clients.clear()
+
+
+class StatePublisher:
+    """
+    Publish now playing states to a set of sinks. Publishing only queues the state for each sink, so it never blocks.
+    """
+
+    def __init__(self, sinks: List[Sink]):
+        """
+        :param sinks: The sinks to publish to
+        """
+        self.sinks = list(sinks)
+        self.published = 0
+
+    def publish(self, state: Optional[NowPlaying]):
+        """
+        Publish a state to every sink. This method is thread safe.
+
+        :param state: The now playing state, or None if nothing is playing
+        """
+
+        self.published += 1
+        for sink in self.sinks:
+            sink.submit(state)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: Counters of each sink by sink name
+        """
+        return {sink.name: sink.stats() for sink in self.sinks}
+
+    def start(self):
+        """
+        Start the worker threads of every sink.
+        """
+        for sink in self.sinks:
+            sink.start()
+
+    def stop(self):
+        """
+        Stop the worker threads of every sink.
+        """
+        for sink in self.sinks:
+            sink.stop()
+
+
+def load_sinks(settings: Dict, presence_scheduler=None) -> List[Sink]:
+    """
+    Create the sinks enabled in the settings.
+
+    :param settings: The settings
+    :param presence_scheduler: PresenceScheduler for the Discord sink, or None to leave Discord out
+    :return: The sinks
+    """
+
+    sinks = []
+    if presence_scheduler is not None:
+        sinks.append(DiscordSink(presence_scheduler))
+    if settings["obs_text_file"]:
+        sinks.append(TextFileSink(settings["obs_text_file"], settings["obs_text_format"]))
+    if settings["status_json_file"]:
+        sinks.append(JsonFileSink(settings["status_json_file"]))
+    if settings["status_socket_port"]:
+        try:
+            sinks.append(SocketSink(settings["status_socket_port"]))
+        except OSError as e:
+            print(f"Could not listen on port {settings['status_socket_port']} for status clients: {e}")
+
+    return sinks
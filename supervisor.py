@@ -0,0 +1,439 @@
+"""
+Connection supervision for Winamp and Discord. Use ConnectionSupervisor to keep both connections up: lost connections
+are detected, reconnected with exponential backoff and reported as events, so WinampRPC can wait idle while Winamp or
+Discord is closed instead of crashing.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from enum import Enum
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional
+)
+
+from winamp import Winamp
+
+
+class ConnectionState(Enum):
+    """
+    Enum representing the state of a supervised connection.
+    """
+
+    Disconnected = 0
+    Connecting = 1
+    Connected = 2
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter. Each delay is the exponential delay reduced by a random fraction of at most
+    jitter, so clients restarted at the same time do not retry in lockstep.
+    """
+
+    def __init__(self,
+                 initial: float = 1.0,
+                 maximum: float = 60.0,
+                 multiplier: float = 2.0,
+                 jitter: float = 0.5,
+                 rng: Optional[random.Random] = None
+                 ):
+        """
+        :param initial: Delay in seconds after the first failure
+        :param maximum: Maximum delay in seconds
+        :param multiplier: Factor the delay grows by after each failure
+        :param jitter: Maximum fraction the delay is randomly reduced by, between 0 and 1
+        :param rng: Random number generator. Defaults to a new random.Random.
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.rng = rng if rng is not None else random.Random()
+        self.failures = 0
+
+    def next_delay(self) -> float:
+        """
+        Register a failure.
+
+        :return: Time in seconds to wait before the next attempt
+        """
+
+        delay = min(self.maximum, self.initial * self.multiplier ** self.failures)
+        self.failures += 1
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def reset(self):
+        """
+        Register a success, so the next failure starts from the initial delay again.
+        """
+        self.failures = 0
+
+
+class Endpoint:
+    """
+    Interface for a connection supervised by ConnectionSupervisor.
+    """
+
+    name = "endpoint"
+
+    def connect(self):
+        """
+        Establish the connection.
+
+        :raises Exception: Any exception means the connection failed.
+        """
+        raise NotImplementedError
+
+    def is_alive(self) -> bool:
+        """
+        Check that an established connection still works. This is called periodically, so it must be cheap.
+
+        :return: True if the connection works
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release the resources of a lost connection before connecting again.
+        """
+
+
+class WinampEndpoint(Endpoint):
+    """
+    Connection to a Winamp client. The connection is lost when the Winamp window closes, which also detects a window
+    handle left stale by a restarted Winamp.
+    """
+
+    name = "winamp"
+
+    def __init__(self, winamp: Winamp):
+        """
+        :param winamp: Controller connected to the first Winamp window found on each connect
+        """
+        self.winamp = winamp
+
+    def connect(self):
+        self.winamp.connect()
+
+    def is_alive(self) -> bool:
+        return self.winamp.is_connected()
+
+    def close(self):
+        self.winamp.disconnect()
+
+
+class DiscordEndpoint(Endpoint):
+    """
+    Connection to the Discord client. Discord does not tell when it is closed, so the connection is considered lost
+    when a presence update fails, see mark_failed(). A new presence client is created for each connection.
+    """
+
+    name = "discord"
+
+    def __init__(self, client_factory: Callable, scheduler=None):
+        """
+        :param client_factory: Function returning a new pypresence Presence client, or any object with connect() and
+        close() methods
+        :param scheduler: Optional PresenceScheduler that is given the new client on each connect. Its errors mark the
+        connection as lost.
+        """
+        self.client_factory = client_factory
+        self.scheduler = scheduler
+        self.client = None
+        self._failed = False
+        if scheduler is not None:
+            scheduler.on_error = self.mark_failed
+
+    def mark_failed(self, _error: Optional[Exception] = None):
+        """
+        Mark the connection as lost. This method is thread safe.
+        """
+        self._failed = True
+
+    def connect(self):
+        client = self.client_factory()
+        client.connect()
+        self.client = client
+        self._failed = False
+        if self.scheduler is not None:
+            self.scheduler.presence = client
+            # The new Discord client does not show anything, so the current state must be sent again
+            self.scheduler.reset()
+
+    def is_alive(self) -> bool:
+        return self.client is not None and not self._failed
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+
+class AioDiscordEndpoint(DiscordEndpoint):
+    """
+    Connection to the Discord client through a pypresence AioPresence client, whose coroutines run in an event loop.
+    The supervisor thread runs connect() in the loop and waits for it. The presence is updated by the caller, which
+    must call mark_failed() when an update fails and send the current state again after each connect.
+    """
+
+    def __init__(self, client_factory: Callable, loop: asyncio.AbstractEventLoop, connect_timeout: float = 10.0):
+        """
+        :param client_factory: Function returning a new AioPresence client bound to loop, or any object with a
+        connect() coroutine and a close() method
+        :param loop: The event loop the clients run in
+        :param connect_timeout: Maximum time in seconds to wait for Discord to accept a connection
+        """
+        super().__init__(client_factory)
+        self.loop = loop
+        self.connect_timeout = connect_timeout
+
+    def connect(self):
+        client = self.client_factory()
+        future = asyncio.run_coroutine_threadsafe(client.connect(), self.loop)
+        try:
+            future.result(self.connect_timeout)
+        except Exception:
+            future.cancel()
+            self._close_client(client)
+            raise
+        self.client = client
+        self._failed = False
+
+    def close(self):
+        if self.client is not None:
+            self._close_client(self.client)
+            self.client = None
+
+    def _close_client(self, client):
+        def close():
+            try:
+                client.close()
+            except Exception:
+                pass
+
+        # The client must be closed in the thread of its event loop
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            close()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(close)
+
+
+class ConnectionEvent:
+    """
+    A supervised connection changed its state.
+    """
+
+    __slots__ = ("endpoint", "previous", "state", "error", "timestamp")
+
+    def __init__(self, endpoint: str, previous: ConnectionState, state: ConnectionState, error: Optional[Exception],
+                 timestamp: float):
+        """
+        :param endpoint: Name of the endpoint, e.g. 'winamp' or 'discord'
+        :param previous: State before the change
+        :param state: State after the change
+        :param error: The exception that caused a failed connection attempt or a lost connection, if any
+        :param timestamp: Monotonic clock time in seconds when the state changed
+        """
+        self.endpoint = endpoint
+        self.previous = previous
+        self.state = state
+        self.error = error
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return f"ConnectionEvent(endpoint={self.endpoint!r}, previous={self.previous}, state={self.state})"
+
+
+class ConnectionSupervisor:
+    """
+    Keep a set of connections up. Established connections are checked every check_interval seconds, and lost ones
+    are connected again after a backoff delay. Every state change is dispatched to subscribed callbacks.
+
+    While any connection is down, the supervisor thread only wakes up for reconnection attempts, and
+    wait_until_connected() blocks without using CPU.
+    """
+
+    def __init__(self,
+                 endpoints: List[Endpoint],
+                 check_interval: float = 5.0,
+                 backoff_factory: Callable[[], Backoff] = Backoff,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param endpoints: The supervised connections. Each must have a unique name.
+        :param check_interval: Time in seconds between checks of established connections
+        :param backoff_factory: Function creating the backoff of each endpoint
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.endpoints = {endpoint.name: endpoint for endpoint in endpoints}
+        self.check_interval = check_interval
+        self.clock = clock
+        self.states: Dict[str, ConnectionState] = {name: ConnectionState.Disconnected for name in self.endpoints}
+        self.backoffs: Dict[str, Backoff] = {name: backoff_factory() for name in self.endpoints}
+
+        self._next_attempts: Dict[str, float] = {name: clock() for name in self.endpoints}
+        self._callbacks = []
+        self._lock = threading.RLock()
+        self._connected = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self) -> bool:
+        """
+        True if every connection is established.
+        """
+        return self._connected.is_set()
+
+    def subscribe(self, callback: Callable[[ConnectionEvent], None]):
+        """
+        Subscribe a callback to state changes. Callbacks are called in the thread that detected the change.
+
+        :param callback: Function called with a ConnectionEvent as the only argument
+        """
+        self._callbacks.append(callback)
+
+    def _set_state(self, name: str, state: ConnectionState, error: Optional[Exception] = None):
+        previous = self.states[name]
+        if previous == state:
+            return
+
+        self.states[name] = state
+        if all(state == ConnectionState.Connected for state in self.states.values()):
+            self._connected.set()
+        else:
+            self._connected.clear()
+
+        event = ConnectionEvent(name, previous, state, error, self.clock())
+        for callback in self._callbacks:
+            callback(event)
+
+    def report_failure(self, endpoint: Endpoint, error: Optional[Exception] = None):
+        """
+        Report a lost connection noticed outside the supervisor, e.g. an exception from Winamp. The connection is
+        attempted again immediately. This method is thread safe.
+
+        :param endpoint: The endpoint whose connection was lost
+        :param error: The exception caused by the lost connection
+        """
+
+        with self._lock:
+            if self.states[endpoint.name] != ConnectionState.Connected:
+                return
+            endpoint.close()
+            self._next_attempts[endpoint.name] = self.clock()
+            self._set_state(endpoint.name, ConnectionState.Disconnected, error)
+        self._wake.set()
+
+    def check(self) -> float:
+        """
+        Check established connections and attempt due reconnections once.
+
+        :return: Time in seconds until the next check or attempt is due
+        """
+
+        with self._lock:
+            now = self.clock()
+            for name, endpoint in self.endpoints.items():
+                if self.states[name] == ConnectionState.Connected:
+                    try:
+                        alive = endpoint.is_alive()
+                    except Exception:
+                        alive = False
+                    if alive:
+                        continue
+                    endpoint.close()
+                    self._next_attempts[name] = now
+                    self._set_state(name, ConnectionState.Disconnected)
+
+                if now < self._next_attempts[name]:
+                    continue
+
+                self._set_state(name, ConnectionState.Connecting)
+                try:
+                    endpoint.connect()
+                except Exception as e:
+                    endpoint.close()
+                    self._next_attempts[name] = self.clock() + self.backoffs[name].next_delay()
+                    self._set_state(name, ConnectionState.Disconnected, e)
+                else:
+                    self.backoffs[name].reset()
+                    self._set_state(name, ConnectionState.Connected)
+
+            now = self.clock()
+            delays = [self._next_attempts[name] - now for name, state in self.states.items()
+                      if state != ConnectionState.Connected]
+
+        return max(0.0, min(delays + [self.check_interval]))
+
+    def wait_until_connected(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every connection is established.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait indefinitely
+        :return: True if every connection is established
+        """
+        return self._connected.wait(timeout)
+
+    def start(self):
+        """
+        Start supervising in a background thread.
+        """
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="ConnectionSupervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread. The connections are left as they are.
+        """
+
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            timeout = self.check()
+            self._wake.wait(timeout)
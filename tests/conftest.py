@@ -0,0 +1,61 @@
+import pytest
+
+from winamp import Winamp
+from winamp_simulator import SimulatedWinamp, generate_playlist
+
+
+class VirtualClock:
+    """
+    Monotonic clock that only moves when a test moves it.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> VirtualClock:
+    return VirtualClock()
+
+
+@pytest.fixture
+def simulator(clock, tmp_path) -> SimulatedWinamp:
+    return SimulatedWinamp(generate_playlist(20), dump_filepath=str(tmp_path / "Winamp.m3u8"), clock=clock)
+
+
+@pytest.fixture
+def winamp(simulator) -> Winamp:
+    return Winamp(simulator)
+
+
+@pytest.fixture
+def fake_tags(monkeypatch):
+    """
+    Read tags from track files containing 'artist|album' instead of audio, without mutagen. Returns the paths of the
+    files read, in order.
+    """
+
+    import library_index
+    import metadata
+
+    reads = []
+
+    def read_tags(track_path):
+        reads.append(track_path)
+        with open(track_path, encoding="utf8") as track_file:
+            content = track_file.read()
+        if not content:
+            return None
+        artist, album = content.split("|")
+        return metadata.TrackMetadata(artist, album, source=metadata.SOURCE_TAGS)
+
+    monkeypatch.setattr(metadata, "mutagen", object())
+    monkeypatch.setattr(metadata, "read_tags", read_tags)
+    monkeypatch.setattr(library_index, "read_tags", read_tags)
+    return reads
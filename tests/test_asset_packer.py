@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from asset_packer import LibraryAlbum, group_duplicates, make_asset_key, pack_assets
+from assets import MAX_ASSET_KEY_LENGTH, validate_asset_key
+
+
+def brute_force_groups(hashes, max_distance):
+    parents = list(range(len(hashes)))
+
+    def find(index):
+        while parents[index] != index:
+            index = parents[index]
+        return index
+
+    for first in range(len(hashes)):
+        for second in range(first + 1, len(hashes)):
+            if bin(hashes[first] ^ hashes[second]).count("1") <= max_distance:
+                a, b = find(first), find(second)
+                parents[max(a, b)] = min(a, b)
+
+    return [find(index) for index in range(len(hashes))]
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 4, 10])
+def test_group_duplicates_matches_pairwise_comparison(max_distance):
+    rng = random.Random(max_distance)
+    hashes = []
+    for _ in range(60):
+        value = rng.getrandbits(64)
+        hashes.append(value)
+        # Near duplicates of the cover, e.g. the same image resized
+        for _ in range(rng.randrange(3)):
+            for bit in rng.sample(range(64), rng.randint(0, 6)):
+                value ^= 1 << bit
+            hashes.append(value)
+    rng.shuffle(hashes)
+
+    assert group_duplicates(hashes, max_distance) == brute_force_groups(hashes, max_distance)
+
+
+def test_group_duplicates_merges_identical_hashes():
+    assert group_duplicates([5, 7, 5, 5], 0) == [0, 1, 0, 0]
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Abbey Road", "abbey_road"),
+    ("Björk: Homogenic", "bjork_homogenic"),
+    ("Ærø Łódź", "aero_lodz"),
+    ("東京", "album"),
+    ("A" * 40, "a" * MAX_ASSET_KEY_LENGTH),
+])
+def test_make_asset_key(name, expected):
+    assert make_asset_key(name, set()) == expected
+
+
+def test_make_asset_key_is_unique_and_valid():
+    used_keys = set()
+    keys = [make_asset_key("Greatest Hits " + "x" * 30, used_keys) for _ in range(12)]
+
+    assert len(set(keys)) == 12
+    assert keys[1].endswith("_2") and keys[11].endswith("_12")
+    assert all(validate_asset_key(key) is None for key in keys)
+    assert used_keys == set(keys)
+
+
+def album(name, artist, image_path, plays=0, tracks=10):
+    library_album = LibraryAlbum(name, artist, image_path, tracks=tracks)
+    library_album.plays = plays
+    return library_album
+
+
+def test_pack_assets_shares_covers_and_adds_exceptions():
+    albums = [album("Greatest Hits", "Band", "a.jpg", plays=10),
+              album("Greatest Hits", "Singer", "b.jpg", plays=5),
+              album("Deluxe", "Band", "a_large.jpg", plays=1),
+              album("Unpopular", "Band", "c.jpg")]
+    cover_a, cover_b, cover_c = 0x0123456789ABCDEF, 0xFEDCBA9876543210, 0x00000000FFFFFFFF
+    hashes = {"a.jpg": cover_a, "a_large.jpg": cover_a ^ 0b101, "b.jpg": cover_b, "c.jpg": cover_c}
+
+    pack = pack_assets(albums, hashes, max_assets=2)
+
+    assert pack.album_covers == {"Band - Greatest Hits": "greatest_hits", "Deluxe": "greatest_hits",
+                                 "Singer - Greatest Hits": "greatest_hits_2"}
+    assert pack.exceptions == ["Greatest Hits"]
+    assert pack.images == {"greatest_hits": "a.jpg", "greatest_hits_2": "b.jpg"}
+    assert (pack.groups, pack.skipped_albums) == (3, 1)
+
+
+def test_pack_assets_keeps_existing_keys():
+    albums = [album("Abbey Road", "The Beatles", "a.jpg")]
+
+    pack = pack_assets(albums, {"a.jpg": 1}, existing_covers={"abbey road": "abbeyroad"},
+                       reserved_keys=("logo", "playbutton"))
+
+    assert pack.album_covers == {"Abbey Road": "abbeyroad"}
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from assets import MAX_ASSETS, AssetIndex, AssetResolver, validate_asset_key
+
+
+def write_files(tmp_path, album_covers, exceptions=None):
+    (tmp_path / "album_covers.json").write_text(json.dumps(album_covers), encoding="utf8")
+    if exceptions is not None:
+        (tmp_path / "album_name_exceptions.txt").write_text("\n".join(exceptions), encoding="utf8")
+
+
+@pytest.fixture
+def resolver(tmp_path, clock):
+    write_files(tmp_path, {"Greatest Hits": "greatest_hits", "Café Tacvba": "cafe_tacvba"}, [])
+    resolver = AssetResolver(str(tmp_path / "album_covers.json"), str(tmp_path / "album_name_exceptions.txt"),
+                             check_interval=2.0, clock=clock)
+    assert resolver.load() == []
+    return resolver
+
+
+def test_names_match_case_insensitively(resolver):
+    assert resolver.resolve("greatest hits", "Anyone") == "greatest_hits"
+    assert resolver.resolve("  GREATEST HITS ", "Anyone") == "greatest_hits"
+    # Decomposed accents match precomposed ones
+    assert resolver.resolve("CAFE\u0301 TACVBA", "Anyone") == "cafe_tacvba"
+    assert resolver.resolve("Unknown", "Anyone") is None
+
+
+def test_changed_covers_are_reloaded(resolver, tmp_path, clock):
+    write_files(tmp_path, {"Greatest Hits": "greatest_hits_v2", "New Album": "new_album"})
+
+    # The files are not checked again within the check interval
+    assert resolver.resolve("New Album", "Artist") is None
+    clock.advance(2.0)
+    assert resolver.resolve("New Album", "Artist") == "new_album"
+    assert resolver.resolve("Greatest Hits", "Artist") == "greatest_hits_v2"
+    assert resolver.resolve("Café Tacvba", "Café Tacvba") is None
+    assert resolver.reloads == 2
+
+
+def test_unchanged_files_are_not_reloaded(resolver, clock):
+    clock.advance(10.0)
+
+    assert not resolver.reload_if_changed()
+    assert resolver.reloads == 1
+
+
+def test_changed_exceptions_are_reloaded(resolver, tmp_path, clock):
+    write_files(tmp_path, {"Greatest Hits": "greatest_hits", "Queen - Greatest Hits": "queen_hits",
+                           "ABBA - Greatest Hits": "abba_hits"}, ["greatest hits"])
+    clock.advance(2.0)
+
+    assert resolver.resolve("Greatest Hits", "queen") == "queen_hits"
+    assert resolver.resolve("greatest hits", "ABBA") == "abba_hits"
+    assert resolver.resolve("Greatest Hits", "Other") is None
+
+    write_files(tmp_path, {"Greatest Hits": "greatest_hits"}, [])
+    clock.advance(2.0)
+    assert resolver.resolve("Greatest Hits", "Queen") == "greatest_hits"
+
+
+def test_broken_file_keeps_previous_index(resolver, tmp_path, clock, capsys):
+    (tmp_path / "album_covers.json").write_text('{"Greatest Hits": ', encoding="utf8")
+    clock.advance(2.0)
+
+    assert resolver.resolve("Greatest Hits", "Artist") == "greatest_hits"
+    assert "Could not reload album assets" in capsys.readouterr().out
+
+    # A broken file is not parsed again until it changes
+    clock.advance(2.0)
+    assert not resolver.reload_if_changed()
+    write_files(tmp_path, {"Greatest Hits": "fixed"})
+    clock.advance(2.0)
+    assert resolver.resolve("Greatest Hits", "Artist") == "fixed"
+
+
+@pytest.mark.parametrize("asset_key, problem", [
+    ("", "asset key must be a non-empty string"),
+    (5, "asset key must be a non-empty string"),
+    ("a" * 31, "asset key is longer than 30 characters"),
+    ("with space", "asset key contains special characters"),
+    ("ümlaut", "asset key contains special characters"),
+])
+def test_invalid_asset_keys_are_rejected(asset_key, problem):
+    assert validate_asset_key(asset_key) == problem
+
+
+def test_invalid_asset_keys_are_skipped_on_reload(resolver, tmp_path, clock):
+    write_files(tmp_path, {"Greatest Hits": "greatest-hits", "Valid": "valid_key"})
+    clock.advance(2.0)
+
+    assert resolver.reload_if_changed()
+    assert resolver.index.problems == ["Skipped album 'Greatest Hits': asset key contains special characters"]
+    assert resolver.resolve("Greatest Hits", "Artist") is None
+    assert resolver.resolve("Valid", "Artist") == "valid_key"
+
+
+def test_asset_limit_counts_reserved_keys():
+    album_covers = {f"Album {i}": f"album_{i}" for i in range(MAX_ASSETS - 1)}
+
+    assert AssetIndex.build(album_covers, [], ["logo"]).problems == []
+    assert AssetIndex.build(album_covers, [], ["logo", "playbutton"]).problems == [
+        f"{MAX_ASSETS + 1} assets are used, but Discord allows only {MAX_ASSETS} per application"]
+
+
+def test_covers_must_be_an_object(tmp_path):
+    (tmp_path / "album_covers.json").write_text("[]", encoding="utf8")
+    resolver = AssetResolver(str(tmp_path / "album_covers.json"), str(tmp_path / "album_name_exceptions.txt"))
+
+    with pytest.raises(ValueError):
+        resolver.load()
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from async_winamp import AsyncWinamp
+from winamp import MenuCommand, PlayingStatus, Winamp
+from winamp_simulator import SimulatedWinamp, generate_playlist
+
+
+class SerializationCheckingWinamp(SimulatedWinamp):
+    """
+    Simulated player that records the threads messages are sent from and how many are sent at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+        self.active = 0
+        self.max_active = 0
+        self._active_lock = threading.Lock()
+
+    def send_message(self, window_id, message, wparam, lparam):
+        with self._active_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.threads.add(threading.get_ident())
+        try:
+            # Give other threads a chance to send at the same time
+            time.sleep(0.0005)
+            return super().send_message(window_id, message, wparam, lparam)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def checking_simulator(clock, tmp_path):
+    simulator = SerializationCheckingWinamp(generate_playlist(20), dump_filepath=str(tmp_path / "Winamp.m3u8"),
+                                            clock=clock)
+    simulator.press(MenuCommand.Play)
+    return simulator
+
+
+def test_concurrent_awaits_are_serialized(checking_simulator):
+    winamp = Winamp(checking_simulator)
+    # Connecting sent messages from this thread
+    checking_simulator.threads.clear()
+
+    async def run():
+        async_winamp = AsyncWinamp(winamp)
+        try:
+            return await asyncio.gather(*[call(async_winamp) for _ in range(20)
+                                          for call in (lambda w: w.get_playing_status(),
+                                                       lambda w: w.get_track_status(),
+                                                       lambda w: w.get_playlist_position(),
+                                                       lambda w: w.snapshot())])
+        finally:
+            async_winamp.close()
+
+    results = asyncio.run(run())
+
+    assert results[0] == PlayingStatus.Playing
+    assert results[1] == (checking_simulator.playlist[0].duration * 1000, 0)
+    assert results[2] == 0
+    assert results[3].playlist_position == 0
+    assert checking_simulator.max_active == 1
+    assert len(checking_simulator.threads) == 1
+
+
+def test_blocking_view_uses_the_worker_thread(checking_simulator):
+    async_winamp = AsyncWinamp(Winamp(checking_simulator))
+    checking_simulator.threads.clear()
+    blocking_winamp = async_winamp.blocking()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=4) as other_threads:
+            blocking_calls = [loop.run_in_executor(other_threads, blocking_winamp.get_playlist_length)
+                              for _ in range(20)]
+            async_calls = [async_winamp.get_playlist_position() for _ in range(20)]
+            return await asyncio.gather(*blocking_calls, *async_calls)
+
+    try:
+        results = asyncio.run(run())
+        blocking_winamp.set_volume(100)
+        assert checking_simulator.volume == 100
+    finally:
+        async_winamp.close()
+
+    assert results == [20] * 20 + [0] * 20
+    assert checking_simulator.max_active == 1
+    assert len(checking_simulator.threads) == 1
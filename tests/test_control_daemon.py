@@ -0,0 +1,115 @@
+import json
+import os
+import socket
+
+import pytest
+
+import control_daemon
+from control_daemon import ControlClient, ControlDaemon, ControlError, read_token, write_token
+from winamp import PlayingStatus
+
+
+@pytest.fixture
+def daemon(winamp):
+    daemon = ControlDaemon(winamp, port=0)
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+@pytest.fixture
+def client(daemon):
+    with ControlClient(daemon.address[1], token=daemon.token, timeout=10.0) as client:
+        yield client
+
+
+def test_batch_is_executed_in_order(client, simulator):
+    results = client.send([("set_volume", 100), ("change_track", 4), ("press", "Play"), ("get_volume",)])
+
+    assert [result["ok"] for result in results] == [True] * 4
+    assert results[3]["result"] == 100
+    assert simulator.playlist_position == 4
+    assert simulator.status == PlayingStatus.Playing
+
+
+def test_results_are_converted_to_json(client):
+    snapshot = client.call("snapshot")
+
+    assert snapshot["status"] == "Stopped"
+    assert snapshot["playlist_length"] == 20
+
+
+def test_commands_after_failure_are_skipped(client):
+    results = client.send([("press", "NoSuchButton"), ("get_volume",)])
+
+    assert results[0]["error"].startswith("ValueError")
+    assert results[1] == {"ok": False, "error": "Skipped after a failed command"}
+    assert client.send([("press", "NoSuchButton"), ("get_volume",)], continue_on_error=True)[1]["ok"]
+
+
+def test_unknown_command_rejects_request(client):
+    with pytest.raises(ControlError, match="Unknown commands: explode"):
+        client.send([("explode",)])
+
+
+def test_wrong_token_is_rejected(daemon, simulator):
+    with pytest.raises(ControlError, match="Invalid token"):
+        ControlClient(daemon.address[1], token="wrong", timeout=10.0).send([("set_volume", 0)])
+
+    assert simulator.volume == 255
+
+
+def test_connection_is_closed_after_invalid_line(daemon, simulator):
+    request = json.dumps({"token": daemon.token, "commands": [["set_volume", 0]]})
+    with socket.create_connection(daemon.address, timeout=10.0) as connection:
+        connection.sendall(b"POST / HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n" + request.encode() + b"\n")
+        received = b""
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            received += data
+
+    assert [json.loads(line)["error"].split(":")[0] for line in received.splitlines()] == ["Invalid JSON"]
+    assert simulator.volume == 255
+
+
+def test_sleeps_of_a_batch_are_capped(client, monkeypatch):
+    monkeypatch.setattr(control_daemon, "MAX_BATCH_DURATION", 0.2)
+
+    results = client.send([("sleep", 0.15), ("sleep", 0.15), ("get_volume",)])
+
+    assert results[0]["ok"]
+    assert "at most 0.2 seconds" in results[1]["error"]
+
+
+def test_token_file(tmp_path):
+    token_path = str(tmp_path / "control_daemon.token")
+    write_token(token_path, "first")
+    write_token(token_path, "second")
+
+    assert read_token(token_path) == "second"
+    if os.name == "posix":
+        assert os.stat(token_path).st_mode & 0o777 == 0o600
+
+
+def test_token_file_is_per_user_on_windows(tmp_path, monkeypatch):
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    token_path = control_daemon._default_token_path()
+    assert token_path == os.path.join(str(tmp_path), "WinampRPC", "control_daemon.token")
+
+    # The directory does not exist before the first start
+    write_token(token_path, "token")
+    assert read_token(token_path) == "token"
+
+    monkeypatch.delenv("APPDATA")
+    script_directory = os.path.dirname(os.path.abspath(control_daemon.__file__))
+    assert os.path.dirname(control_daemon._default_token_path()) == script_directory
+
+
+def test_client_reads_token_file(daemon, tmp_path):
+    token_path = str(tmp_path / "control_daemon.token")
+    write_token(token_path, daemon.token)
+
+    with ControlClient(daemon.address[1], token_path=token_path, timeout=10.0) as client:
+        assert client.call("get_volume") == 255
@@ -0,0 +1,125 @@
+import threading
+
+from events import Paused, PlayerWatcher, Resumed, Seeked, Stopped, TrackChanged, strip_status_suffix
+from winamp import MenuCommand
+
+
+def make_watcher(winamp, clock):
+    watcher = PlayerWatcher(winamp, clock=clock)
+    events = []
+    watcher.subscribe(events.append)
+    return watcher, events
+
+
+def test_first_sample_reports_playing_track(simulator, winamp, clock):
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    clock.advance(3)
+
+    watcher.check()
+
+    assert len(events) == 1
+    event = events[0]
+    assert isinstance(event, TrackChanged)
+    assert event.title == "1. Artist 0 - Track 1 - Winamp"
+    assert event.previous_title == ""
+    assert event.position == 3000
+
+
+def test_pause_resume_next_and_stop(simulator, winamp, clock):
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    watcher.check()
+
+    simulator.press(MenuCommand.TogglePause)
+    watcher.check()
+    simulator.press(MenuCommand.TogglePause)
+    watcher.check()
+    simulator.press(MenuCommand.NextTrack)
+    watcher.check()
+    simulator.press(MenuCommand.Stop)
+    watcher.check()
+
+    assert [type(event) for event in events] == [TrackChanged, Paused, Resumed, TrackChanged, Stopped]
+    assert events[3].previous_title == "1. Artist 0 - Track 1 - Winamp"
+    assert events[3].title == "2. Artist 0 - Track 2 - Winamp"
+
+
+def test_unchanged_player_reports_nothing(simulator, winamp, clock):
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    watcher.check()
+
+    for _ in range(5):
+        clock.advance(1)
+        assert watcher.check() == []
+    assert len(events) == 1
+
+
+def test_seek_is_reported_when_confirmed(simulator, winamp, clock):
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    watcher.check()
+
+    winamp.seek_track(60000)
+    clock.advance(1)
+    # A single sample far from the prediction could be a bogus value
+    assert watcher.check() == []
+    clock.advance(1)
+    seeked = watcher.check()
+
+    assert len(seeked) == 1
+    assert isinstance(seeked[0], Seeked)
+    assert seeked[0].position == 62000
+    assert seeked[0].expected_position == 2000
+
+
+def test_bogus_start_position_is_filtered(simulator, winamp, clock):
+    simulator.start_glitch = 1.0
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+
+    watcher.check()
+
+    assert events[0].position == 0
+
+
+def test_track_information_is_read_once_per_track(simulator, winamp, clock):
+    watcher, _ = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    watcher.check()
+
+    simulator.reset_counters()
+    clock.advance(1)
+    watcher.check()
+
+    assert simulator.messages == 5
+
+
+def test_stop_before_run_is_kept(winamp, clock):
+    watcher, _ = make_watcher(winamp, clock)
+    watcher.reset()
+    watcher.stop()
+
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert watcher.wakeups == 0
+
+
+def test_reset_reports_current_state_again(simulator, winamp, clock):
+    watcher, events = make_watcher(winamp, clock)
+    simulator.press(MenuCommand.Play)
+    watcher.check()
+
+    watcher.reset()
+    watcher.check()
+
+    assert [type(event) for event in events] == [TrackChanged, TrackChanged]
+
+
+def test_strip_status_suffix():
+    assert strip_status_suffix("1. A - B - Winamp [Paused]") == "1. A - B - Winamp"
+    assert strip_status_suffix("1. A - B - Winamp") == "1. A - B - Winamp"
@@ -0,0 +1,156 @@
+import io
+import os
+
+import pytest
+
+from events import Paused, Resumed, Stopped, TrackChanged
+from history import RECORD, SEGMENT_MAGIC, HistoryLog, HistoryRecorder
+
+
+def fill(log, count, start=1000.0):
+    for i in range(count):
+        log.append(start + i * 100, 60000 + i, f"Artist {i % 2}", f"Album {i % 3}", f"Title {i}")
+
+
+def test_records_are_kept_over_reopening(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    fill(log, 5)
+    log.close()
+
+    log = HistoryLog(str(tmp_path))
+    records = list(log.records())
+
+    assert len(log) == 5
+    assert [(record.timestamp, record.duration, record.artist, record.album, record.title) for record in records][1] \
+        == (1100.0, 60001, "Artist 1", "Album 1", "Title 1")
+
+
+def test_segments_are_split_and_searched_by_time(tmp_path):
+    log = HistoryLog(str(tmp_path), segment_records=3)
+    fill(log, 10)
+    log.close()
+
+    assert [count for _, count in log.segments] == [3, 3, 3, 1]
+    assert [record.title for record in log.records(start=1250.0, end=1650.0)] == \
+        ["Title 3", "Title 4", "Title 5", "Title 6"]
+    assert list(log.records(start=5000.0)) == []
+
+
+def test_segment_file_format(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    log.append(1234.5, 1000, "Artist", "Album", "Title")
+    log.close()
+
+    with open(log.segments[0][0], "rb") as segment_file:
+        data = segment_file.read()
+
+    assert data[:len(SEGMENT_MAGIC)] == SEGMENT_MAGIC
+    timestamp, duration, artist_id, album_id, title_id = RECORD.unpack(data[len(SEGMENT_MAGIC):])
+    assert (timestamp, duration) == (1234.5, 1000)
+    assert [log.names.names[name_id] for name_id in (artist_id, album_id, title_id)] == ["Artist", "Album", "Title"]
+
+
+def append_partial_record(log):
+    path = log.segments[-1][0]
+    with open(path, "ab") as segment_file:
+        segment_file.write(b"\x01" * (RECORD.size // 2))
+    return path
+
+
+def test_partial_record_is_truncated_by_writer(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    fill(log, 2)
+    log.close()
+    path = append_partial_record(log)
+
+    log = HistoryLog(str(tmp_path))
+
+    assert len(log) == 2
+    assert os.path.getsize(path) == len(SEGMENT_MAGIC) + 2 * RECORD.size
+
+
+def test_partial_record_is_skipped_by_reader(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    fill(log, 2)
+    log.close()
+    path = append_partial_record(log)
+    size = os.path.getsize(path)
+
+    reader = HistoryLog(str(tmp_path), read_only=True)
+
+    assert [record.title for record in reader.records()] == ["Title 0", "Title 1"]
+    assert os.path.getsize(path) == size
+
+
+def test_read_only_log_is_not_written(tmp_path):
+    directory = str(tmp_path / "missing")
+    reader = HistoryLog(directory, read_only=True)
+
+    assert len(reader) == 0
+    with pytest.raises(io.UnsupportedOperation):
+        reader.append(1000.0, 1000, "Artist", "Album", "Title")
+    reader.close()
+    assert not os.path.exists(directory)
+
+
+def test_reader_sees_records_synced_by_writer(tmp_path):
+    writer = HistoryLog(str(tmp_path), sync_every=1)
+    fill(writer, 3)
+
+    reader = HistoryLog(str(tmp_path), read_only=True)
+
+    assert [record.title for record in reader.records()] == ["Title 0", "Title 1", "Title 2"]
+    writer.close()
+
+
+def test_aggregates(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    fill(log, 4)
+
+    aggregates = log.summarize()
+    assert aggregates.records == 4
+    assert aggregates.total_duration == 4 * 60000 + 6
+    assert log.top(aggregates.artists) == [("Artist 1", 2, 120004), ("Artist 0", 2, 120002)]
+    assert log.summarize(start=1200.0).records == 2
+
+
+def test_aggregates_are_rebuilt_from_records(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    fill(log, 4)
+    log.close()
+    os.remove(log.aggregates_filepath)
+
+    log = HistoryLog(str(tmp_path))
+
+    assert log.aggregates.records == 4
+    assert log.top(log.aggregates.albums, 1) == [("Album 0", 2, 120003)]
+
+
+class WallClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_recorder_records_played_time_without_pauses(tmp_path):
+    log = HistoryLog(str(tmp_path))
+    positions = iter([4, 5])
+    albums = []
+    recorder = HistoryRecorder(log, album_lookup=lambda title, position: albums.append(position) or "Album",
+                               wall_clock=WallClock(), position_lookup=lambda: next(positions))
+
+    recorder.on_event(TrackChanged("5. Artist - First - Winamp", 0, 100.0, ""))
+    recorder.on_event(Paused("5. Artist - First - Winamp", 30000, 130.0))
+    recorder.on_event(Resumed("5. Artist - First - Winamp", 30000, 200.0))
+    recorder.on_event(TrackChanged("6. Artist - Second - Winamp", 0, 220.0, "5. Artist - First - Winamp"))
+    # Skipped after less than min_duration
+    recorder.on_event(Stopped("6. Artist - Second - Winamp", None, 222.0))
+    log.sync()
+
+    records = list(log.records())
+    assert [(record.duration, record.artist, record.album, record.title) for record in records] == \
+        [(50000, "Artist", "Album", "First")]
+    # The album is looked up by the position the recorded track had, not the one of the track playing next
+    assert albums == [4]
@@ -0,0 +1,132 @@
+import json
+import re
+
+import pytest
+
+from instrumentation import LATENCY_BUCKETS, Histogram, Metrics, MetricsExporter
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_exposition(text):
+    """
+    Parse Prometheus text exposition format, checking that every sample belongs to a family declared before it and
+    that each family is declared once.
+
+    :return: Types by family name, and (name, labels, value) tuples of the samples
+    """
+
+    assert text.endswith("\n")
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, family, metric_type = line.split(" ")
+            assert family not in types
+            assert metric_type in ("counter", "gauge", "histogram")
+            types[family] = metric_type
+            continue
+        if line.startswith("# HELP "):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, value = match.group("name"), float(match.group("value"))
+        labels = dict(LABEL.findall(match.group("labels") or ""))
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert family in types, line
+        samples.append((name, labels, value))
+
+    return types, samples
+
+
+def test_histogram_bucket_counts():
+    histogram = Histogram()
+    for seconds in (0.00005, 0.0001, 0.0003, 0.003, 0.003, 4.0, 10.0):
+        histogram.observe(seconds)
+
+    buckets = histogram.to_dict()["buckets"]
+
+    assert list(buckets) == [repr(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+    # A value equal to a bound belongs to that bucket, and the counts are cumulative
+    assert buckets["0.0001"] == 2
+    assert buckets["0.0005"] == 3
+    assert buckets["0.0025"] == 3
+    assert buckets["0.005"] == 5
+    assert buckets["2.5"] == 5
+    assert buckets["5.0"] == 6
+    assert buckets["+Inf"] == 7
+    assert histogram.to_dict()["count"] == 7
+    assert histogram.to_dict()["sum"] == pytest.approx(14.00645)
+
+
+def test_errors_are_counted(clock):
+    metrics = Metrics(clock=clock)
+
+    with pytest.raises(ConnectionError):
+        with metrics.measure("send_command", "Play"):
+            clock.advance(0.002)
+            raise ConnectionError()
+    assert metrics.call("get_track_title", "", lambda: "title") == "title"
+
+    snapshot = metrics.snapshot()["operations"]
+    assert snapshot["send_command"]["Play"]["errors"] == 1
+    assert snapshot["send_command"]["Play"]["sum"] == pytest.approx(0.002)
+    assert snapshot["get_track_title"][""]["count"] == 1
+
+
+def test_tick_counts_messages_of_its_thread(clock):
+    metrics = Metrics(clock=clock)
+
+    metrics.begin_tick()
+    for _ in range(3):
+        metrics.record("send_user_command", "GetStatus", 0.001)
+    metrics.record("presence_update", "", 0.01)
+    clock.advance(0.005)
+    metrics.end_tick()
+
+    assert metrics.last_tick == {"calls": 3, "seconds": pytest.approx(0.003)}
+    assert metrics.snapshot()["calls_per_tick"] == 3
+
+
+def test_prometheus_textfile_is_valid(tmp_path, clock):
+    metrics = Metrics(clock=clock)
+    metrics.record("send_user_command", "GetStatus", 0.0002)
+    metrics.record("send_user_command", "GetStatus", 0.02, error=True)
+    metrics.record("presence_update", "", 0.3)
+    metrics.begin_tick()
+    metrics.record("send_user_command", "GetStatus", 0.0002)
+    clock.advance(0.001)
+    metrics.end_tick()
+    metrics.set_gauge("poll_rate", 1.5)
+
+    exporter = MetricsExporter(metrics, str(tmp_path))
+    exporter.export()
+    with open(tmp_path / "winamprpc.prom", encoding="utf8") as prom_file:
+        types, samples = parse_exposition(prom_file.read())
+
+    assert types == {"winamprpc_call_seconds": "histogram", "winamprpc_call_errors_total": "counter",
+                     "winamprpc_tick_seconds": "histogram", "winamprpc_tick_calls_total": "counter",
+                     "winamprpc_poll_rate": "gauge"}
+    values = {(name, tuple(sorted(labels.items()))): value for name, labels, value in samples}
+    status = (("name", "GetStatus"), ("operation", "send_user_command"))
+    assert values[("winamprpc_call_seconds_count", status)] == 3
+    assert values[("winamprpc_call_seconds_bucket", (("le", "0.00025"),) + status)] == 2
+    assert values[("winamprpc_call_seconds_bucket", (("le", "+Inf"),) + status)] == 3
+    assert values[("winamprpc_call_errors_total", status)] == 1
+    assert values[("winamprpc_tick_seconds_count", ())] == 1
+    assert values[("winamprpc_tick_calls_total", ())] == 1
+    assert values[("winamprpc_poll_rate", ())] == 1.5
+
+    # Buckets of every histogram are cumulative and end with +Inf equal to the count
+    buckets = {}
+    for name, labels, value in samples:
+        if name.endswith("_bucket"):
+            key = (name, tuple(sorted((k, v) for k, v in labels.items() if k != "le")))
+            buckets.setdefault(key, []).append((labels["le"], value))
+    for (name, labels), series in buckets.items():
+        assert [le for le, _ in series][-1] == "+Inf"
+        assert [value for _, value in series] == sorted(value for _, value in series)
+        assert series[-1][1] == values[(name.replace("_bucket", "_count"), labels)]
+
+    with open(tmp_path / "metrics.json", encoding="utf8") as json_file:
+        assert json.load(json_file)["gauges"] == {"poll_rate": 1.5}
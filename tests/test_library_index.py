@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from library_index import LibraryIndex
+from metadata import MetadataProvider, SOURCE_PATH, SOURCE_TAGS
+
+OLD_MTIME = 1_000_000_000
+
+
+def write_track(path, content, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def age_directories(root):
+    # Directories modified just before a scan are listed again on the next scan, so make them old
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (OLD_MTIME, OLD_MTIME))
+
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / "Music"
+    write_track(root / "Artist A" / "Album A" / "01 One.mp3", "Artist A|Album A")
+    write_track(root / "Artist A" / "Album A" / "02 Two.mp3", "Artist A|Album A")
+    write_track(root / "Artist B" / "Album B" / "01 Three.flac", "Artist B|Album B")
+    write_track(root / "Artist B" / "Album B" / "notes.txt", "Not a track")
+    return root
+
+
+@pytest.fixture
+def index(library, tmp_path, fake_tags):
+    index = LibraryIndex(str(tmp_path / "library.sqlite3"), [str(library)], workers=2)
+    yield index
+    index.close()
+
+
+def test_first_scan_reads_every_track(index, library, fake_tags):
+    result = index.rescan()
+
+    assert (result.added, result.updated, result.removed, result.tracks) == (3, 0, 0, 3)
+    assert len(fake_tags) == 3
+    metadata = index.get(str(library / "Artist B" / "Album B" / "01 Three.flac"))
+    assert (metadata.artist, metadata.album, metadata.source) == ("Artist B", "Album B", SOURCE_TAGS)
+    assert index.hits == 1
+
+
+def test_unchanged_tracks_are_not_read_again(index, library, fake_tags):
+    index.rescan()
+    fake_tags.clear()
+
+    result = index.rescan()
+
+    assert fake_tags == []
+    assert (result.added, result.updated, result.removed, result.tracks) == (0, 0, 0, 3)
+
+
+def test_unchanged_directories_are_not_listed(index, library, fake_tags):
+    age_directories(library)
+    index.rescan()
+    fake_tags.clear()
+
+    result = index.rescan()
+
+    assert result.directories == 5
+    assert result.changed_directories == 0
+    assert fake_tags == []
+
+
+def test_removed_tracks_and_directories_are_deleted(index, library):
+    index.rescan()
+    track = library / "Artist A" / "Album A" / "02 Two.mp3"
+    track.unlink()
+    for path in sorted((library / "Artist B").rglob("*"), reverse=True):
+        path.unlink() if path.is_file() else path.rmdir()
+    (library / "Artist B").rmdir()
+
+    result = index.rescan()
+
+    assert (result.removed, result.tracks) == (2, 1)
+    assert index.get(str(track)).source == SOURCE_PATH
+    assert index.get_cover(str(track)) is None
+
+
+def test_changed_tags_are_updated(index, library, fake_tags):
+    track = library / "Artist A" / "Album A" / "01 One.mp3"
+    index.rescan()
+    write_track(track, "Artist A|Album A (Remastered)", mtime=OLD_MTIME + 10)
+    fake_tags.clear()
+
+    result = index.rescan()
+
+    assert (result.added, result.updated) == (0, 1)
+    assert fake_tags == [str(track)]
+    assert index.get(str(track)).album == "Album A (Remastered)"
+    assert index.hits == 1
+
+
+def test_tag_edit_in_unchanged_directory_needs_full_scan(index, library, fake_tags):
+    track = library / "Artist A" / "Album A" / "01 One.mp3"
+    index.fallback = MetadataProvider()
+    age_directories(library)
+    index.rescan()
+    write_track(track, "Artist A|Edited", mtime=OLD_MTIME + 10)
+    age_directories(library)
+
+    assert index.rescan().updated == 0
+    # The index entry is stale, so the track is looked up from the fallback provider
+    assert index.get(str(track)).album == "Edited"
+    assert index.misses == 1
+
+    assert index.rescan(full=True).updated == 1
+    assert index.get(str(track)).album == "Edited"
+    assert index.hits == 1
+
+
+def test_cover_is_chosen_from_images(index, library):
+    album = library / "Artist A" / "Album A"
+    (album / "back.jpg").write_bytes(b"")
+    (album / "Folder.png").write_bytes(b"")
+
+    index.rescan()
+
+    assert index.get_cover(str(album / "01 One.mp3")) == str(album / "Folder.png")
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from metadata import MetadataProvider, SOURCE_PATH, SOURCE_TAGS, choose_cover, metadata_from_path
+
+
+def write_track(path, content, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def track(tmp_path):
+    track = tmp_path / "Music" / "Path Artist" / "Path Album" / "01 Track.mp3"
+    write_track(track, "Tag Artist|Tag Album", mtime=1_000_000_000)
+    return track
+
+
+@pytest.fixture
+def cache_filepath(tmp_path):
+    return str(tmp_path / "metadata_cache.json")
+
+
+def test_metadata_from_path():
+    metadata = metadata_from_path("C:\\Music\\Artist\\Album\\01 Track.mp3")
+
+    assert (metadata.artist, metadata.album, metadata.source) == ("Artist", "Album", SOURCE_PATH)
+    assert metadata_from_path("/music/Artist/Album/01 Track.mp3").album == "Album"
+
+
+def test_tags_are_read_once(track, cache_filepath, fake_tags):
+    provider = MetadataProvider(cache_filepath)
+
+    for _ in range(3):
+        metadata = provider.get(str(track))
+        assert (metadata.artist, metadata.album, metadata.source) == ("Tag Artist", "Tag Album", SOURCE_TAGS)
+
+    assert fake_tags == [str(track)]
+    assert (provider.hits, provider.misses) == (2, 1)
+
+
+@pytest.mark.parametrize("content, mtime", [("Tag Artist|Tag Album", 1_000_000_010),
+                                            ("Tag Artist|Other Album", 1_000_000_000)])
+def test_changed_file_is_read_again(track, cache_filepath, fake_tags, content, mtime):
+    provider = MetadataProvider(cache_filepath)
+    provider.get(str(track))
+
+    # Either the modification time or the size changes
+    write_track(track, content, mtime=mtime)
+
+    assert provider.get(str(track)).album == content.split("|")[1]
+    assert len(fake_tags) == 2
+
+
+def test_file_without_tags_falls_back_to_path(track, cache_filepath, fake_tags):
+    write_track(track, "")
+    provider = MetadataProvider(cache_filepath)
+
+    metadata = provider.get(str(track))
+
+    assert (metadata.artist, metadata.album, metadata.source) == ("Path Artist", "Path Album", SOURCE_PATH)
+    # The fallback result is cached too
+    provider.get(str(track))
+    assert len(fake_tags) == 1
+
+
+def test_missing_file_is_guessed_from_path(tmp_path, cache_filepath, fake_tags):
+    provider = MetadataProvider(cache_filepath)
+
+    assert provider.get(str(tmp_path / "Artist" / "Album" / "stream.mp3")).album == "Album"
+    assert fake_tags == []
+
+
+def test_cache_survives_flush_and_reload(track, cache_filepath, fake_tags):
+    provider = MetadataProvider(cache_filepath)
+    provider.get(str(track))
+    provider.flush()
+
+    reloaded = MetadataProvider(cache_filepath)
+    metadata = reloaded.get(str(track))
+
+    assert (metadata.artist, metadata.album, metadata.source) == ("Tag Artist", "Tag Album", SOURCE_TAGS)
+    assert fake_tags == [str(track)]
+    assert reloaded.hits == 1
+
+
+def test_cache_is_flushed_in_batches(tmp_path, cache_filepath, fake_tags, clock):
+    provider = MetadataProvider(cache_filepath, flush_every=3, flush_interval=60.0, clock=clock)
+    tracks = [tmp_path / "Artist" / "Album" / f"{i:02d}.mp3" for i in range(4)]
+    for track in tracks:
+        write_track(track, "Artist|Album")
+
+    provider.get(str(tracks[0]))
+    provider.get(str(tracks[1]))
+    assert not os.path.exists(cache_filepath)
+    provider.get(str(tracks[2]))
+    assert os.path.exists(cache_filepath)
+
+    provider.get(str(tracks[3]))
+    clock.advance(59.0)
+    provider.get(str(tracks[0]))
+    assert len(MetadataProvider(cache_filepath)._cache) == 3
+    # The entry waiting for the next batch is written by a hit after the flush interval
+    clock.advance(1.0)
+    provider.get(str(tracks[0]))
+    assert len(MetadataProvider(cache_filepath)._cache) == 4
+
+
+def test_corrupted_cache_is_rebuilt(track, cache_filepath, fake_tags, capsys):
+    with open(cache_filepath, "w", encoding="utf8") as cache_file:
+        cache_file.write("{not json")
+
+    provider = MetadataProvider(cache_filepath)
+
+    assert "corrupted" in capsys.readouterr().out
+    assert provider.get(str(track)).album == "Tag Album"
+
+
+def test_cover_preference():
+    assert choose_cover([]) is None
+    assert choose_cover(["scan.png", "Front.JPG", "folder.jpg"]) == "folder.jpg"
+    assert choose_cover(["b.png", "a.png"]) == "a.png"
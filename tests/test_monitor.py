@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from monitor import InstanceMonitor, MultiMonitor
+from payload import DEFAULT_SETTINGS, PayloadBuilder
+from winamp import MenuCommand
+from winamp_simulator import SIMULATED_WINDOW_ID, SimulatedWinamp, SimulatedWindows, generate_playlist
+
+INSTANCES = 50
+
+
+class RecordingPresence:
+    def __init__(self):
+        self.updates = []
+        self.clears = 0
+        self.closed = False
+
+    def update(self, **payload):
+        self.updates.append(payload)
+
+    def clear(self):
+        self.clears += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def windows(clock):
+    windows = SimulatedWindows.generate(INSTANCES, playlist_length=20, clock=clock)
+    for i, player in enumerate(windows.players.values()):
+        player.playlist_position = i % 20
+    return windows
+
+
+@pytest.fixture
+def presences():
+    return {}
+
+
+@pytest.fixture
+def multi_monitor(windows, presences, clock):
+    def create_monitor(winamp, slot):
+        settings = dict(DEFAULT_SETTINGS, small_asset_text=f"Instance {slot}")
+        presences[slot] = RecordingPresence()
+        return InstanceMonitor(winamp, presences[slot], PayloadBuilder(settings, winamp.version), clock=clock)
+
+    multi_monitor = MultiMonitor(create_monitor, windows, max_workers=4, clock=clock)
+    yield multi_monitor
+    multi_monitor.stop()
+
+
+def run_and_wait(multi_monitor, samples):
+    expected = multi_monitor.samples + samples
+    multi_monitor.run_due()
+    deadline = time.monotonic() + 5
+    while multi_monitor.samples < expected and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert multi_monitor.samples == expected
+
+
+def test_every_instance_has_own_slot_and_settings(windows, multi_monitor, presences):
+    for player in windows.players.values():
+        player.press(MenuCommand.Play)
+
+    run_and_wait(multi_monitor, INSTANCES)
+
+    assert multi_monitor.slots == {SIMULATED_WINDOW_ID + i: i for i in range(INSTANCES)}
+    for slot, presence in presences.items():
+        assert len(presence.updates) == 1
+        assert presence.updates[0]["small_text"] == f"Instance {slot}"
+        assert presence.updates[0]["details"] == f"Track {slot % 10 + 1}"
+
+
+def test_idle_instances_are_not_sampled(windows, multi_monitor, clock):
+    players = list(windows.players.values())
+    for player in players[::2]:
+        player.press(MenuCommand.Play)
+    run_and_wait(multi_monitor, INSTANCES)
+
+    for player in players:
+        player.reset_counters()
+    clock.advance(1)
+    run_and_wait(multi_monitor, INSTANCES // 2)
+
+    assert all(player.messages > 0 for player in players[::2])
+    assert all(player.messages == 0 for player in players[1::2])
+
+    clock.advance(4)
+    run_and_wait(multi_monitor, INSTANCES)
+    assert all(player.messages > 0 for player in players[1::2])
+
+
+def test_closed_window_presence_is_cleared(windows, multi_monitor, presences, clock):
+    for player in windows.players.values():
+        player.press(MenuCommand.Play)
+    run_and_wait(multi_monitor, INSTANCES)
+
+    windows.remove(SIMULATED_WINDOW_ID + 7)
+    clock.advance(multi_monitor.discovery_interval)
+    run_and_wait(multi_monitor, INSTANCES - 1)
+
+    assert presences[7].clears == 1
+    assert presences[7].closed
+    assert SIMULATED_WINDOW_ID + 7 not in multi_monitor.monitors
+    assert not any(presence.clears for slot, presence in presences.items() if slot != 7)
+
+    # A new client takes the free slot
+    windows.add(SimulatedWinamp(generate_playlist(20), window_id=SIMULATED_WINDOW_ID + INSTANCES, clock=clock))
+    multi_monitor.discover()
+    assert multi_monitor.slots[SIMULATED_WINDOW_ID + INSTANCES] == 7
+
+
+def test_slow_monitor_factory_does_not_block_sampling(windows, clock):
+    factory_entered, release_factory = threading.Event(), threading.Event()
+
+    def create_monitor(winamp, slot):
+        if winamp.window_id == SIMULATED_WINDOW_ID + INSTANCES:
+            factory_entered.set()
+            release_factory.wait(5)
+        return InstanceMonitor(winamp, RecordingPresence(), PayloadBuilder(DEFAULT_SETTINGS, winamp.version),
+                               clock=clock)
+
+    multi_monitor = MultiMonitor(create_monitor, windows, clock=clock)
+    try:
+        multi_monitor.discover()
+        windows.add(SimulatedWinamp(generate_playlist(20), window_id=SIMULATED_WINDOW_ID + INSTANCES, clock=clock))
+        discovery = threading.Thread(target=multi_monitor.discover)
+        discovery.start()
+        assert factory_entered.wait(5)
+
+        # The other players are sampled and a second discovery does not start the same window again
+        run_and_wait(multi_monitor, INSTANCES)
+        multi_monitor.discover()
+        release_factory.set()
+        discovery.join()
+        assert multi_monitor.slots[SIMULATED_WINDOW_ID + INSTANCES] == INSTANCES
+        assert len(multi_monitor.monitors) == INSTANCES + 1
+    finally:
+        release_factory.set()
+        multi_monitor.stop()
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from assets import AssetResolver
+from payload import DEFAULT_SETTINGS, PayloadBuilder
+from playlist import PlaylistCache
+
+TITLE = "1. Artist 0 - Track 1 - Winamp"
+
+
+class FailingPlaylistCache:
+    def __init__(self, error):
+        self.error = error
+
+    def get_path(self, track_position):
+        raise self.error
+
+
+class FailingMetadataProvider:
+    def get(self, track_path):
+        raise OSError(f"Could not read {track_path}")
+
+
+@pytest.fixture
+def asset_resolver(tmp_path, clock):
+    covers_path = tmp_path / "album_covers.json"
+    covers_path.write_text(json.dumps({"Album 0": "album_zero"}), encoding="utf8")
+    asset_resolver = AssetResolver(str(covers_path), str(tmp_path / "album_name_exceptions.txt"), clock=clock)
+    asset_resolver.load()
+    return asset_resolver
+
+
+def test_album_asset_is_resolved(winamp, simulator, asset_resolver):
+    builder = PayloadBuilder(DEFAULT_SETTINGS, "5.9", PlaylistCache(winamp, simulator.dump_filepath), asset_resolver)
+
+    payload = builder.build(TITLE, 0, 5000, 100.0)
+
+    assert payload == dict(details="Track 1", state="by Artist 0", start=95, large_image="album_zero",
+                           small_image="playbutton", large_text="Album 0", small_text="Playing")
+
+
+@pytest.mark.parametrize("error", [IndexError("list index out of range"), FileNotFoundError("Winamp.m3u8")])
+def test_failed_path_lookup_uses_default_asset(asset_resolver, error):
+    builder = PayloadBuilder(DEFAULT_SETTINGS, "5.9", FailingPlaylistCache(error), asset_resolver)
+
+    payload = builder.build(TITLE, 0, 0, 100.0)
+
+    assert (payload["large_image"], payload["large_text"]) == ("logo", "Winamp v5.9")
+    assert builder.album_art_errors == 1
+
+
+def test_failed_metadata_read_uses_default_asset(winamp, simulator, asset_resolver):
+    settings = dict(DEFAULT_SETTINGS, default_large_asset_text="album name")
+    builder = PayloadBuilder(settings, "5.9", PlaylistCache(winamp, simulator.dump_filepath), asset_resolver,
+                             metadata_provider=FailingMetadataProvider())
+
+    payload = builder.build(TITLE, 0, 0, 100.0)
+
+    assert (payload["large_image"], payload["large_text"]) == ("logo", "Winamp v5.9")
+
+
+def test_lost_winamp_connection_is_raised(asset_resolver):
+    builder = PayloadBuilder(DEFAULT_SETTINGS, "5.9", FailingPlaylistCache(ConnectionError("Winamp was closed")),
+                             asset_resolver)
+
+    with pytest.raises(ConnectionError):
+        builder.build(TITLE, 0, 0, 100.0)
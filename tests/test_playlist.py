@@ -0,0 +1,97 @@
+import pytest
+
+from playlist import PlaylistCache
+from winamp import MenuCommand, PlaylistEntry
+from winamp_simulator import generate_playlist
+
+
+def other_playlist(length):
+    return [PlaylistEntry(entry.path.replace("C:\\Music", "C:\\Other"), entry.duration, f"Other - {entry.title}")
+            for entry in generate_playlist(length)]
+
+
+def unreadable_memory(*args, **kwargs):
+    raise OSError("Memory is not readable")
+
+
+@pytest.fixture
+def dump_cache(winamp, simulator):
+    return PlaylistCache(winamp, simulator.dump_filepath, use_ipc=False)
+
+
+def test_paths_are_read_from_winamp(simulator, winamp):
+    playlist_cache = PlaylistCache(winamp, simulator.dump_filepath)
+
+    assert playlist_cache.get_path(3) == simulator.playlist[3].path
+    assert playlist_cache.dumps == 0
+
+
+def test_dump_is_reused_while_playlist_is_unchanged(simulator, dump_cache):
+    for position in range(len(simulator.playlist)):
+        assert dump_cache.get_path(position) == simulator.playlist[position].path
+
+    assert dump_cache.dumps == 1
+    assert dump_cache.reindexes == 1
+
+
+def test_entries_have_extinf_title_and_duration(simulator, dump_cache):
+    entry = dump_cache.get_entry(5)
+
+    assert (entry.path, entry.duration, entry.title) == \
+        (simulator.playlist[5].path, simulator.playlist[5].duration, simulator.playlist[5].title)
+
+
+def test_length_change_dumps_again(simulator, dump_cache):
+    dump_cache.get_path(0)
+    simulator.set_playlist(generate_playlist(25))
+
+    assert dump_cache.get_path(24) == simulator.playlist[24].path
+    assert dump_cache.dumps == 2
+
+
+def test_same_length_replacement_is_noticed(simulator, dump_cache):
+    dump_cache.get_path(0)
+    simulator.set_playlist(other_playlist(20))
+
+    assert dump_cache.get_path(7) == simulator.playlist[7].path
+    assert dump_cache.dumps == 2
+
+
+def test_same_length_replacement_is_noticed_from_title(simulator, dump_cache):
+    simulator.read_string = unreadable_memory
+    simulator.press(MenuCommand.Play)
+    dump_cache.get_path(0)
+    simulator.set_playlist(other_playlist(20))
+    simulator.press(MenuCommand.Play)
+
+    assert dump_cache.get_path(7) == simulator.playlist[7].path
+    assert dump_cache.dumps == 2
+
+
+def test_failing_memory_read_falls_back_to_dump(simulator, winamp):
+    simulator.read_string = unreadable_memory
+    playlist_cache = PlaylistCache(winamp, simulator.dump_filepath)
+
+    assert playlist_cache.get_path(2) == simulator.playlist[2].path
+    assert not playlist_cache.use_ipc
+    assert playlist_cache.dumps == 1
+
+
+def test_invalidate_forces_dump(dump_cache):
+    dump_cache.get_path(0)
+    dump_cache.invalidate()
+    dump_cache.get_path(0)
+
+    assert dump_cache.dumps == 2
+
+
+@pytest.mark.parametrize("use_ipc", [True, False])
+def test_positions_outside_playlist_are_rejected(winamp, simulator, use_ipc):
+    playlist_cache = PlaylistCache(winamp, simulator.dump_filepath, use_ipc=use_ipc)
+
+    with pytest.raises(IndexError):
+        playlist_cache.get_path(-1)
+    with pytest.raises(IndexError):
+        playlist_cache.get_entry(-1)
+    with pytest.raises(IndexError):
+        playlist_cache.get_path(20)
@@ -0,0 +1,70 @@
+import pytest
+
+from playlist import PlaylistCache
+from playlist_index import PlaylistIndex
+from winamp import PlayingStatus, PlaylistEntry
+
+TRACKS = [("The Beatles", "Abbey Road", "Come Together"),
+          ("The Beatles", "Help!", "Yesterday"),
+          ("Daft Punk", "Discovery", "One More Time"),
+          ("Miles Davis", "Kind of Blue", "So What"),
+          ("Boards of Canada", "Music Has the Right to Children", "Roygbiv")]
+
+
+def entry(artist, album, title):
+    return PlaylistEntry(f"C:\\Music\\{artist}\\{album}\\{title}.mp3", 200, f"{artist} - {title}")
+
+
+@pytest.fixture
+def index(simulator, winamp):
+    simulator.set_playlist([entry(*track) for track in TRACKS])
+    return PlaylistIndex(winamp, PlaylistCache(winamp, simulator.dump_filepath))
+
+
+@pytest.mark.parametrize("query, position", [
+    ("beatles yesterday", 1),
+    ("yesterday beatles", 1),
+    ("daft one more", 2),
+    ("miles wat", 3),
+    ("boards childrn", 4),
+    ("kind blue", 3),
+])
+def test_find_tracks(index, query, position):
+    assert index.find_tracks(query, 1)[0].position == position
+
+
+def test_matches_have_path_and_title(index, simulator):
+    match = index.find_tracks("roygbiv", 1)[0]
+
+    assert (match.path, match.title) == (simulator.playlist[4].path, simulator.playlist[4].title)
+
+
+def test_nothing_matches(index):
+    assert index.find_tracks("zzzzqqq") == []
+
+
+def test_appended_tracks_are_indexed_incrementally(index, simulator):
+    index.update()
+    simulator.set_playlist(simulator.playlist + [entry("Aphex Twin", "Drukqs", "Avril 14th")])
+
+    assert index.find_tracks("aphex avril", 1)[0].position == 5
+    assert index.rebuilds == 1
+    assert index.indexed_entries == 6
+
+
+def test_play_match_plays_the_best_match(index, simulator):
+    match = index.play_match("so what")
+
+    assert match.position == 3
+    assert simulator.playlist_position == 3
+    assert simulator.status == PlayingStatus.Playing
+
+
+def test_play_match_notices_tracks_swapped_in_the_middle(index, simulator):
+    index.update()
+    playlist = list(simulator.playlist)
+    playlist[1], playlist[3] = playlist[3], playlist[1]
+    simulator.set_playlist(playlist)
+
+    assert index.play_match("beatles yesterday").position == 3
+    assert simulator.playlist_position == 3
@@ -0,0 +1,92 @@
+import pytest
+
+from poll_scheduler import PollScheduler
+from timeline import PlaybackTimeline
+from winamp import PlayingStatus
+
+
+@pytest.fixture
+def scheduler(clock):
+    return PollScheduler(clock=clock)
+
+
+def playing_timeline(clock, position, length):
+    timeline = PlaybackTimeline()
+    timeline.reset(position, length, clock())
+    return timeline
+
+
+def test_playing_track_is_sampled_every_second(scheduler, clock):
+    timeline = playing_timeline(clock, 10000, 180000)
+
+    assert scheduler.next_interval(PlayingStatus.Playing, timeline) == 1.0
+    clock.advance(1.0)
+    assert scheduler.next_interval(PlayingStatus.Playing, timeline) == 1.0
+
+
+def test_last_two_seconds_are_sampled_ten_times_a_second(scheduler, clock):
+    timeline = playing_timeline(clock, 177500, 180000)
+
+    # The next sample is taken when the last two seconds start
+    assert scheduler.next_interval(PlayingStatus.Playing, timeline) == pytest.approx(0.5)
+    clock.advance(0.5)
+    for _ in range(20):
+        assert scheduler.next_interval(PlayingStatus.Playing, timeline) == pytest.approx(0.1)
+        clock.advance(0.1)
+
+
+def test_track_of_unknown_length_is_sampled_every_second(scheduler, clock):
+    timeline = playing_timeline(clock, 10000, 0)
+
+    assert scheduler.next_interval(PlayingStatus.Playing, timeline) == 1.0
+
+
+@pytest.mark.parametrize("max_idle_interval, expected", [
+    (5.0, [1.0, 2.0, 4.0, 5.0, 5.0]),
+    (60.0, [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]),
+])
+def test_idle_interval_doubles_up_to_maximum(clock, max_idle_interval, expected):
+    scheduler = PollScheduler(max_idle_interval=max_idle_interval, clock=clock)
+    intervals = []
+    for _ in expected:
+        intervals.append(scheduler.next_interval(PlayingStatus.Paused, PlaybackTimeline()))
+        clock.advance(intervals[-1])
+
+    assert intervals == expected
+
+
+def test_status_change_restarts_idle_interval(scheduler, clock):
+    timeline = playing_timeline(clock, 10000, 180000)
+    for _ in range(4):
+        clock.advance(scheduler.next_interval(PlayingStatus.Stopped, timeline))
+
+    assert scheduler.next_interval(PlayingStatus.Playing, timeline) == 1.0
+    assert scheduler.next_interval(PlayingStatus.Paused, timeline) == 1.0
+    scheduler.reset()
+    assert scheduler.next_interval(PlayingStatus.Paused, timeline) == 1.0
+
+
+def test_wakeups_stay_within_budget(clock):
+    scheduler = PollScheduler(wakeups_per_minute=120, burst=30, clock=clock)
+    start = clock()
+    timeline = PlaybackTimeline()
+
+    # Tracks of three seconds are sampled near their end almost all the time
+    while clock() - start < 600:
+        if timeline.length == 0 or timeline.predict(clock()) >= timeline.length:
+            timeline.reset(0, 3000, clock())
+        clock.advance(scheduler.next_interval(PlayingStatus.Playing, timeline))
+
+    assert scheduler.budget_delays > 0
+    assert scheduler.samples <= 120 * 10 + 30
+    assert scheduler.average_rate * 60 == pytest.approx(120, rel=0.05)
+
+
+def test_rates_are_reported(scheduler, clock):
+    assert scheduler.average_rate == 0.0
+    timeline = playing_timeline(clock, 10000, 180000)
+    for _ in range(30):
+        clock.advance(scheduler.next_interval(PlayingStatus.Playing, timeline))
+
+    assert scheduler.average_rate == pytest.approx(1.0)
+    assert scheduler.achieved_rate == pytest.approx(1.0)
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from assets import AssetResolver
+from payload import DEFAULT_SETTINGS, PayloadBuilder
+from playlist import PlaylistCache
+from prefetch import PayloadPrefetcher
+
+
+class LaggingPlaylistCache:
+    def get_path(self, track_position):
+        raise IndexError("list index out of range")
+
+
+def write_covers(path, album_covers):
+    path.write_text(json.dumps(album_covers), encoding="utf8")
+
+
+@pytest.fixture
+def covers_path(tmp_path):
+    path = tmp_path / "album_covers.json"
+    write_covers(path, {"Album 0": "first_cover"})
+    return path
+
+
+@pytest.fixture
+def prefetcher(winamp, simulator, clock, covers_path, tmp_path):
+    asset_resolver = AssetResolver(str(covers_path), str(tmp_path / "album_name_exceptions.txt"), clock=clock)
+    asset_resolver.load()
+    builder = PayloadBuilder(dict(DEFAULT_SETTINGS), "5.9", PlaylistCache(winamp, simulator.dump_filepath),
+                             asset_resolver)
+    return PayloadPrefetcher(builder, winamp)
+
+
+def build(prefetcher, track_pos, simulator):
+    title = f"{track_pos + 1}. {simulator.playlist[track_pos].title} - Winamp"
+    return prefetcher.build(title, track_pos, 0, 0.0)
+
+
+def test_cached_track_uses_cached_asset(prefetcher, simulator):
+    assert build(prefetcher, 0, simulator)["large_image"] == "first_cover"
+    assert build(prefetcher, 0, simulator)["large_image"] == "first_cover"
+    assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+
+
+def test_prefetched_tracks_are_hits(prefetcher, simulator):
+    prefetcher.prefetch_now(0)
+    assert prefetcher.prefetched == 5
+
+    assert build(prefetcher, 3, simulator)["large_image"] == "first_cover"
+    assert (prefetcher.hits, prefetcher.misses) == (1, 0)
+
+
+def test_reloaded_covers_reach_cached_tracks(prefetcher, simulator, clock, covers_path):
+    build(prefetcher, 0, simulator)
+    prefetcher.prefetch_now(0)
+
+    write_covers(covers_path, {"Album 0": "new_cover_for_album"})
+    clock.advance(5)
+
+    assert build(prefetcher, 0, simulator)["large_image"] == "new_cover_for_album"
+    assert build(prefetcher, 1, simulator)["large_image"] == "new_cover_for_album"
+    assert prefetcher.payload_builder.asset_resolver.reloads == 2
+
+
+def test_default_asset_of_failed_lookup_is_not_cached(prefetcher, simulator):
+    builder = prefetcher.payload_builder
+    playlist_cache = builder.playlist_cache
+    builder.playlist_cache = LaggingPlaylistCache()
+    assert build(prefetcher, 0, simulator)["large_image"] == "logo"
+
+    builder.playlist_cache = playlist_cache
+    assert build(prefetcher, 0, simulator)["large_image"] == "first_cover"
@@ -0,0 +1,198 @@
+import time
+
+import pytest
+
+from presence_scheduler import PresenceScheduler, TokenBucket
+
+
+class FakePresence:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def update(self, **payload):
+        if self.fail:
+            raise ConnectionError("Discord is closed")
+        self.calls.append(payload)
+
+    def clear(self):
+        self.calls.append(None)
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    bucket = TokenBucket(2, 0.5, clock)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.time_until_available() == pytest.approx(2.0)
+
+    clock.advance(2)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_does_not_exceed_capacity(clock):
+    bucket = TokenBucket(2, 1.0, clock)
+    clock.advance(100)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_only_latest_state_is_sent(clock):
+    presence = FakePresence()
+    scheduler = PresenceScheduler(presence, updates_per_interval=1, interval=10.0, clock=clock)
+
+    scheduler.update(details="first")
+    assert scheduler.flush()
+    scheduler.update(details="second")
+    scheduler.update(details="third")
+    assert not scheduler.flush()
+
+    clock.advance(10)
+    assert scheduler.flush()
+    assert presence.calls == [{"details": "first"}, {"details": "third"}]
+    assert scheduler.dropped == 1
+
+
+def test_identical_state_is_not_sent_again(clock):
+    presence = FakePresence()
+    scheduler = PresenceScheduler(presence, clock=clock)
+
+    scheduler.update(details="track")
+    scheduler.flush()
+    scheduler.update(details="track")
+
+    assert not scheduler.flush()
+    assert scheduler.deduplicated == 1
+
+    scheduler.reset()
+    scheduler.update(details="track")
+    assert scheduler.flush()
+
+
+def test_clear_is_sent(clock):
+    presence = FakePresence()
+    scheduler = PresenceScheduler(presence, clock=clock)
+
+    scheduler.update(details="track")
+    scheduler.flush()
+    scheduler.clear()
+    scheduler.flush()
+
+    assert presence.calls == [{"details": "track"}, None]
+
+
+def test_state_is_kept_until_client_is_attached(clock):
+    scheduler = PresenceScheduler(None, updates_per_interval=1, clock=clock)
+    scheduler.update(details="track")
+
+    assert not scheduler.flush()
+    assert scheduler.bucket.tokens == 1
+
+    presence = FakePresence()
+    scheduler.presence = presence
+    assert scheduler.flush()
+    assert presence.calls == [{"details": "track"}]
+    assert scheduler.errors == 0
+
+
+def test_client_errors_are_counted_and_reported(clock, capsys):
+    presence = FakePresence()
+    presence.fail = True
+    errors = []
+    scheduler = PresenceScheduler(presence, clock=clock)
+    scheduler.on_error = errors.append
+
+    scheduler.update(details="track")
+
+    assert not scheduler.flush()
+    assert scheduler.errors == 1
+    assert isinstance(errors[0], ConnectionError)
+    assert "Could not update Discord presence" in capsys.readouterr().out
+
+
+def test_failed_state_is_sent_again(clock, capsys):
+    presence = FakePresence()
+    presence.fail = True
+    scheduler = PresenceScheduler(presence, clock=clock)
+
+    scheduler.update(details="track")
+    assert not scheduler.flush()
+    assert not scheduler.flush()
+    # Retries of the same failure are reported once
+    assert capsys.readouterr().out.count("Could not update Discord presence") == 1
+
+    presence.fail = False
+    assert scheduler.flush()
+    assert presence.calls == [{"details": "track"}]
+    assert scheduler.errors == 2
+    assert scheduler.stats() == {"submitted": 1, "sent": 1, "dropped": 0, "deduplicated": 0, "errors": 2}
+
+
+class InterruptedPresence(FakePresence):
+    """
+    A presence client whose first update fails after a newer state has been submitted.
+    """
+
+    def __init__(self, scheduler_update):
+        super().__init__()
+        self.scheduler_update = scheduler_update
+
+    def update(self, **payload):
+        if self.scheduler_update is not None:
+            update, self.scheduler_update = self.scheduler_update, None
+            update()
+            raise ConnectionError("Discord is closed")
+        super().update(**payload)
+
+
+@pytest.mark.parametrize("newer", [{"details": "newer"}, {"details": "shown"}])
+def test_newer_state_replaces_failed_state(clock, newer):
+    scheduler = PresenceScheduler(FakePresence(), clock=clock)
+    scheduler.update(details="shown")
+    scheduler.flush()
+
+    presence = InterruptedPresence(lambda: scheduler.update(**newer))
+    scheduler.presence = presence
+    scheduler.update(details="failing")
+    assert not scheduler.flush()
+
+    scheduler.flush()
+    # A newer state identical to the shown one is not sent, and the failed state is not sent either
+    assert presence.calls == ([] if newer["details"] == "shown" else [newer])
+    assert scheduler.dropped == 1
+
+
+def test_each_submitted_state_is_counted_once(clock):
+    presence = FakePresence()
+    scheduler = PresenceScheduler(presence, updates_per_interval=1, interval=10.0, clock=clock)
+
+    scheduler.update(details="first")
+    scheduler.flush()
+    scheduler.update(details="second")
+    # Reverting to the shown state drops the pending state and skips this one
+    scheduler.update(details="first")
+    scheduler.update(details="third")
+    clock.advance(10)
+    scheduler.flush()
+
+    stats = scheduler.stats()
+    assert stats == {"submitted": 4, "sent": 2, "dropped": 1, "deduplicated": 1, "errors": 0}
+    assert stats["submitted"] == stats["sent"] + stats["dropped"] + stats["deduplicated"]
+
+
+def test_background_thread_sends_pending_state():
+    presence = FakePresence()
+    scheduler = PresenceScheduler(presence)
+    scheduler.start()
+    try:
+        scheduler.update(details="track")
+        for _ in range(500):
+            if presence.calls:
+                break
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert presence.calls == [{"details": "track"}]
@@ -0,0 +1,84 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from profiler import Profiler
+
+
+@pytest.fixture
+def profiler(tmp_path, clock):
+    return Profiler(str(tmp_path / "profiles"), trace_memory=False, clock=clock)
+
+
+def wait_in_profiled_function(started, release):
+    started.set()
+    release.wait(5)
+
+
+@pytest.fixture
+def waiter():
+    # The profiler does not sample the thread it runs in, so the samples are taken of another thread
+    started, release = threading.Event(), threading.Event()
+    thread = threading.Thread(target=wait_in_profiled_function, args=(started, release), name="Waiter")
+    thread.start()
+    started.wait(5)
+    yield thread
+    release.set()
+    thread.join()
+
+
+def test_collapsed_stacks_are_written(profiler, waiter):
+    profiler.rotate()
+    profiler.sample()
+    profiler.sample()
+
+    stacks_filepath, allocations_filepath = profiler.dump()
+
+    with open(stacks_filepath, encoding="utf8") as stacks_file:
+        lines = stacks_file.read().splitlines()
+    waiter = [line.rsplit(" ", 1) for line in lines if line.startswith("Waiter;")]
+    assert all("wait_in_profiled_function (test_profiler.py:" in stack for stack, _ in waiter)
+    assert sum(int(count) for _, count in waiter) == 2
+    with open(allocations_filepath, encoding="utf8") as allocations_file:
+        assert allocations_file.read() == "Memory tracing is disabled.\n"
+
+
+def test_only_latest_windows_are_kept(profiler, clock, waiter):
+    for _ in range(15):
+        profiler.rotate()
+        profiler.sample()
+        clock.advance(300.0)
+
+    assert len(profiler.ring) == 12
+    assert profiler.ring[0].started == 1000.0 + 3 * 300.0
+    assert sum(window.samples for window in profiler.ring) == 12
+    stacks = profiler.collapsed_stacks()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in stacks if line.startswith("Waiter;")) == 12
+
+
+def test_allocation_growth_is_reported(tmp_path, clock):
+    profiler = Profiler(str(tmp_path), clock=clock)
+    was_tracing = tracemalloc.is_tracing()
+    tracemalloc.start()
+    try:
+        profiler.rotate()
+        profiler.rotate()
+        grown = [bytearray(1000) for _ in range(100)]
+        clock.advance(300.0)
+        _, allocations_filepath = profiler.dump()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    (filename, _), size, count, _ = profiler.allocation_diff()[0]
+    assert filename.endswith("test_profiler.py")
+    assert size >= 100000
+    assert count >= 100
+    with open(allocations_filepath, encoding="utf8") as allocations_file:
+        assert "test_profiler.py" in allocations_file.read()
+    assert len(grown) == 100
+
+
+def test_default_sampling_is_ten_times_a_second(tmp_path):
+    assert Profiler(str(tmp_path)).sample_interval == 0.1
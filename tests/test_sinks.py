@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+
+import pytest
+
+from payload import DEFAULT_SETTINGS
+from sinks import JsonFileSink, NowPlaying, Sink, StatePublisher, TextFileSink, load_sinks
+
+
+def now_playing(title, artist="Artist"):
+    payload = {"details": title, "large_image": "album_key", "large_text": "Album"}
+    return NowPlaying(artist, title, 3, 1000.0, payload)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.001)
+
+
+class RecordingSink(Sink):
+    name = "recording"
+
+    def __init__(self, queue_size=1):
+        super().__init__(queue_size)
+        self.states = []
+
+    def write(self, state):
+        self.states.append(state)
+
+
+class BlockingSink(RecordingSink):
+    name = "blocking"
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, state):
+        self.entered.set()
+        self.release.wait(5)
+        super().write(state)
+
+
+class FailingSink(Sink):
+    name = "failing"
+
+    def write(self, state):
+        raise OSError("Disk is full")
+
+
+@pytest.fixture
+def publisher():
+    sinks = {"recording": RecordingSink(queue_size=10), "blocking": BlockingSink(), "failing": FailingSink()}
+    publisher = StatePublisher(list(sinks.values()))
+    publisher.start()
+    yield publisher, sinks
+    sinks["blocking"].release.set()
+    publisher.stop()
+
+
+def test_blocked_and_failing_sinks_do_not_delay_others(publisher):
+    publisher, sinks = publisher
+    states = [now_playing(f"Track {i}") for i in range(5)]
+
+    publisher.publish(states[0])
+    assert sinks["blocking"].entered.wait(5)
+    for state in states[1:]:
+        publisher.publish(state)
+
+    wait_until(lambda: len(sinks["recording"].states) == 5)
+    assert sinks["recording"].states == states
+    failing = sinks["failing"]
+    wait_until(lambda: failing.errors + failing.dropped == 5)
+    assert sinks["blocking"].states == []
+
+
+def test_full_queue_keeps_latest_state(publisher):
+    publisher, sinks = publisher
+    blocking = sinks["blocking"]
+    states = [now_playing(f"Track {i}") for i in range(5)]
+
+    publisher.publish(states[0])
+    assert blocking.entered.wait(5)
+    for state in states[1:]:
+        publisher.publish(state)
+    blocking.release.set()
+
+    wait_until(lambda: blocking.written == 2)
+    assert blocking.states == [states[0], states[-1]]
+    assert blocking.dropped == 3
+    assert publisher.stats()["blocking"] == {"written": 2, "dropped": 3, "errors": 0}
+
+
+def test_stop_writes_queued_states():
+    sink = RecordingSink(queue_size=3)
+    sink.submit(now_playing("First"))
+    sink.submit(None)
+
+    sink.start()
+    sink.stop()
+
+    assert [state and state.title for state in sink.states] == ["First", None]
+
+
+def test_text_file_uses_obs_text_format(tmp_path):
+    filepath = tmp_path / "now_playing.txt"
+    settings = dict(DEFAULT_SETTINGS, obs_text_file=str(filepath), obs_text_format="{title} by {artist} ({album})")
+    sink, = load_sinks(settings)
+    assert isinstance(sink, TextFileSink)
+
+    sink.write(now_playing("Song"))
+    assert filepath.read_text(encoding="utf8") == "Song by Artist (Album)"
+    # Missing values are empty
+    sink.write(now_playing("Song", artist=None))
+    assert filepath.read_text(encoding="utf8") == "Song by  (Album)"
+    sink.write(None)
+    assert filepath.read_text(encoding="utf8") == ""
+    assert not (tmp_path / "now_playing.txt.tmp").exists()
+
+
+def test_json_file_has_state(tmp_path):
+    filepath = tmp_path / "status.json"
+    sink = JsonFileSink(str(filepath))
+
+    sink.write(now_playing("Sång"))
+    status = json.loads(filepath.read_text(encoding="utf8"))
+    assert status.pop("updated") > 0
+    assert status == {"playing": True, "artist": "Artist", "title": "Sång", "playlist_position": 3, "start": 1000.0,
+                      "album": "Album", "asset_key": "album_key"}
+
+    sink.write(None)
+    status = json.loads(filepath.read_text(encoding="utf8"))
+    assert status["playing"] is False
@@ -0,0 +1,223 @@
+import asyncio
+import random
+import threading
+
+import pytest
+
+from supervisor import AioDiscordEndpoint, Backoff, ConnectionState, ConnectionSupervisor, DiscordEndpoint, Endpoint
+
+
+class FakeEndpoint(Endpoint):
+    def __init__(self, name, failures=0):
+        self.name = name
+        self.failures = failures
+        self.connects = 0
+        self.closes = 0
+        self.alive = False
+
+    def connect(self):
+        self.connects += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError(f"{self.name} is not running")
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closes += 1
+        self.alive = False
+
+
+def no_jitter_backoff():
+    return Backoff(initial=1.0, maximum=8.0, jitter=0.0)
+
+
+@pytest.fixture
+def endpoints():
+    return FakeEndpoint("winamp"), FakeEndpoint("discord")
+
+
+@pytest.fixture
+def supervisor(endpoints, clock):
+    return ConnectionSupervisor(list(endpoints), check_interval=5.0, backoff_factory=no_jitter_backoff, clock=clock)
+
+
+def test_backoff_grows_until_maximum():
+    backoff = no_jitter_backoff()
+
+    assert [backoff.next_delay() for _ in range(6)] == [1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+    backoff.reset()
+    assert backoff.next_delay() == 1.0
+
+
+def test_backoff_jitter_only_shortens_delays():
+    backoff = Backoff(initial=1.0, maximum=60.0, jitter=0.5, rng=random.Random(0))
+
+    for failure in range(10):
+        delay = min(60.0, 2.0 ** failure)
+        assert delay * 0.5 <= backoff.next_delay() <= delay
+
+
+def test_connects_every_endpoint(supervisor, endpoints):
+    events = []
+    supervisor.subscribe(events.append)
+
+    assert supervisor.check() == 5.0
+    assert supervisor.connected
+    assert supervisor.wait_until_connected(0)
+    assert [(event.endpoint, event.state) for event in events] == [
+        ("winamp", ConnectionState.Connecting), ("winamp", ConnectionState.Connected),
+        ("discord", ConnectionState.Connecting), ("discord", ConnectionState.Connected)]
+
+
+def test_failed_connects_back_off(supervisor, endpoints, clock):
+    winamp, discord = endpoints
+    winamp.failures = 3
+
+    assert supervisor.check() == 1.0
+    assert not supervisor.connected
+    clock.advance(1.0)
+    assert supervisor.check() == 2.0
+    clock.advance(1.0)
+    # The next attempt is not due yet
+    assert supervisor.check() == 1.0
+    assert winamp.connects == 2
+    clock.advance(1.0)
+    assert supervisor.check() == 4.0
+    clock.advance(4.0)
+    supervisor.check()
+
+    assert supervisor.connected
+    assert winamp.connects == 4
+    assert discord.connects == 1
+    assert supervisor.backoffs["winamp"].failures == 0
+
+
+def test_reported_failure_reconnects_immediately(supervisor, endpoints):
+    winamp, discord = endpoints
+    supervisor.check()
+    events = []
+    supervisor.subscribe(events.append)
+    error = ConnectionError("Winamp was closed")
+
+    supervisor.report_failure(winamp, error)
+
+    assert supervisor.states["winamp"] == ConnectionState.Disconnected
+    assert not supervisor.connected
+    assert events[0].error is error
+    assert winamp.closes == 1
+    assert supervisor.check() == 5.0
+    assert supervisor.connected
+    assert winamp.connects == 2
+    assert discord.connects == 1
+
+
+def test_failure_of_disconnected_endpoint_is_ignored(supervisor, endpoints):
+    winamp, _ = endpoints
+    winamp.failures = 1
+    supervisor.check()
+
+    supervisor.report_failure(winamp, ConnectionError())
+
+    assert winamp.closes == 1
+    assert supervisor.backoffs["winamp"].failures == 1
+
+
+def test_lost_connection_is_noticed_by_check(supervisor, endpoints, clock):
+    _, discord = endpoints
+    supervisor.check()
+
+    discord.alive = False
+    clock.advance(5.0)
+    supervisor.check()
+
+    assert discord.connects == 2
+    assert supervisor.connected
+
+
+def test_failed_presence_update_reconnects_discord(clock):
+    class Client:
+        def connect(self):
+            pass
+
+        def close(self):
+            pass
+
+    clients = []
+    discord = DiscordEndpoint(lambda: clients.append(Client()) or clients[-1])
+    supervisor = ConnectionSupervisor([discord], clock=clock)
+    supervisor.check()
+
+    discord.mark_failed(ConnectionResetError())
+    supervisor.check()
+
+    assert len(clients) == 2
+    assert discord.client is clients[1]
+    assert supervisor.connected
+
+
+class AioClient:
+    def __init__(self, loop, fail=False):
+        self.loop = loop
+        self.fail = fail
+        self.connected = False
+        self.closed_on_loop = None
+
+    async def connect(self):
+        assert asyncio.get_running_loop() is self.loop
+        if self.fail:
+            raise ConnectionRefusedError("Discord is not running")
+        self.connected = True
+
+    def close(self):
+        self.closed_on_loop = threading.get_ident() == self.loop.thread_id
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+
+    def run():
+        loop.thread_id = threading.get_ident()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def run_on_loop(loop, func):
+    done = threading.Event()
+    loop.call_soon_threadsafe(lambda: (func(), done.set()))
+    assert done.wait(5)
+
+
+def test_aio_discord_is_connected_in_its_loop(loop, clock):
+    failures = [True, False, False]
+    clients = []
+    discord = AioDiscordEndpoint(lambda: clients.append(AioClient(loop, failures.pop(0))) or clients[-1], loop)
+    supervisor = ConnectionSupervisor([discord], backoff_factory=no_jitter_backoff, clock=clock)
+
+    assert supervisor.check() == 1.0
+    assert not supervisor.connected
+    # The failed client is closed in the thread of the loop
+    run_on_loop(loop, lambda: None)
+    assert clients[0].closed_on_loop
+
+    clock.advance(1.0)
+    supervisor.check()
+    assert supervisor.connected
+    assert discord.client is clients[1] and clients[1].connected
+
+    # A failed presence update makes the supervisor connect a new client
+    discord.mark_failed(ConnectionResetError())
+    supervisor.check()
+    run_on_loop(loop, lambda: None)
+    assert clients[1].closed_on_loop
+    assert discord.client is clients[2] and clients[2].connected
+    assert supervisor.connected
@@ -0,0 +1,65 @@
+from timeline import PlaybackTimeline
+
+
+def test_position_is_predicted_while_playing():
+    timeline = PlaybackTimeline()
+    timeline.reset(10000, 200000, now=100.0)
+
+    assert timeline.predict(102.5) == 12500
+
+
+def test_pause_freezes_and_resume_continues():
+    timeline = PlaybackTimeline()
+    timeline.reset(0, 200000, now=100.0)
+
+    timeline.pause(105.0)
+    assert timeline.predict(200.0) == 5000
+    timeline.resume(200.0)
+    assert timeline.predict(201.0) == 6000
+
+
+def test_small_drift_is_ignored():
+    timeline = PlaybackTimeline(drift_threshold=2000)
+    timeline.reset(0, 200000, now=100.0)
+
+    assert timeline.observe(11500, 110.0) is None
+    assert timeline.predict(110.0) == 10000
+
+
+def test_seek_is_accepted_when_next_sample_agrees():
+    timeline = PlaybackTimeline()
+    timeline.reset(0, 200000, now=100.0)
+
+    assert timeline.observe(60000, 101.0) is None
+    assert timeline.observe(61000, 102.0) == 61000
+    assert timeline.predict(103.0) == 62000
+    assert timeline.corrections == 1
+
+
+def test_single_bogus_sample_does_not_move_timeline():
+    timeline = PlaybackTimeline()
+    timeline.reset(0, 200000, now=100.0)
+
+    assert timeline.observe(90000, 101.0) is None
+    assert timeline.observe(2000, 102.0) is None
+    assert timeline.predict(102.0) == 2000
+    assert timeline.corrections == 0
+
+
+def test_impossible_positions_are_rejected():
+    timeline = PlaybackTimeline(length_tolerance=5000)
+    timeline.reset(4294967000, 200000, now=100.0)
+
+    assert timeline.predict(100.0) == 0
+    assert timeline.observe(-1, 101.0) is None
+    assert timeline.observe(206000, 102.0) is None
+    assert timeline.rejected == 3
+
+
+def test_cleared_timeline_predicts_nothing():
+    timeline = PlaybackTimeline()
+    timeline.reset(0, 200000, now=100.0)
+    timeline.clear()
+
+    assert timeline.predict(101.0) is None
+    assert timeline.observe(1000, 101.0) is None
@@ -0,0 +1,38 @@
+import pytest
+
+from title_parser import ParsedTitle, parse_title, unscroll_title
+
+
+@pytest.mark.parametrize("window_text, expected", [
+    ("12. Artist - Track - Winamp", ParsedTitle(12, "Artist", "Track", " - Winamp")),
+    ("Artist - Track - Winamp [Paused]", ParsedTitle(None, "Artist", "Track", " - Winamp [Paused]")),
+    ("3. Track - Winamp [Stopped]", ParsedTitle(3, None, "Track", " - Winamp [Stopped]")),
+    ("1. A - B - C - Winamp", ParsedTitle(1, "A", "B - C", " - Winamp")),
+    ("1. Artist - Track - Winamp [Angehalten]", ParsedTitle(1, "Artist", "Track", " - Winamp [Angehalten]")),
+    ("Winamp 5.9", ParsedTitle(None, None, "Winamp 5.9", "")),
+    ("1. Исполнитель - 曲名 - Winamp", ParsedTitle(1, "Исполнитель", "曲名", " - Winamp")),
+])
+def test_parse_title(window_text, expected):
+    assert parse_title(window_text) == expected
+
+
+def test_playlist_position_starts_from_zero():
+    assert parse_title("7. Artist - Track - Winamp").playlist_position == 6
+    assert parse_title("Artist - Track - Winamp").playlist_position is None
+
+
+def scroll(text, offset):
+    text = f"{text} *** "
+    return text[offset:] + text[:offset]
+
+
+@pytest.mark.parametrize("offset", [0, 5, 20, 26, 27, 28, 29, 30])
+def test_scrolled_title_is_restored(offset):
+    title = "4. Artist - Track - Winamp"
+
+    assert unscroll_title(scroll(title, offset)) == title
+    assert parse_title(scroll(title, offset)) == ParsedTitle(4, "Artist", "Track", " - Winamp")
+
+
+def test_unscrolled_title_is_kept():
+    assert unscroll_title("1. Artist - Track *Live* - Winamp") == "1. Artist - Track *Live* - Winamp"
@@ -0,0 +1,92 @@
+import pytest
+
+from winamp import MenuCommand, PlayingStatus, Winamp, parse_extinf
+
+PLAYLIST = ("#EXTM3U\r\n"
+            "#EXTINF:215,Artist - First Track\r\n"
+            "C:\\Music\\Artist\\Album\\01 First Track.mp3\r\n"
+            "\r\n"
+            "C:\\Music\\Artist\\Album\\02 Без названия.flac\r\n"
+            "#EXTINF:-1,Stream, with comma\r\n"
+            "http://example.com/stream\r\n")
+
+
+@pytest.fixture
+def playlist_file(tmp_path):
+    path = tmp_path / "playlist.m3u8"
+    path.write_text(PLAYLIST, encoding="utf-8-sig", newline="")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64 * 1024])
+def test_iter_playlist_parses_entries(playlist_file, chunk_size):
+    entries = [(entry.path, entry.duration, entry.title)
+               for entry in Winamp.iter_playlist(playlist_file, chunk_size=chunk_size)]
+
+    assert entries == [("C:\\Music\\Artist\\Album\\01 First Track.mp3", 215, "Artist - First Track"),
+                       ("C:\\Music\\Artist\\Album\\02 Без названия.flac", -1, None),
+                       ("http://example.com/stream", -1, "Stream, with comma")]
+
+
+def test_get_playlist_returns_paths(playlist_file):
+    assert Winamp.get_playlist(playlist_file) == [entry.path for entry in Winamp.iter_playlist(playlist_file)]
+
+
+def test_parse_extinf():
+    assert parse_extinf("#EXTINF:180,Artist - Title") == (180, "Artist - Title")
+    assert parse_extinf("#EXTINF:180") == (180, None)
+
+
+def test_commands_control_the_player(simulator, winamp):
+    winamp.set_volume(128)
+    winamp.change_track(4)
+    winamp.send_command(MenuCommand.Play)
+
+    assert winamp.get_volume() == 128
+    assert winamp.get_playlist_position() == 4
+    assert winamp.get_playing_status() == PlayingStatus.Playing
+    assert winamp.get_playlist_length() == 20
+    assert winamp.version == "5.90"
+
+
+def test_snapshot(simulator, winamp, clock):
+    stopped = winamp.snapshot()
+    assert stopped.status == PlayingStatus.Stopped
+    assert stopped.position is None
+
+    simulator.press(MenuCommand.Play)
+    clock.advance(2.5)
+    playing = winamp.snapshot()
+
+    assert playing.status == PlayingStatus.Playing
+    assert playing.title == "1. Artist 0 - Track 1 - Winamp"
+    assert (playing.playlist_position, playing.playlist_length) == (0, 20)
+    assert playing.position == 2500
+    assert playing.length == simulator.playlist[0].duration * 1000
+    assert (playing.sample_rate, playing.bitrate, playing.channels) == (44, 320, 2)
+
+
+def test_playlist_entries_are_read_from_memory(simulator, winamp):
+    entry = winamp.get_playlist_entry(3)
+
+    assert (entry.path, entry.title) == (simulator.playlist[3].path, simulator.playlist[3].title)
+    assert [entry.path for entry in winamp.iter_playlist_entries(18)] == \
+        [simulator.playlist[18].path, simulator.playlist[19].path]
+    with pytest.raises(IndexError):
+        winamp.get_playlist_file(20)
+
+
+def test_restarted_winamp_must_be_connected_again(simulator, winamp):
+    simulator.restart()
+
+    assert not winamp.is_connected()
+    winamp.connect()
+    assert winamp.is_connected()
+
+
+def test_commands_need_a_connection(simulator):
+    simulator.running = False
+    winamp = Winamp(simulator)
+
+    with pytest.raises(ConnectionError):
+        winamp.get_playing_status()
@@ -0,0 +1,175 @@
+"""
+Playback timeline model. Use PlaybackTimeline to predict the track position from a monotonic clock and to tell real
+seeks and drift apart from bogus positions Winamp reports for a moment when a track starts.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from typing import (
+    Optional,
+    Tuple
+)
+
+
+class PlaybackTimeline:
+    """
+    A model of the current track's playback position. The position is anchored to a sample and predicted from the
+    time passed since, while the track is playing.
+
+    Sampled positions are compared to the prediction. A sample that cannot be a position in the track is rejected. A
+    sample that differs from the prediction more than the drift threshold is only accepted when the next sample agrees
+    with it, so a single bogus value never moves the timeline, but a seek is accepted one sample after it happens.
+    """
+
+    def __init__(self, drift_threshold: int = 2000, length_tolerance: int = 5000):
+        """
+        :param drift_threshold: Difference in milliseconds between predicted and sampled position that is corrected
+        :param length_tolerance: How much in milliseconds a sample may exceed the track length and still be accepted
+        """
+        self.drift_threshold = drift_threshold
+        self.length_tolerance = length_tolerance
+        self.length = 0
+        self.playing = False
+
+        self.rejected = 0
+        """
+        Number of samples rejected as impossible positions.
+        """
+        self.corrections = 0
+        """
+        Number of times the timeline was moved to a confirmed sample.
+        """
+
+        self._anchor_position = None
+        self._anchor_time = None
+        self._candidate: Optional[Tuple[int, float]] = None
+
+    def reset(self, position: Optional[int], length: int, now: float):
+        """
+        Start the timeline for a new track.
+
+        :param position: Sampled position in milliseconds, or None if not known. Impossible positions are treated as
+        the beginning of the track.
+        :param length: Track length in milliseconds, or 0 or less if not known
+        :param now: Monotonic clock time in seconds
+        """
+
+        self.length = length
+        self.playing = True
+        self._candidate = None
+        if position is None or not self.is_plausible(position):
+            if position is not None:
+                self.rejected += 1
+            position = 0
+        self._anchor_position, self._anchor_time = position, now
+
+    def clear(self):
+        """
+        Forget the current track.
+        """
+        self.playing = False
+        self._anchor_position = self._anchor_time = None
+        self._candidate = None
+
+    def pause(self, now: float):
+        """
+        Freeze the timeline to the predicted position.
+
+        :param now: Monotonic clock time in seconds
+        """
+
+        if self.playing and self._anchor_position is not None:
+            self._anchor_position, self._anchor_time = self.predict(now), now
+        self.playing = False
+        self._candidate = None
+
+    def resume(self, now: float):
+        """
+        Continue the timeline from the position it was paused at.
+
+        :param now: Monotonic clock time in seconds
+        """
+
+        if not self.playing and self._anchor_position is not None:
+            self._anchor_time = now
+        self.playing = True
+
+    def predict(self, now: float) -> Optional[int]:
+        """
+        Predict the track position.
+
+        :param now: Monotonic clock time in seconds
+        :return: Predicted position in milliseconds, or None if the timeline has no track
+        """
+
+        if self._anchor_position is None:
+            return None
+        if not self.playing:
+            return self._anchor_position
+
+        return self._anchor_position + int((now - self._anchor_time) * 1000)
+
+    def is_plausible(self, position: int) -> bool:
+        """
+        :param position: Sampled position in milliseconds
+        :return: True if the position can be a position in the current track
+        """
+
+        if position < 0:
+            return False
+
+        return self.length <= 0 or position <= self.length + self.length_tolerance
+
+    def observe(self, position: int, now: float) -> Optional[int]:
+        """
+        Compare a sampled position to the prediction.
+
+        :param position: Sampled position in milliseconds
+        :param now: Monotonic clock time in seconds
+        :return: The corrected position in milliseconds if the timeline was moved, otherwise None
+        """
+
+        predicted = self.predict(now)
+        if predicted is None:
+            return None
+        if not self.is_plausible(position):
+            self.rejected += 1
+            return None
+
+        if abs(position - predicted) <= self.drift_threshold:
+            self._candidate = None
+            return None
+
+        if self._candidate is not None:
+            candidate_position, candidate_time = self._candidate
+            expected = candidate_position + (int((now - candidate_time) * 1000) if self.playing else 0)
+            if abs(position - expected) <= self.drift_threshold:
+                self._candidate = None
+                self._anchor_position, self._anchor_time = position, now
+                self.corrections += 1
+                return position
+
+        self._candidate = (position, now)
+        return None
@@ -0,0 +1,127 @@
+"""
+Parser for Winamp window titles. Use parse_title to split the window text into track number, artist and track name.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+TITLE_PATTERN = re.compile(
+    r"^(?:(?P<number>\d+)\.\s)?"  # Playlist number, shown if enabled in Winamp preferences
+    r"(?P<body>.*?)"
+    r"(?P<suffix>\s-\sWinamp(?:\s\[[^\]]*\])?)?$",  # Application name and possibly localized playing status
+    re.DOTALL
+)
+ARTIST_SEPARATOR = " - "
+SCROLL_SEPARATOR = "*** "
+"""
+Separator between repetitions of the title when Winamp scrolls the title in the taskbar.
+"""
+
+
+class ParsedTitle:
+    """
+    A class representing a parsed Winamp window title.
+    """
+
+    __slots__ = ("number", "artist", "title", "suffix")
+
+    def __init__(self, number: Optional[int], artist: Optional[str], title: str, suffix: str):
+        """
+        :param number: Track number in the playlist starting from 1, or None if it is not shown
+        :param artist: The artist, or None if the title has no artist
+        :param title: The track name
+        :param suffix: The application name and playing status after the track name, e.g. ' - Winamp [Paused]'
+        """
+        self.number = number
+        self.artist = artist
+        self.title = title
+        self.suffix = suffix
+
+    @property
+    def playlist_position(self) -> Optional[int]:
+        """
+        Track position in the playlist starting from 0, or None if the title does not show the track number.
+        """
+        return self.number - 1 if self.number is not None else None
+
+    def __repr__(self) -> str:
+        return (f"ParsedTitle(number={self.number!r}, artist={self.artist!r}, title={self.title!r}, "
+                f"suffix={self.suffix!r})")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ParsedTitle):
+            return NotImplemented
+
+        return (self.number, self.artist, self.title, self.suffix) == \
+            (other.number, other.artist, other.title, other.suffix)
+
+    def __hash__(self) -> int:
+        return hash((self.number, self.artist, self.title, self.suffix))
+
+
+def unscroll_title(window_text: str) -> str:
+    """
+    Restore a title scrolled in the taskbar to its original form. Winamp scrolls the title by rotating text
+    '{title} *** ' one character at a time.
+
+    :param window_text: Window text that may be scrolled
+    :return: The title in its original form, or the window text as is if it is not scrolled
+    """
+
+    if "*" not in window_text:
+        return window_text
+
+    # The separator may be split between the end and the beginning of the text
+    doubled = window_text + window_text
+    index = doubled.find(SCROLL_SEPARATOR)
+    if index == -1 or index >= len(window_text):
+        return window_text
+
+    start = index + len(SCROLL_SEPARATOR)
+    return doubled[start:start + len(window_text) - len(SCROLL_SEPARATOR)].strip()
+
+
+@lru_cache(maxsize=1024)
+def parse_title(window_text: str) -> ParsedTitle:
+    """
+    Parse a Winamp window title. Results are cached, so the returned objects must not be modified.
+
+    :param window_text: Winamp window text, usually in format '{track number}. {artist} - {track name} - Winamp'
+    :return: The parsed title
+    """
+
+    match = TITLE_PATTERN.match(window_text)
+    # A scrolled title ends with the suffix when the separator has just scrolled to the beginning
+    if "*" in window_text and (match.group("suffix") is None or window_text.lstrip().startswith(SCROLL_SEPARATOR)):
+        match = TITLE_PATTERN.match(unscroll_title(window_text))
+    number, body, suffix = match.group("number", "body", "suffix")
+    artist, separator, title = body.partition(ARTIST_SEPARATOR)
+    if not separator:
+        artist, title = None, body
+
+    return ParsedTitle(int(number) if number is not None else None, artist, title, suffix or "")
@@ -27,17 +27,19 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import threading
 from enum import Enum
 from typing import (
     Tuple,
     Union,
     Optional,
-    List
+    List,
+    Iterator,
+    Type,
+    Callable,
+    Hashable
 )
 
-import win32api
-import win32gui
-
 WM_COMMAND = 0x0111
 """
 First slot for menu control messages in Windows API.
@@ -46,6 +48,10 @@ WM_USER = 0x400
 """
 First slot for user defined messages in Windows API.
 """
+WINAMP_WINDOW_CLASS = "Winamp v1.x"
+"""
+Window class name of the Winamp main window.
+"""
 
 
 class MenuCommand(Enum):
@@ -143,7 +149,8 @@ class UserCommand(Enum):
     """
     SetVolume = 122
     """
-    Set the playback volume to value specified in data. The range is between 0 (muted) and 255 (max volume).
+    Set the playback volume to value specified in data. The range is between 0 (muted) and 255 (max volume). If data
+    is -666, the current volume is returned instead.
     """
     PlaylistLength = 124
     """
@@ -158,6 +165,20 @@ class UserCommand(Enum):
     Get technical information about the current track. Data values give following results: 0 for samplerate, 1 for 
     bitrate and 2 for number of channels.
     """
+    GetPlaylistTitleW = 213
+    """
+    Get the address of the display title of the playlist entry at index specified in data, as a null terminated
+    UTF-16 string in Winamp's memory. Returns 0 if the index is not in the playlist.
+    """
+    GetPlaylistFileW = 214
+    """
+    Get the address of the file path of the playlist entry at index specified in data, as a null terminated UTF-16
+    string in Winamp's memory. Returns 0 if the index is not in the playlist.
+    """
+    GetShuffle = 250
+    """
+    Get the shuffle status. Returns 1 if shuffle is on, otherwise 0.
+    """
 
 
 class PlayingStatus(Enum):
@@ -228,12 +249,310 @@ class CurrentTrack(Track):
         self.playlist_position = playlist_position
 
 
+class PlayerSnapshot:
+    """
+    An immutable record of the player state read in a single pass, see Winamp.snapshot().
+    """
+
+    __slots__ = ("status", "title", "playlist_position", "playlist_length", "position", "length", "sample_rate",
+                 "bitrate", "channels")
+
+    def __init__(self,
+                 status: PlayingStatus,
+                 title: str,
+                 playlist_position: Optional[int],
+                 playlist_length: int,
+                 position: Optional[int],
+                 length: int,
+                 sample_rate: int,
+                 bitrate: int,
+                 channels: int
+                 ):
+        """
+        :param status: The playing status
+        :param title: The Winamp window text
+        :param playlist_position: Track position in the playlist starting from 0, or None if no track is selected
+        :param playlist_length: Number of tracks in the playlist
+        :param position: Track position in milliseconds, or None if stopped or no track is selected
+        :param length: The track length in milliseconds, or 0 if stopped
+        :param sample_rate: The track sample rate, or 0 if stopped
+        :param bitrate: The track bitrate, or 0 if stopped
+        :param channels: Number of channels in the track, or 0 if stopped
+        """
+        set_field = object.__setattr__
+        set_field(self, "status", status)
+        set_field(self, "title", title)
+        set_field(self, "playlist_position", playlist_position)
+        set_field(self, "playlist_length", playlist_length)
+        set_field(self, "position", position)
+        set_field(self, "length", length)
+        set_field(self, "sample_rate", sample_rate)
+        set_field(self, "bitrate", bitrate)
+        set_field(self, "channels", channels)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return (f"PlayerSnapshot(status={self.status}, title={self.title!r}, "
+                f"playlist_position={self.playlist_position!r}, playlist_length={self.playlist_length!r}, "
+                f"position={self.position!r}, length={self.length!r})")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PlayerSnapshot):
+            return NotImplemented
+
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, field) for field in self.__slots__))
+
+
+class PlaylistEntry:
+    """
+    A class representing a single entry in a playlist file.
+    """
+
+    __slots__ = ("path", "duration", "title")
+
+    def __init__(self, path: str, duration: int = -1, title: Optional[str] = None):
+        """
+        :param path: Absolute path to the track
+        :param duration: The track length in seconds as written in the playlist, or -1 if it is not known
+        :param title: The display title of the track in the playlist, or None if the playlist has no title for it
+        """
+        self.path = path
+        self.duration = duration
+        self.title = title
+
+    def __repr__(self) -> str:
+        return f"PlaylistEntry(path={self.path!r}, duration={self.duration!r}, title={self.title!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PlaylistEntry):
+            return NotImplemented
+
+        return (self.path, self.duration, self.title) == (other.path, other.duration, other.title)
+
+
+def parse_extinf(line: str) -> Tuple[int, Optional[str]]:
+    """
+    Parse an #EXTINF line of an extended M3U playlist.
+
+    :param line: The line in format '#EXTINF:{duration},{title}'
+    :return: The duration in seconds, or -1 if it is not known, and the display title or None if it is empty
+    """
+
+    info = line[len("#EXTINF:"):]
+    duration, _, title = info.partition(",")
+    try:
+        duration = int(duration)
+    except ValueError:
+        try:
+            duration = int(float(duration))
+        except ValueError:
+            duration = -1
+
+    return duration, title or None
+
+
 class NoTrackSelectedError(Exception):
     """
     Exception raised when track is not selected in Winamp and one is required for requested operation.
     """
 
 
+def _command_name(command_enum: Type[Enum], command: int) -> str:
+    try:
+        return command_enum(command).name
+    except ValueError:
+        return str(command)
+
+
+class WinampTransport:
+    """
+    Interface for delivering window messages to Winamp. Winamp controller uses a transport for all communication with
+    the player, so the controller can be used with a simulated player where the Windows API is not available.
+    """
+
+    def find_window(self) -> int:
+        """
+        Find the Winamp main window.
+
+        :return: Handle of the window, or 0 if Winamp is not running.
+        """
+        raise NotImplementedError
+
+    def find_windows(self) -> List[int]:
+        """
+        Find all Winamp main windows.
+
+        :return: Handles of the windows. Empty if Winamp is not running.
+        """
+        window_id = self.find_window()
+        return [window_id] if window_id else []
+
+    def is_window(self, window_id: int) -> bool:
+        """
+        Check that a Winamp window still exists.
+
+        :param window_id: Handle of the window
+        :return: True if the handle belongs to an open Winamp window
+        """
+        return window_id in self.find_windows()
+
+    def send_message(self, window_id: int, message: int, wparam: int, lparam: int) -> int:
+        """
+        Send a window message and wait for it to be processed.
+
+        :param window_id: Handle of the window
+        :param message: Message type, e.g. WM_COMMAND or WM_USER
+        :param wparam: First message parameter
+        :param lparam: Second message parameter
+        :return: Result of the message processing
+        """
+        raise NotImplementedError
+
+    def get_window_text(self, window_id: int) -> str:
+        """
+        Get the title text of a window.
+
+        :param window_id: Handle of the window
+        :return: The window text
+        """
+        raise NotImplementedError
+
+    def read_string(self, window_id: int, address: int, max_length: int = 32768) -> str:
+        """
+        Read a null terminated UTF-16 string from the memory of the process owning a window.
+
+        :param window_id: Handle of the window
+        :param address: Address of the string in the memory of the process
+        :param max_length: Maximum number of characters read
+        :return: The string
+        :raises NotImplementedError: If the transport cannot read the memory of other processes
+        :raises OSError: If the memory cannot be read
+        """
+        raise NotImplementedError
+
+    def release(self, window_id: int):
+        """
+        Release the resources held for a window, e.g. when the controller disconnects from it.
+
+        :param window_id: Handle of the window
+        """
+
+
+class Win32Transport(WinampTransport):
+    """
+    Transport delivering messages to a real Winamp client through the Windows API. Requires pywin32.
+    """
+
+    PROCESS_VM_READ = 0x0010
+    PAGE_SIZE = 4096
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        import win32api
+        import win32gui
+        import win32process
+
+        self._win32api = win32api
+        self._win32gui = win32gui
+        self._win32process = win32process
+        self._processes = {}
+
+        # A private library instance, so the function prototypes do not affect other users of ctypes.windll. Without
+        # them, 64-bit handles and addresses would be truncated to C ints.
+        self._kernel32 = kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+        kernel32.CloseHandle.restype = wintypes.BOOL
+        kernel32.ReadProcessMemory.argtypes = (wintypes.HANDLE, wintypes.LPCVOID, wintypes.LPVOID, ctypes.c_size_t,
+                                               ctypes.POINTER(ctypes.c_size_t))
+        kernel32.ReadProcessMemory.restype = wintypes.BOOL
+
+    def find_window(self) -> int:
+        return self._win32gui.FindWindow(WINAMP_WINDOW_CLASS, None)
+
+    def find_windows(self) -> List[int]:
+        windows = []
+
+        def callback(window_id, _):
+            if self._win32gui.GetClassName(window_id) == WINAMP_WINDOW_CLASS:
+                windows.append(window_id)
+            return True
+
+        self._win32gui.EnumWindows(callback, None)
+        return windows
+
+    def is_window(self, window_id: int) -> bool:
+        # Window handles are reused, so the class is checked too
+        return bool(self._win32gui.IsWindow(window_id)) and \
+            self._win32gui.GetClassName(window_id) == WINAMP_WINDOW_CLASS
+
+    def send_message(self, window_id: int, message: int, wparam: int, lparam: int) -> int:
+        return self._win32api.SendMessage(window_id, message, wparam, lparam)
+
+    def get_window_text(self, window_id: int) -> str:
+        return self._win32gui.GetWindowText(window_id)
+
+    def _open_process(self, window_id: int) -> int:
+        import ctypes
+
+        _, process_id = self._win32process.GetWindowThreadProcessId(window_id)
+        cached = self._processes.get(window_id)
+        if cached is not None:
+            if cached[0] == process_id:
+                return cached[1]
+            # The window handle has been reused by another process
+            self.release(window_id)
+
+        # Handles of closed windows are released before opening a new one, so restarting Winamp does not leak them
+        for closed_window_id in [cached_id for cached_id in self._processes if not self.is_window(cached_id)]:
+            self.release(closed_window_id)
+
+        process = self._kernel32.OpenProcess(self.PROCESS_VM_READ, False, process_id)
+        if not process:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._processes[window_id] = (process_id, process)
+
+        return process
+
+    def release(self, window_id: int):
+        cached = self._processes.pop(window_id, None)
+        if cached is not None:
+            self._kernel32.CloseHandle(cached[1])
+
+    def read_string(self, window_id: int, address: int, max_length: int = 32768) -> str:
+        import ctypes
+
+        read_process_memory = self._kernel32.ReadProcessMemory
+        process = self._open_process(window_id)
+        data = bytearray()
+        while len(data) < max_length * 2:
+            # Reads never cross a page boundary, since the page after the string may not be readable
+            current = address + len(data)
+            size = min(512, self.PAGE_SIZE - current % self.PAGE_SIZE)
+            buffer = ctypes.create_string_buffer(size)
+            read = ctypes.c_size_t()
+            if not read_process_memory(process, current, buffer, size, ctypes.byref(read)):
+                raise ctypes.WinError(ctypes.get_last_error())
+
+            checked = len(data) - len(data) % 2
+            data += buffer.raw[:read.value]
+            for index in range(checked, len(data) - 1, 2):
+                if data[index] == 0 and data[index + 1] == 0:
+                    return data[:index].decode("utf-16-le")
+
+        return data[:max_length * 2].decode("utf-16-le", errors="replace")
+
+
 class Winamp:
     """
     a controller class for Winamp. Connect method must be called to control an open Winamp client.
@@ -245,22 +564,76 @@ class Winamp:
     """
     DEFAULT_NO_TRACK_MESSAGE = "No track selected in Winamp"
 
-    def __init__(self):
+    def __init__(self, transport: Optional[WinampTransport] = None, window_id: Optional[int] = None):
         """
         Initialize a Winamp controller class. If Winamp client is not open during the initialization, method
         Winamp.connect() must be called afterwards before commands can be sent.
+
+        :param transport: Transport used to communicate with Winamp. Defaults to Win32Transport.
+        :param window_id: Handle of the Winamp window to control. By default the first Winamp window found is used.
         """
 
-        self.window_id = None
+        self.transport = transport if transport is not None else Win32Transport()
+        self.metrics = None
+        """
+        Optional instrumentation.Metrics object recording the latency of every message. None disables recording.
+        """
+        self.window_id = 0
         self._version = None
-        self.connect()
+        self._cached_track = None
+        # Winamp returns strings in buffers that the next string request overwrites, so a request and reading its
+        # result must not be interleaved with another thread's request
+        self._string_lock = threading.Lock()
+        window_id = window_id if window_id is not None else self.transport.find_window()
+        if window_id:
+            self.connect(window_id)
+
+    @classmethod
+    def connect_all(cls, transport: Optional[WinampTransport] = None) -> List["Winamp"]:
+        """
+        Connect to every open Winamp client.
+
+        :param transport: Transport used to communicate with Winamp. Defaults to Win32Transport.
+        :return: A controller for each Winamp window found
+        """
+
+        transport = transport if transport is not None else Win32Transport()
+        return [cls(transport, window_id) for window_id in transport.find_windows()]
 
-    def connect(self):
+    def connect(self, window_id: Optional[int] = None):
         """
         Connect to a Winamp client.
+
+        :param window_id: Handle of the Winamp window to connect to. By default the first Winamp window found is used.
+        :raises ConnectionError: If no Winamp window is found.
         """
-        self.window_id = win32gui.FindWindow("Winamp v1.x", None)
+        window_id = window_id if window_id is not None else self.transport.find_window()
+        if self.window_id and window_id != self.window_id:
+            self.transport.release(self.window_id)
+        self.window_id = window_id
         self._version = self.fetch_version()
+        self._cached_track = None
+
+    def disconnect(self):
+        """
+        Disconnect from the Winamp client and release the resources held for its window. Method Winamp.connect() must
+        be called afterwards before commands can be sent again.
+        """
+
+        if self.window_id:
+            self.transport.release(self.window_id)
+        self.window_id = 0
+        self._cached_track = None
+
+    def is_connected(self) -> bool:
+        """
+        Check that the connected Winamp window still exists. A restarted Winamp client has a new window, so the
+        controller must be connected again.
+
+        :return: True if the controller is connected to an open Winamp window.
+        """
+
+        return bool(self.window_id) and self.transport.is_window(self.window_id)
 
     def __ensure_connection(self):
         """
@@ -268,7 +641,7 @@ class Winamp:
 
         :raises ConnectionError: If a connection to Winamp client is not established.
         """
-        if self.window_id == 0:
+        if not self.window_id:
             raise ConnectionError("No Winamp client connected")
 
     def send_command(self, command: Union[MenuCommand, int]) -> int:
@@ -283,10 +656,15 @@ class Winamp:
 
         self.__ensure_connection()
 
+        if self.metrics is not None:
+            name = command.name if isinstance(command, MenuCommand) else _command_name(MenuCommand, command)
+            return self.metrics.call("send_command", name, self.transport.send_message, self.window_id, WM_COMMAND,
+                                     int(command.value if isinstance(command, MenuCommand) else command), 0)
+
         if isinstance(command, MenuCommand):
             command = command.value
 
-        return win32api.SendMessage(self.window_id, WM_COMMAND, command, 0)
+        return self.transport.send_message(self.window_id, WM_COMMAND, command, 0)
 
     def send_user_command(self, command: Union[UserCommand, int], data: int = 0) -> int:
         """
@@ -301,10 +679,15 @@ class Winamp:
 
         self.__ensure_connection()
 
+        if self.metrics is not None:
+            name = command.name if isinstance(command, UserCommand) else _command_name(UserCommand, command)
+            return self.metrics.call("send_user_command", name, self.transport.send_message, self.window_id, WM_USER,
+                                     data, int(command.value if isinstance(command, UserCommand) else command))
+
         if isinstance(command, UserCommand):
             command = command.value
 
-        return win32api.SendMessage(self.window_id, WM_USER, data, command)
+        return self.transport.send_message(self.window_id, WM_USER, data, command)
 
     @property
     def version(self) -> str:
@@ -323,18 +706,50 @@ class Winamp:
         Fetch the current track.
 
         :return: CurrentTrack object that contains properties of the currently playing track, or None if no track is
-        currently selected.
+        currently selected. The technical information and length are zero while stopped.
         """
 
-        playlist_position = self.get_playlist_position()
-        if not playlist_position:
+        snapshot = self.snapshot()
+        if snapshot.playlist_position is None:
             return None
 
-        title = self.get_track_title()
-        length, position = self.get_track_status()
-        sample_rate, bitrate, num_channels = self.get_track_info()
+        return CurrentTrack(snapshot.title, snapshot.sample_rate, snapshot.bitrate, snapshot.channels, snapshot.length,
+                            snapshot.position or 0, snapshot.playlist_position)
+
+    def snapshot(self, title_key: Optional[Callable[[str], Hashable]] = None) -> PlayerSnapshot:
+        """
+        Read the player state in a single pass. Values that are constant for a track, i.e. its length and technical
+        information, are read only when the track changes, so a snapshot of a playing track usually takes five
+        messages.
+
+        :param title_key: Function turning the window text into a value that identifies the track together with the
+        playlist position. By default the window text itself is used, so if Winamp scrolls the title in the taskbar,
+        the track information is read again on every snapshot. A function that undoes the scrolling, such as
+        events.track_key, avoids this.
+        :return: The player state
+        :raises ConnectionError: If a connection to Winamp client is not established.
+        """
 
-        return CurrentTrack(title, sample_rate, bitrate, num_channels, length, position, playlist_position)
+        status = self.get_playing_status()
+        title = self.get_track_title()
+        playlist_position = self.get_playlist_position()
+        playlist_length = self.get_playlist_length()
+        if status == PlayingStatus.Stopped or playlist_position is None:
+            return PlayerSnapshot(status, title, playlist_position, playlist_length, None, 0, 0, 0, 0)
+
+        position = self.send_user_command(UserCommand.TrackStatus, 0)
+        track_key = (playlist_position, title if title_key is None else title_key(title))
+        if self._cached_track is None or self._cached_track[0] != track_key:
+            length = self.send_user_command(UserCommand.TrackStatus, 1)
+            if length == self.NO_TRACK_SELECTED:
+                return PlayerSnapshot(status, title, None, playlist_length, None, 0, 0, 0, 0)
+            self._cached_track = (track_key, (length * 1000, self.send_user_command(UserCommand.TrackInfo, 0),
+                                              self.send_user_command(UserCommand.TrackInfo, 1),
+                                              self.send_user_command(UserCommand.TrackInfo, 2)))
+
+        length, sample_rate, bitrate, channels = self._cached_track[1]
+        return PlayerSnapshot(status, title, playlist_position, playlist_length, position, length, sample_rate,
+                              bitrate, channels)
 
     def get_track_title(self) -> str:
         """
@@ -347,7 +762,11 @@ class Winamp:
         """
         self.__ensure_connection()
 
-        return win32gui.GetWindowText(self.window_id)
+        if self.metrics is not None:
+            return self.metrics.call("get_track_title", "GetWindowText", self.transport.get_window_text,
+                                     self.window_id)
+
+        return self.transport.get_window_text(self.window_id)
 
     def fetch_version(self) -> str:
         """
@@ -444,6 +863,15 @@ class Winamp:
 
         return self.send_user_command(UserCommand.SetVolume, volume_level)
 
+    def get_volume(self) -> int:
+        """
+        Get the players' playback volume.
+
+        :return: Volume level in range from 0 to 255.
+        """
+
+        return self.send_user_command(UserCommand.SetVolume, -666)
+
     def get_playlist_length(self) -> int:
         """
         Get the number of tracks in current playlist.
@@ -453,6 +881,15 @@ class Winamp:
 
         return self.send_user_command(UserCommand.PlaylistLength)
 
+    def get_shuffle(self) -> bool:
+        """
+        Get the shuffle status of the player.
+
+        :return: True if shuffle is on.
+        """
+
+        return self.send_user_command(UserCommand.GetShuffle) == 1
+
     def get_track_info(self) -> Tuple[int, int, int]:
         """
         Get the currently selected track technical information.
@@ -480,6 +917,114 @@ class Winamp:
 
         return self.send_user_command(UserCommand.DumpPlaylist)
 
+    def get_playlist_file(self, index: int) -> str:
+        """
+        Get the file path of a playlist entry directly from Winamp's memory, without dumping the playlist. This method
+        is thread safe.
+
+        :param index: Position of the entry in the playlist, starting from 0
+        :return: Absolute path to the track
+        :raises IndexError: If the index is not in the playlist
+        :raises NotImplementedError: If the transport cannot read Winamp's memory
+        :raises OSError: If Winamp's memory cannot be read
+        """
+
+        with self._string_lock:
+            address = self.send_user_command(UserCommand.GetPlaylistFileW, index)
+            if not address:
+                raise IndexError(f"Playlist has no entry at index {index}")
+
+            return self.transport.read_string(self.window_id, address)
+
+    def get_playlist_title(self, index: int) -> Optional[str]:
+        """
+        Get the display title of a playlist entry directly from Winamp's memory, without dumping the playlist. This
+        method is thread safe.
+
+        :param index: Position of the entry in the playlist, starting from 0
+        :return: The title as shown in the playlist, or None if it is empty
+        :raises IndexError: If the index is not in the playlist
+        :raises NotImplementedError: If the transport cannot read Winamp's memory
+        :raises OSError: If Winamp's memory cannot be read
+        """
+
+        with self._string_lock:
+            address = self.send_user_command(UserCommand.GetPlaylistTitleW, index)
+            if not address:
+                raise IndexError(f"Playlist has no entry at index {index}")
+
+            return self.transport.read_string(self.window_id, address) or None
+
+    def get_playlist_entry(self, index: int) -> PlaylistEntry:
+        """
+        Get a playlist entry directly from Winamp's memory. The cost does not depend on the playlist size, unlike
+        dumping the playlist. Winamp does not tell the duration of an entry this way, so it is always -1.
+
+        :param index: Position of the entry in the playlist, starting from 0
+        :return: The playlist entry with its path and title
+        :raises IndexError: If the index is not in the playlist
+        :raises NotImplementedError: If the transport cannot read Winamp's memory
+        :raises OSError: If Winamp's memory cannot be read
+        """
+
+        return PlaylistEntry(self.get_playlist_file(index), -1, self.get_playlist_title(index))
+
+    def iter_playlist_entries(self, start: int = 0, stop: Optional[int] = None) -> Iterator[PlaylistEntry]:
+        """
+        Iterate over a range of playlist entries directly from Winamp's memory. See get_playlist_entry().
+
+        :param start: Position of the first entry, starting from 0
+        :param stop: Position after the last entry. Defaults to the playlist length.
+        :return: Generator yielding the playlist entries
+        """
+
+        stop = self.get_playlist_length() if stop is None else min(stop, self.get_playlist_length())
+        for index in range(max(start, 0), stop):
+            yield self.get_playlist_entry(index)
+
+    @staticmethod
+    def iter_playlist(playlist_filepath, chunk_size: int = 64 * 1024) -> Iterator[PlaylistEntry]:
+        """
+        Iterate over entries in a playlist file. A playlist dump is required for this method except if a playlist file
+        in specific location is desired.
+
+        The file is read in chunks and entries are yielded one by one, so the memory usage does not depend on the
+        playlist size. Duration and title from a preceding #EXTINF line are included in the entry. For UTF-8 support,
+        playlist file with extension .m3u8 should be used instead of .m3u.
+
+        :param playlist_filepath: Path to the playlist file
+        :param chunk_size: Number of characters read from the file at a time
+        :return: Generator yielding PlaylistEntry objects in playlist order
+        """
+
+        duration, title = -1, None
+        remainder = ""
+
+        # The playlist file is encoded in utf-8-sig and has redundant BOM characters
+        with open(playlist_filepath, "r", encoding="utf-8-sig") as playlist_file:
+            while True:
+                chunk = playlist_file.read(chunk_size)
+                if not chunk:
+                    lines = [remainder]
+                else:
+                    # The last line of a chunk may continue in the next chunk
+                    lines = (remainder + chunk).splitlines()
+                    remainder = lines.pop() if not chunk.endswith(("\n", "\r")) else ""
+
+                for line in lines:
+                    if not line:
+                        continue
+                    if line[0] == "#":
+                        if line.startswith("#EXTINF:"):
+                            duration, title = parse_extinf(line)
+                        continue
+
+                    yield PlaylistEntry(line, duration, title)
+                    duration, title = -1, None
+
+                if not chunk:
+                    break
+
     @staticmethod
     def get_playlist(playlist_filepath) -> List[str]:
         """
@@ -488,14 +1033,14 @@ class Winamp:
 
         This method opens a playlist file in given path and decodes its contents into a list of track paths.
         The default location for playlist files is C:/Users/user/AppData/Roaming/Winamp/. For UTF-8 support, playlist
-        file with extension .m3u8 should be used instead of .m3u.
+        file with extension .m3u8 should be used instead of .m3u. Use Winamp.iter_playlist() to also get the track
+        durations and titles without loading the whole playlist into memory.
 
         :param playlist_filepath: Path to the playlist file
         :return: List of absolute paths to all tracks in given playlist
         """
 
-        # The playlist file is encoded in utf-8-sig and has redundant BOM characters
+        # The file is read line by line instead of through iter_playlist, which would parse every #EXTINF line only to
+        # throw the durations and titles away. Universal newlines turn every line ending into a single newline.
         with open(playlist_filepath, "r", encoding="utf-8-sig") as playlist_file:
-            lines = playlist_file.read().splitlines()
-
-        return [line for line in lines if line and not line.startswith("#")]  # Exclude comments and empty lines
+            return [line.rstrip("\n") for line in playlist_file if line[0] != "#" and line != "\n"]
@@ -0,0 +1,520 @@
+"""
+An in-process simulated Winamp player. Use SimulatedWinamp as the transport of a Winamp controller to use, test and
+benchmark the controller and WinampRPC without Windows or a running Winamp client.
+"""
+
+"""
+MIT License
+
+Copyright (c) 2018 Niko Mätäsaho
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Tuple
+)
+
+from winamp import (
+    WinampTransport,
+    MenuCommand,
+    UserCommand,
+    PlayingStatus,
+    PlaylistEntry,
+    Winamp,
+    WM_COMMAND,
+    WM_USER
+)
+
+SIMULATED_WINDOW_ID = 0x1000
+"""
+Window handle of the first simulated Winamp window.
+"""
+
+
+def generate_playlist(length: int, seed: int = 0) -> List[PlaylistEntry]:
+    """
+    Generate a playlist with tracks in an artist\\album\\track directory structure.
+
+    :param length: Number of tracks in the playlist
+    :param seed: Seed for the random track lengths
+    :return: The playlist entries
+    """
+
+    rng = random.Random(seed)
+    entries = []
+    for i in range(length):
+        artist, album = f"Artist {i // 100}", f"Album {i // 10}"
+        track_name = f"Track {i % 10 + 1}"
+        path = f"C:\\Music\\{artist}\\{album}\\{i % 10 + 1:02d} {track_name}.mp3"
+        entries.append(PlaylistEntry(path, rng.randint(120, 420), f"{artist} - {track_name}"))
+
+    return entries
+
+
+class SimulatedWinamp(WinampTransport):
+    """
+    Transport answering messages like a Winamp client would. The simulated player has a playlist, a playing status,
+    a track position that advances with the clock, volume, shuffle and repeat, and it can dump its playlist to a file.
+
+    All messages are counted in messages and message_counts, so the number of messages needed for an operation can be
+    measured.
+    """
+
+    STRING_BUFFER_ADDRESS = 0x10000000
+    """
+    Simulated address of the buffers strings are returned in.
+    """
+
+    def __init__(self,
+                 playlist: Optional[List[PlaylistEntry]] = None,
+                 version: int = 0x5090,
+                 dump_filepath: Optional[str] = None,
+                 window_id: int = SIMULATED_WINDOW_ID,
+                 start_glitch: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic
+                 ):
+        """
+        :param playlist: Playlist entries. Titles are shown in the window text and durations are used as track lengths.
+        :param version: Winamp version in the same hexadecimal format Winamp reports it
+        :param dump_filepath: Path where the playlist is dumped. Defaults to Winamp.m3u8 in a directory named after
+        the window handle in the temporary directory.
+        :param window_id: Handle of the simulated window
+        :param start_glitch: Time in seconds after a track starts during which the track position is reported as a
+        huge bogus value, like Winamp does sometimes
+        :param clock: Monotonic clock function returning seconds
+        """
+        self.playlist = list(playlist) if playlist is not None else []
+        self.version = version
+        self.dump_filepath = dump_filepath or os.path.join(tempfile.gettempdir(), f"winamp_{window_id:x}",
+                                                           "Winamp.m3u8")
+        self.window_id = window_id
+        self.start_glitch = start_glitch
+        self.clock = clock
+        self.running = True
+        """
+        If False, the window cannot be found and messages are not answered.
+        """
+
+        self.status = PlayingStatus.Stopped
+        self.playlist_position = 0 if self.playlist else Winamp.NO_TRACK_SELECTED
+        self.volume = 255
+        self.shuffle = False
+        self.repeat = False
+        self.stop_after_track = False
+        self.sample_rate = 44100
+        self.bitrate = 320
+        self.channels = 2
+
+        self.messages = 0
+        """
+        Total number of messages received.
+        """
+        self.memory_reads = 0
+        """
+        Total number of strings read from the simulated process memory.
+        """
+        self.message_counts = Counter()
+        """
+        Number of messages received by (message type, command) pairs.
+        """
+
+        self._position = 0
+        self._started = None
+        self._track_started = clock()
+        self._lock = threading.RLock()
+        self._rng = random.Random(0)
+        self._memory = {}
+
+    def reset_counters(self):
+        """
+        Reset message counters to zero.
+        """
+        self.messages = 0
+        self.memory_reads = 0
+        self.message_counts.clear()
+
+    def restart(self, window_id: Optional[int] = None):
+        """
+        Simulate closing and starting Winamp again. The new main window has a new handle and playback is stopped.
+
+        :param window_id: Handle of the new window. Defaults to the next handle after the current one.
+        """
+
+        with self._lock:
+            self.window_id = window_id if window_id is not None else self.window_id + 1
+            self.running = True
+            self._stop()
+
+    # Transport interface
+
+    def find_window(self) -> int:
+        return self.window_id if self.running else 0
+
+    def is_window(self, window_id: int) -> bool:
+        return self.running and window_id == self.window_id
+
+    def send_message(self, window_id: int, message: int, wparam: int, lparam: int) -> int:
+        with self._lock:
+            if not self.running or window_id != self.window_id:
+                return 0
+
+            if message == WM_COMMAND:
+                self.messages += 1
+                self.message_counts[(message, wparam)] += 1
+                return self._menu_command(wparam)
+            if message == WM_USER:
+                self.messages += 1
+                self.message_counts[(message, lparam)] += 1
+                return self._user_command(lparam, wparam)
+
+            return 0
+
+    def read_string(self, window_id: int, address: int, max_length: int = 32768) -> str:
+        with self._lock:
+            if not self.running or window_id != self.window_id:
+                raise OSError("Process of the window is not running")
+            string = self._memory.get(address)
+            if string is None:
+                raise OSError(f"Address {address:#x} is not readable")
+            self.memory_reads += 1
+
+            return string[:max_length]
+
+    def _store_string(self, string: str, buffer: int) -> int:
+        # Like Winamp, the string is in a buffer that the next query of the same kind overwrites
+        address = self.STRING_BUFFER_ADDRESS + buffer * 0x10000
+        self._memory[address] = string
+        return address
+
+    def get_window_text(self, window_id: int) -> str:
+        with self._lock:
+            if not self.running or window_id != self.window_id:
+                return ""
+            self.messages += 1
+            self.message_counts[("WM_GETTEXT", 0)] += 1
+            self._advance()
+
+            return self.window_text()
+
+    # Player state
+
+    @property
+    def current_entry(self) -> Optional[PlaylistEntry]:
+        """
+        The selected playlist entry, or None if the playlist is empty.
+        """
+        if not self.playlist:
+            return None
+        return self.playlist[self.playlist_position]
+
+    def window_text(self) -> str:
+        """
+        :return: The window text Winamp would show in current state
+        """
+
+        entry = self.current_entry
+        if entry is None:
+            return "Winamp 5.9"
+
+        text = f"{self.playlist_position + 1}. {entry.title or os.path.basename(entry.path)} - Winamp"
+        if self.status == PlayingStatus.Paused:
+            text += " [Paused]"
+        elif self.status == PlayingStatus.Stopped:
+            text += " [Stopped]"
+
+        return text
+
+    def _track_length(self) -> int:
+        entry = self.current_entry
+        return entry.duration * 1000 if entry is not None and entry.duration > 0 else 0
+
+    def _advance(self):
+        # Move to next tracks according to the time passed while playing
+        while self.status == PlayingStatus.Playing:
+            length = self._track_length()
+            position = self.position
+            if not length or position < length:
+                return
+
+            overflow = position - length
+            if self.stop_after_track or (not self.repeat and self.playlist_position == len(self.playlist) - 1
+                                         and not self.shuffle):
+                self._stop()
+                self.stop_after_track = False
+                return
+            self._select(self._next_position(), overflow)
+
+    @property
+    def position(self) -> int:
+        """
+        Current track position in milliseconds.
+        """
+        if self.status == PlayingStatus.Playing:
+            return self._position + int((self.clock() - self._started) * 1000)
+        return self._position
+
+    def _set_position(self, position: int):
+        self._position = max(0, position)
+        self._started = self.clock()
+
+    def _select(self, playlist_position: int, position: int = 0):
+        self.playlist_position = max(0, min(playlist_position, len(self.playlist) - 1))
+        self._track_started = self.clock()
+        self._set_position(position)
+
+    def _next_position(self) -> int:
+        if self.shuffle and len(self.playlist) > 1:
+            return self._rng.randrange(len(self.playlist))
+        if self.playlist_position == len(self.playlist) - 1:
+            return 0
+        return self.playlist_position + 1
+
+    def _play(self):
+        if not self.playlist:
+            return
+        self.status = PlayingStatus.Playing
+        self._select(self.playlist_position)
+
+    def _stop(self):
+        self.status = PlayingStatus.Stopped
+        self._set_position(0)
+
+    def _toggle_pause(self):
+        if self.status == PlayingStatus.Playing:
+            self._position = self.position
+            self.status = PlayingStatus.Paused
+        elif self.status == PlayingStatus.Paused:
+            self.status = PlayingStatus.Playing
+            self._set_position(self._position)
+
+    def _change_track(self, playlist_position: int):
+        # The playing status is kept, so a playing player starts playing the new track from its beginning
+        if self.playlist:
+            self._select(playlist_position)
+
+    def _menu_command(self, command: int) -> int:
+        self._advance()
+
+        if command == MenuCommand.Play.value:
+            self._play()
+        elif command == MenuCommand.TogglePause.value:
+            self._toggle_pause()
+        elif command == MenuCommand.Stop.value:
+            self._stop()
+        elif command == MenuCommand.NextTrack.value:
+            self._change_track(self._next_position())
+        elif command == MenuCommand.PreviousTrack.value:
+            self._change_track(max(0, self.playlist_position - 1))
+        elif command == MenuCommand.ToggleRepeat.value:
+            self.repeat = not self.repeat
+        elif command == MenuCommand.ToggleShuffle.value:
+            self.shuffle = not self.shuffle
+        elif command == MenuCommand.RaiseVolume.value:
+            self.volume = min(255, self.volume + 3)
+        elif command == MenuCommand.LowerVolume.value:
+            self.volume = max(0, self.volume - 3)
+        elif command == MenuCommand.FastForward.value:
+            if self.status != PlayingStatus.Stopped:
+                self._set_position(min(self.position + 5000, self._track_length()))
+        elif command == MenuCommand.FastRewind.value:
+            if self.status != PlayingStatus.Stopped:
+                self._set_position(self.position - 5000)
+        elif command in (MenuCommand.StopAfterTrack.value, MenuCommand.FadeOutAndStop.value):
+            self.stop_after_track = True
+
+        return 0
+
+    def _user_command(self, command: int, data: int) -> int:
+        self._advance()
+
+        if command == UserCommand.WinampVersion.value:
+            return self.version
+        if command == UserCommand.PlayingStatus.value:
+            return self.status.value
+        if command == UserCommand.PlaylistLength.value:
+            return len(self.playlist)
+        if command == UserCommand.PlaylistPosition.value:
+            return self.playlist_position
+        if command == UserCommand.SetVolume.value:
+            if data == -666:
+                return self.volume
+            self.volume = max(0, min(255, data))
+            return 0
+        if command == UserCommand.DumpPlaylist.value:
+            self.dump_playlist()
+            return self.playlist_position if self.playlist else 0
+        if command == UserCommand.ChangeTrack.value:
+            self._change_track(data)
+            return 0
+        if command == UserCommand.GetShuffle.value:
+            return int(self.shuffle)
+        if command in (UserCommand.GetPlaylistFileW.value, UserCommand.GetPlaylistTitleW.value):
+            if not 0 <= data < len(self.playlist):
+                return 0
+            entry = self.playlist[data]
+            if command == UserCommand.GetPlaylistFileW.value:
+                return self._store_string(entry.path, 0)
+            return self._store_string(entry.title or os.path.basename(entry.path), 1)
+
+        if self.current_entry is None:
+            return Winamp.NO_TRACK_SELECTED if command in (UserCommand.TrackStatus.value,
+                                                           UserCommand.SeekTrack.value) else 0
+
+        if command == UserCommand.TrackStatus.value:
+            if data == 1:
+                return self._track_length() // 1000
+            if self.status == PlayingStatus.Stopped:
+                return 0
+            if self.clock() - self._track_started < self.start_glitch:
+                return 4294967 + self._rng.randrange(1000)
+            return self.position
+        if command == UserCommand.SeekTrack.value:
+            if self.status == PlayingStatus.Stopped:
+                return 0
+            self._set_position(data)
+            self._advance()
+            return 0
+        if command == UserCommand.TrackInfo.value:
+            if self.status == PlayingStatus.Stopped:
+                return 0
+            return (self.sample_rate // 1000, self.bitrate, self.channels)[data] if 0 <= data <= 2 else 0
+
+        return 0
+
+    def dump_playlist(self) -> str:
+        """
+        Write the playlist into dump_filepath like Winamp does.
+
+        :return: Path of the dump file
+        """
+
+        os.makedirs(os.path.dirname(self.dump_filepath), exist_ok=True)
+        with open(self.dump_filepath, "w", encoding="utf-8-sig", newline="\r\n") as playlist_file:
+            playlist_file.write("#EXTM3U\n")
+            for entry in self.playlist:
+                if entry.title is not None:
+                    playlist_file.write(f"#EXTINF:{entry.duration},{entry.title}\n")
+                playlist_file.write(f"{entry.path}\n")
+
+        return self.dump_filepath
+
+    # Helpers for driving the simulation
+
+    def set_playlist(self, playlist: List[PlaylistEntry]):
+        """
+        Replace the playlist. The first track is selected and the playback is stopped.
+        """
+        with self._lock:
+            self.playlist = list(playlist)
+            self.playlist_position = 0 if self.playlist else Winamp.NO_TRACK_SELECTED
+            self._stop()
+
+    def press(self, command: MenuCommand):
+        """
+        Press a button in the simulated player without counting it as a message.
+        """
+        with self._lock:
+            self._menu_command(command.value)
+
+    def state(self) -> Tuple[PlayingStatus, int, int]:
+        """
+        :return: Playing status, playlist position and track position in milliseconds
+        """
+        with self._lock:
+            self._advance()
+            return self.status, self.playlist_position, self.position
+
+
+class SimulatedWindows(WinampTransport):
+    """
+    Transport routing messages to several simulated Winamp players by their window handles.
+    """
+
+    def __init__(self, players: Optional[List[SimulatedWinamp]] = None):
+        """
+        :param players: The simulated players. Each must have a unique window handle.
+        """
+        self.players = {}
+        for player in players or []:
+            self.add(player)
+
+    @classmethod
+    def generate(cls, count: int, playlist_length: int = 100, clock: Callable[[], float] = time.monotonic
+                 ) -> "SimulatedWindows":
+        """
+        Create simulated players, each with a generated playlist.
+
+        :param count: Number of players
+        :param playlist_length: Number of tracks in each playlist
+        :param clock: Monotonic clock function returning seconds
+        :return: Transport for the players
+        """
+
+        return cls([SimulatedWinamp(generate_playlist(playlist_length, seed=i), window_id=SIMULATED_WINDOW_ID + i,
+                                    clock=clock) for i in range(count)])
+
+    def add(self, player: SimulatedWinamp):
+        """
+        Open a new simulated player window.
+        """
+        self.players[player.window_id] = player
+
+    def remove(self, window_id: int):
+        """
+        Close a simulated player window.
+        """
+        self.players.pop(window_id, None)
+
+    @property
+    def messages(self) -> int:
+        """
+        Total number of messages received by all players.
+        """
+        return sum(player.messages for player in self.players.values())
+
+    def find_window(self) -> int:
+        windows = self.find_windows()
+        return windows[0] if windows else 0
+
+    def find_windows(self) -> List[int]:
+        return [window_id for window_id, player in self.players.items() if player.running]
+
+    def send_message(self, window_id: int, message: int, wparam: int, lparam: int) -> int:
+        player = self.players.get(window_id)
+        return player.send_message(window_id, message, wparam, lparam) if player is not None else 0
+
+    def get_window_text(self, window_id: int) -> str:
+        player = self.players.get(window_id)
+        return player.get_window_text(window_id) if player is not None else ""
+
+    def read_string(self, window_id: int, address: int, max_length: int = 32768) -> str:
+        player = self.players.get(window_id)
+        if player is None:
+            raise OSError("Process of the window is not running")
+        return player.read_string(window_id, address, max_length)